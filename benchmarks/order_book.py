@@ -0,0 +1,342 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+"""Benchmark suite for the order book hot paths.
+
+Each profile is a list of order book operations generated before timing
+starts, either synthetically from a seeded random number generator or from a
+recorded match events file. Every operation is timed individually and the
+results (operations per second and latency percentiles for each kind of
+operation) are printed and can be saved as JSON so that two runs can be
+compared. Run from the repository root:
+
+    python benchmarks/order_book.py --output before.json
+    python benchmarks/order_book.py --output after.json --compare before.json
+
+Insert operations are reported separately as "insert" when the order rests in
+the book and "insert_trade" when it trades with resting orders (and so goes
+through trade_level). Latencies include the overhead of reading the clock,
+which is typically a few tens of nanoseconds.
+"""
+import argparse
+import csv
+import gc
+import json
+import pathlib
+import platform
+import random
+import sys
+import time
+
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from ready_trader_go.order_book import TOP_LEVEL_COUNT, Order, OrderBook, OrderBookFactory  # noqa: E402
+from ready_trader_go.types import Instrument, Lifespan, Side  # noqa: E402
+
+# Operation codes. Each operation is a tuple starting with the code and the
+# index of the book it applies to.
+INSERT = 0  # (INSERT, book, order_id, side, price, volume, lifespan)
+CANCEL = 1  # (CANCEL, book, order_id)
+AMEND = 2  # (AMEND, book, order_id, new_volume)
+TRY_TRADE = 3  # (TRY_TRADE, book, side, limit_price, volume)
+TOP_LEVELS = 4  # (TOP_LEVELS, book)
+TRADE_TICKS = 5  # (TRADE_TICKS, book)
+
+OPERATION_NAMES = {CANCEL: "cancel", AMEND: "amend", TRY_TRADE: "try_trade", TOP_LEVELS: "top_levels",
+                   TRADE_TICKS: "trade_ticks"}
+
+MID_PRICE = 10000 * 100
+TICK_SIZE = 100
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+Operation = Tuple[Any, ...]
+
+
+def passive_heavy(rng: random.Random, count: int) -> List[Operation]:
+    """Mostly passive inserts near the touch with some cancels and regular book snapshots.
+
+    Bids are always below, and asks always above, a fixed mid price so that
+    no orders trade.
+    """
+    ops: List[Operation] = []
+    live: List[int] = []
+    for order_id in range(count):
+        if live and rng.random() < 0.2:
+            ops.append((CANCEL, 0, live.pop(rng.randrange(len(live)))))
+        else:
+            side = Side.BUY if rng.random() < 0.5 else Side.SELL
+            distance = 1 + min(int(rng.expovariate(0.2)), 200)
+            price = MID_PRICE - distance * TICK_SIZE if side == Side.BUY else MID_PRICE + distance * TICK_SIZE
+            ops.append((INSERT, 0, order_id, side, price, rng.randint(1, 100), Lifespan.GOOD_FOR_DAY))
+            live.append(order_id)
+        if order_id % 10 == 0:
+            ops.append((TOP_LEVELS, 0))
+    return ops
+
+
+def aggressive_sweep(rng: random.Random, count: int) -> List[Operation]:
+    """Repeatedly build ten levels each side and then sweep through them with aggressive orders."""
+    ops: List[Operation] = []
+    order_id = 0
+    while len(ops) < count:
+        for level in range(10):
+            for _ in range(rng.randint(1, 4)):
+                ops.append((INSERT, 0, order_id, Side.BUY, MID_PRICE - (level + 1) * TICK_SIZE, rng.randint(1, 20),
+                            Lifespan.GOOD_FOR_DAY))
+                ops.append((INSERT, 0, order_id + 1, Side.SELL, MID_PRICE + (level + 1) * TICK_SIZE,
+                            rng.randint(1, 20), Lifespan.GOOD_FOR_DAY))
+                order_id += 2
+        for _ in range(10):
+            side = Side.BUY if rng.random() < 0.5 else Side.SELL
+            levels = rng.randint(1, 5)
+            price = MID_PRICE + levels * TICK_SIZE if side == Side.BUY else MID_PRICE - levels * TICK_SIZE
+            ops.append((TRY_TRADE, 0, Side.SELL if side == Side.BUY else Side.BUY, price, rng.randint(10, 100)))
+            ops.append((INSERT, 0, order_id, side, price, rng.randint(10, 100), Lifespan.FILL_AND_KILL))
+            order_id += 1
+            ops.append((TRADE_TICKS, 0))
+            ops.append((TOP_LEVELS, 0))
+    return ops
+
+
+def cancel_storm(rng: random.Random, count: int) -> List[Operation]:
+    """Fill the book with many orders over many levels, then amend and cancel them all in random order."""
+    ops: List[Operation] = []
+    order_id = 0
+    while len(ops) < count:
+        batch: List[int] = []
+        for _ in range(min(1000, count // 2 + 1)):
+            side = Side.BUY if rng.random() < 0.5 else Side.SELL
+            distance = rng.randint(1, 500)
+            price = MID_PRICE - distance * TICK_SIZE if side == Side.BUY else MID_PRICE + distance * TICK_SIZE
+            ops.append((INSERT, 0, order_id, side, price, rng.randint(50, 100), Lifespan.GOOD_FOR_DAY))
+            batch.append(order_id)
+            order_id += 1
+        rng.shuffle(batch)
+        for oid in batch:
+            if rng.random() < 0.25:
+                ops.append((AMEND, 0, oid, rng.randint(1, 49)))
+            ops.append((CANCEL, 0, oid))
+            if oid % 20 == 0:
+                ops.append((TOP_LEVELS, 0))
+    return ops
+
+
+def recorded(filename: pathlib.Path, count: Optional[int]) -> List[Operation]:
+    """Inserts, amends and cancels for both instruments taken from a match events file.
+
+    Book snapshots and trade ticks are taken every 50 events, which is
+    roughly what the information publisher does.
+    """
+    ops: List[Operation] = []
+    ids: Dict[Tuple[str, int], Tuple[int, int, int]] = {}
+    with filename.open(newline="") as f:
+        reader = csv.reader(f)
+        next(reader)  # Skip header row
+        for row in reader:
+            # time, competitor, operation, order_id, instrument, side, volume, price, lifespan, fee
+            key = (row[1], int(row[3]))
+            if row[2] == "Insert":
+                order_id = len(ids)
+                book = int(row[4])
+                ids[key] = (order_id, book, int(row[6]))
+                ops.append((INSERT, book, order_id, Side[row[5]], int(row[7]), int(row[6]), Lifespan[row[8]]))
+            elif row[2] == "Cancel" and key in ids:
+                ops.append((CANCEL, ids[key][1], ids[key][0]))
+            elif row[2] == "Amend" and key in ids:
+                order_id, book, volume = ids[key]
+                ops.append((AMEND, book, order_id, volume + int(row[6])))
+            else:
+                continue
+            if len(ops) % 50 == 0:
+                ops.append((TOP_LEVELS, 0))
+                ops.append((TOP_LEVELS, 1))
+                ops.append((TRADE_TICKS, 0))
+                ops.append((TRADE_TICKS, 1))
+            if count is not None and len(ops) >= count:
+                break
+    return ops
+
+
+def run_profile(ops: List[Operation], book_type: str) -> Dict[str, List[int]]:
+    """Apply the operations to fresh order books and return the latency of each, in nanoseconds, by name."""
+    factory = OrderBookFactory(book_type, TICK_SIZE / 100.0)
+    books: List[OrderBook] = [factory.create(i, -0.0001, 0.0002) for i in Instrument]
+    orders: Dict[int, Order] = {}
+    latencies: Dict[str, List[int]] = {}
+    buffers = [[0] * TOP_LEVEL_COUNT for _ in range(4)]
+    clock = time.perf_counter_ns
+
+    for op in ops:
+        code = op[0]
+        book = books[op[1]]
+        if code == INSERT:
+            _, _, order_id, side, price, volume, lifespan = op
+            order = orders[order_id] = Order(order_id, book.instrument, lifespan, side, price, volume)
+            if side == Side.BUY:
+                best = book.best_ask()
+                name = "insert_trade" if best is not None and price >= best else "insert"
+            else:
+                best = book.best_bid()
+                name = "insert_trade" if best is not None and price <= best else "insert"
+            start = clock()
+            book.insert(0.0, order)
+            end = clock()
+        elif code == CANCEL:
+            order = orders[op[2]]
+            name = "cancel"
+            start = clock()
+            book.cancel(0.0, order)
+            end = clock()
+        elif code == AMEND:
+            order = orders[op[2]]
+            name = "amend"
+            start = clock()
+            book.amend(0.0, order, op[3])
+            end = clock()
+        elif code == TRY_TRADE:
+            name = "try_trade"
+            start = clock()
+            book.try_trade(op[2], op[3], op[4])
+            end = clock()
+        elif code == TOP_LEVELS:
+            name = "top_levels"
+            start = clock()
+            book.top_levels(*buffers)
+            end = clock()
+        else:
+            name = "trade_ticks"
+            start = clock()
+            book.trade_ticks(*buffers)
+            end = clock()
+
+        if name in latencies:
+            latencies[name].append(end - start)
+        else:
+            latencies[name] = [end - start]
+
+    return latencies
+
+
+def percentile(ordered: List[int], pct: float) -> int:
+    """Return the given percentile of a sorted list using the nearest-rank method."""
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.4999)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarise(latencies: List[int]) -> Dict[str, float]:
+    """Return the operation rate and latency statistics for a list of latencies."""
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    result = {"count": len(ordered), "ops_per_sec": len(ordered) * 1e9 / total if total else 0.0,
+              "mean_ns": total / len(ordered)}
+    for pct in PERCENTILES:
+        result["p%g_ns" % pct] = percentile(ordered, pct)
+    return result
+
+
+def benchmark(profiles: Dict[str, List[Operation]], book_types: List[str], repeat: int) -> Dict[str, Any]:
+    """Run every profile against every book type and return the results."""
+    results: Dict[str, Any] = {}
+    for profile, ops in profiles.items():
+        results[profile] = {}
+        for book_type in book_types:
+            combined: Dict[str, List[int]] = {}
+            for _ in range(repeat):
+                gc.collect()
+                for name, values in run_profile(ops, book_type).items():
+                    combined.setdefault(name, []).extend(values)
+            everything = [v for values in combined.values() for v in values]
+            stats = {name: summarise(values) for name, values in sorted(combined.items())}
+            stats["all"] = summarise(everything)
+            results[profile][book_type] = stats
+    return results
+
+
+def print_results(results: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    """Print the results, with the change in operation rate relative to the baseline if there is one."""
+    header = "%-16s %-7s %-13s %9s %12s %9s %9s %9s %9s" % ("profile", "book", "operation", "count", "ops/sec",
+                                                             "p50 ns", "p90 ns", "p99 ns", "p99.9 ns")
+    if baseline:
+        header += " %9s" % "change"
+    print(header)
+    for profile, by_book in results.items():
+        for book_type, stats in by_book.items():
+            for name, s in stats.items():
+                line = "%-16s %-7s %-13s %9d %12.0f %9d %9d %9d %9d" % (
+                    profile, book_type, name, s["count"], s["ops_per_sec"], s["p50_ns"], s["p90_ns"], s["p99_ns"],
+                    s["p99.9_ns"])
+                if baseline:
+                    old = baseline.get(profile, {}).get(book_type, {}).get(name)
+                    if old and old["ops_per_sec"]:
+                        line += " %+8.1f%%" % (100.0 * (s["ops_per_sec"] / old["ops_per_sec"] - 1.0))
+                    else:
+                        line += " %9s" % "-"
+                print(line)
+
+
+def main() -> None:
+    """Process command line arguments and run the benchmarks."""
+    profiles = ("passive-heavy", "aggressive-sweep", "cancel-storm", "recorded")
+    parser = argparse.ArgumentParser(description="Benchmark the Ready Trader Go order book.")
+    parser.add_argument("--profile", choices=profiles, action="append",
+                        help="profile to run (may be repeated, default all)")
+    parser.add_argument("--book", choices=("sorted", "ladder"), action="append",
+                        help="order book type to run (may be repeated, default both)")
+    parser.add_argument("--count", type=int, default=50000,
+                        help="approximate number of operations in each profile (default 50000)")
+    parser.add_argument("--repeat", type=int, default=3, help="number of times to run each profile (default 3)")
+    parser.add_argument("--seed", type=int, default=42, help="seed for the synthetic profiles (default 42)")
+    parser.add_argument("--match-events", type=pathlib.Path, default=pathlib.Path("match_events.csv"),
+                        help="match events file for the recorded profile (default 'match_events.csv')")
+    parser.add_argument("--output", type=pathlib.Path, help="file to save the results to as JSON")
+    parser.add_argument("--compare", type=pathlib.Path, help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    baseline: Optional[Dict[str, Any]] = None
+    if args.compare:
+        with args.compare.open() as f:
+            baseline = json.load(f)["results"]
+
+    generators = {"passive-heavy": passive_heavy, "aggressive-sweep": aggressive_sweep, "cancel-storm": cancel_storm}
+    workloads: Dict[str, List[Operation]] = {}
+    for profile in args.profile or profiles:
+        if profile == "recorded":
+            if not args.match_events.is_file():
+                print("'%s' is not a regular file, skipping the recorded profile" % args.match_events,
+                      file=sys.stderr)
+                continue
+            workloads[profile] = recorded(args.match_events, args.count)
+        else:
+            workloads[profile] = generators[profile](random.Random(args.seed), args.count)
+
+    results = benchmark(workloads, args.book or ["sorted", "ladder"], args.repeat)
+    print_results(results, baseline)
+
+    if args.output:
+        document = {"meta": {"count": args.count, "match_events": str(args.match_events),
+                             "python": platform.python_version(), "platform": platform.platform(),
+                             "repeat": args.repeat, "seed": args.seed,
+                             "time": time.strftime("%Y-%m-%dT%H:%M:%S%z")},
+                    "results": results}
+        with args.output.open("w") as f:
+            json.dump(document, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
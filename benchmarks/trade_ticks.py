@@ -0,0 +1,129 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+"""Micro-benchmark of trade tick accumulation and flushing.
+
+Compares the TradeTicks accumulator used by the order book with the
+previous approach of summing volumes in a dictionary and sorting its keys on
+every flush. Run from the repository root:
+
+    python benchmarks/trade_ticks.py
+"""
+import argparse
+import collections
+import pathlib
+import random
+import sys
+import timeit
+
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from ready_trader_go.order_book import TOP_LEVEL_COUNT, TradeTicks  # noqa: E402
+
+
+class SortedTradeTicks(object):
+    """The previous implementation: a dictionary of volumes sorted on flush."""
+
+    def __init__(self):
+        self.ask_ticks: Dict[int, int] = collections.defaultdict(int)
+        self.bid_ticks: Dict[int, int] = collections.defaultdict(int)
+
+    def add(self, is_ask: bool, price: int, volume: int) -> None:
+        if is_ask:
+            self.ask_ticks[price] += volume
+        else:
+            self.bid_ticks[price] += volume
+
+    def flush(self, ask_prices: List[int], ask_volumes: List[int], bid_prices: List[int],
+              bid_volumes: List[int]) -> None:
+        prices = sorted(self.ask_ticks.keys())[:TOP_LEVEL_COUNT]
+        volumes = tuple(self.ask_ticks[p] for p in prices)
+        ask_prices[:] = prices + [0] * (TOP_LEVEL_COUNT - len(prices))
+        ask_volumes[:] = volumes + (0,) * (TOP_LEVEL_COUNT - len(volumes))
+
+        prices = sorted(self.bid_ticks.keys(), reverse=True)[:TOP_LEVEL_COUNT]
+        volumes = tuple(self.bid_ticks[p] for p in prices)
+        bid_prices[:] = prices + [0] * (TOP_LEVEL_COUNT - len(prices))
+        bid_volumes[:] = volumes + (0,) * (TOP_LEVEL_COUNT - len(volumes))
+
+        self.ask_ticks.clear()
+        self.bid_ticks.clear()
+
+
+class IncrementalTradeTicks(object):
+    """The current implementation: one TradeTicks accumulator per side."""
+
+    def __init__(self):
+        self.ask_ticks = TradeTicks(-1)
+        self.bid_ticks = TradeTicks(1)
+
+    def add(self, is_ask: bool, price: int, volume: int) -> None:
+        if is_ask:
+            self.ask_ticks.add(price, volume)
+        else:
+            self.bid_ticks.add(price, volume)
+
+    def flush(self, ask_prices: List[int], ask_volumes: List[int], bid_prices: List[int],
+              bid_volumes: List[int]) -> None:
+        self.ask_ticks.flush(ask_prices, ask_volumes)
+        self.bid_ticks.flush(bid_prices, bid_volumes)
+
+
+def make_trades(count: int, trades_per_flush: int, price_range: int, seed: int) -> List[List[Tuple[bool, int, int]]]:
+    """Return a list of bursts of random (is_ask, price, volume) trades."""
+    rng = random.Random(seed)
+    return [[(rng.random() < 0.5, 10000 + 100 * rng.randrange(price_range), rng.randint(1, 50))
+             for _ in range(trades_per_flush)] for _ in range(count)]
+
+
+def run(ticks, bursts: List[List[Tuple[bool, int, int]]]) -> List[int]:
+    """Feed each burst of trades to ticks and flush after each one."""
+    ask_prices = [0] * TOP_LEVEL_COUNT
+    ask_volumes = [0] * TOP_LEVEL_COUNT
+    bid_prices = [0] * TOP_LEVEL_COUNT
+    bid_volumes = [0] * TOP_LEVEL_COUNT
+    for burst in bursts:
+        for is_ask, price, volume in burst:
+            ticks.add(is_ask, price, volume)
+        ticks.flush(ask_prices, ask_volumes, bid_prices, bid_volumes)
+    return ask_prices + ask_volumes + bid_prices + bid_volumes
+
+
+def main() -> None:
+    """Run the benchmark and print the results."""
+    parser = argparse.ArgumentParser(description="Benchmark trade tick accumulation.")
+    parser.add_argument("--flushes", type=int, default=20000, help="number of flushes per run (default 20000)")
+    parser.add_argument("--repeat", type=int, default=5, help="number of runs, the best is reported (default 5)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed (default 42)")
+    args = parser.parse_args()
+
+    print("%-18s %-16s %12s %12s %8s" % ("trades per flush", "distinct prices", "sorted (us)", "incr. (us)",
+                                          "speedup"))
+    for trades_per_flush, price_range in ((1, 10), (4, 10), (16, 50), (64, 200)):
+        bursts = make_trades(args.flushes, trades_per_flush, price_range, args.seed)
+        if run(SortedTradeTicks(), bursts) != run(IncrementalTradeTicks(), bursts):
+            raise AssertionError("implementations disagree")
+        old = min(timeit.repeat(lambda: run(SortedTradeTicks(), bursts), number=1, repeat=args.repeat))
+        new = min(timeit.repeat(lambda: run(IncrementalTradeTicks(), bursts), number=1, repeat=args.repeat))
+        print("%-18d %-16d %12.3f %12.3f %7.2fx" % (trades_per_flush, price_range, old * 1e6 / args.flushes,
+                                                    new * 1e6 / args.flushes, old / new))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,7 @@
 #     You should have received a copy of the GNU Affero General Public
 #     License along with Ready Trader Go.  If not, see
 #     <https://www.gnu.org/licenses/>.
+from .fees import scaled_fee, to_micro_basis_points
 from .types import Instrument, Side
 
 
@@ -26,6 +27,7 @@ class CompetitorAccount(object):
         self.account_balance: int = 0
         self.buy_volume: int = 0
         self.etf_clamp: float = etf_clamp
+        self.etf_clamp_rate: int = to_micro_basis_points(etf_clamp)
         self.etf_position: int = 0
         self.future_position: int = 0
         self.max_drawdown: int = 0
@@ -35,12 +37,12 @@ class CompetitorAccount(object):
         self.tick_size: int = int(tick_size * 100.0)
         self.total_fees: int = 0
 
-    def transact(self, instrument: Instrument, side: Side, price: float, volume: int, fee: int) -> None:
+    def transact(self, instrument: Instrument, side: Side, price: int, volume: int, fee: int) -> None:
         """Update this account with the specified transaction."""
         if side == Side.SELL:
-            self.account_balance += round(price * volume)
+            self.account_balance += price * volume
         else:
-            self.account_balance -= round(price * volume)
+            self.account_balance -= price * volume
 
         self.account_balance -= fee
         self.total_fees += fee
@@ -60,7 +62,7 @@ class CompetitorAccount(object):
 
     def update(self, future_price: int, etf_price: int) -> None:
         """Update this account using the specified prices."""
-        delta: int = round(self.etf_clamp * future_price)
+        delta: int = scaled_fee(round(future_price * self.etf_clamp_rate))
         delta -= delta % self.tick_size
         min_price: int = future_price - delta
         max_price: int = future_price + delta
@@ -78,6 +80,7 @@ class AccountFactory:
     def __init__(self, etf_clamp: float, tick_size: float):
         """Initialise a new instance of the AccountFactory class."""
         self.etf_clamp: float = etf_clamp
+        self.etf_clamp_rate: int = to_micro_basis_points(etf_clamp)
         self.tick_size: float = tick_size
 
     def create(self) -> CompetitorAccount:
@@ -20,14 +20,13 @@ import logging
 
 from typing import List, Optional
 
-from .messages import (AMEND_MESSAGE, AMEND_MESSAGE_SIZE, CANCEL_MESSAGE, CANCEL_MESSAGE_SIZE,
+from .messages import (AMEND_MESSAGE, AMEND_MESSAGE_SIZE, BOOK_LEVEL_SIZE, CANCEL_MESSAGE, CANCEL_MESSAGE_SIZE,
                        ERROR_MESSAGE, ERROR_MESSAGE_SIZE, HEDGE_MESSAGE, HEDGE_MESSAGE_SIZE,
                        HEDGE_FILLED_MESSAGE, HEDGE_FILLED_MESSAGE_SIZE, INSERT_MESSAGE, INSERT_MESSAGE_SIZE,
                        LOGIN_MESSAGE, LOGIN_MESSAGE_SIZE, ORDER_BOOK_HEADER, ORDER_BOOK_HEADER_SIZE,
-                       ORDER_BOOK_MESSAGE_SIZE, BOOK_PART, ORDER_FILLED_MESSAGE, ORDER_FILLED_MESSAGE_SIZE,
-                       ORDER_STATUS_MESSAGE, ORDER_STATUS_MESSAGE_SIZE, TRADE_TICKS_HEADER,
-                       TRADE_TICKS_HEADER_SIZE, TRADE_TICKS_MESSAGE_SIZE, TICKS_PART,
-                       Connection, MessageType, Subscription)
+                       ORDER_FILLED_MESSAGE, ORDER_FILLED_MESSAGE_SIZE, ORDER_STATUS_MESSAGE,
+                       ORDER_STATUS_MESSAGE_SIZE, TRADE_TICKS_HEADER, TRADE_TICKS_HEADER_SIZE,
+                       Connection, MessageType, Subscription, book_part_struct)
 from .types import Lifespan, Side
 
 
@@ -64,12 +63,18 @@ class BaseAutoTrader(Connection, Subscription):
 
     def on_datagram(self, typ: int, data: bytes, start: int, length: int) -> None:
         """Called when an information message is received from the matching engine."""
-        if typ == MessageType.ORDER_BOOK_UPDATE and length == ORDER_BOOK_MESSAGE_SIZE:
+        # The depth of order book and trade ticks messages is set by the
+        # exchange configuration, so it is worked out from the message length.
+        if (typ == MessageType.ORDER_BOOK_UPDATE and length > ORDER_BOOK_HEADER_SIZE
+                and (length - ORDER_BOOK_HEADER_SIZE) % BOOK_LEVEL_SIZE == 0):
             inst, seq = ORDER_BOOK_HEADER.unpack_from(data, start)
-            self.on_order_book_update_message(inst, seq, *BOOK_PART.iter_unpack(data[ORDER_BOOK_HEADER_SIZE:]))
-        elif typ == MessageType.TRADE_TICKS and length == TRADE_TICKS_MESSAGE_SIZE:
+            part = book_part_struct((length - ORDER_BOOK_HEADER_SIZE) // BOOK_LEVEL_SIZE)
+            self.on_order_book_update_message(inst, seq, *part.iter_unpack(data[ORDER_BOOK_HEADER_SIZE:]))
+        elif (typ == MessageType.TRADE_TICKS and length > TRADE_TICKS_HEADER_SIZE
+                and (length - TRADE_TICKS_HEADER_SIZE) % BOOK_LEVEL_SIZE == 0):
             inst, seq = TRADE_TICKS_HEADER.unpack_from(data, start)
-            self.on_trade_ticks_message(inst, seq, *TICKS_PART.iter_unpack(data[TRADE_TICKS_HEADER_SIZE:]))
+            part = book_part_struct((length - TRADE_TICKS_HEADER_SIZE) // BOOK_LEVEL_SIZE)
+            self.on_trade_ticks_message(inst, seq, *part.iter_unpack(data[TRADE_TICKS_HEADER_SIZE:]))
         else:
             self.logger.error("received invalid information message: length=%d type=%d", length, typ)
             self.event_loop.stop()
@@ -109,7 +114,8 @@ class BaseAutoTrader(Connection, Subscription):
         along with the volume available at each of those price levels. If
         there are less than five prices on a side, then zeros will appear at
         the end of both the prices and volumes lists on that side so that
-        there are always five entries in each list.
+        there are always five entries in each list. (The number of levels
+        reported is five unless the exchange is configured otherwise.)
         """
 
     def on_order_filled_message(self, client_order_id: int, price: int, volume: int) -> None:
@@ -140,6 +146,8 @@ class BaseAutoTrader(Connection, Subscription):
         each of those price levels. If there are less than five prices on a
         side, then zeros will appear at the end of both the prices and volumes
         lists on that side so that there are always five entries in each list.
+        (The number of prices reported is five unless the exchange is
+        configured otherwise.)
         """
 
     def send_amend_order(self, client_order_id: int, volume: int) -> None:
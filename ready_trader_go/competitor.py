@@ -18,7 +18,7 @@
 import bisect
 import logging
 
-from typing import Any, Callable, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 from .account import AccountFactory, CompetitorAccount
 from .match_events import MatchEvents
@@ -50,7 +50,6 @@ class Competitor(ICompetitor, IOrderListener):
         self.match_events: MatchEvents = match_events
         self.order_count_limit: int = order_count_limit
         self.name: str = name
-        self.orders: Dict[int, Order] = dict()
         self.position_limit: int = position_limit
         self.score_board: ScoreBoardWriter = score_board
         self.sell_prices: List[int] = list()
@@ -77,7 +76,7 @@ class Competitor(ICompetitor, IOrderListener):
         self.exec_connection = None
         self.score_board.disconnect(now, self.name, self.account, self.etf_book.last_traded_price(),
                                     self.future_book.last_traded_price())
-        for o in tuple(self.orders.values()):
+        for o in self.etf_book.orders(self.name):
             self.etf_book.cancel(now, o)
 
     # IOrderListener callbacks
@@ -86,12 +85,11 @@ class Competitor(ICompetitor, IOrderListener):
         if self.exec_connection is not None:
             self.exec_connection.send_order_status(order.client_order_id, order.volume - order.remaining_volume,
                                                    order.remaining_volume, order.total_fees)
-        self.match_events.amend(now, self.name, order.client_order_id, -volume_removed)
+        self.match_events.amend(now, self.name, order.client_order_id, order.instrument, -volume_removed)
 
         self.active_volume -= volume_removed
 
         if order.remaining_volume == 0:
-            del self.orders[order.client_order_id]
             if order.side == Side.BUY:
                 self.buy_prices.pop(bisect.bisect(self.buy_prices, order.price) - 1)
             else:
@@ -102,11 +100,10 @@ class Competitor(ICompetitor, IOrderListener):
         if self.exec_connection is not None:
             self.exec_connection.send_order_status(order.client_order_id, order.volume - volume_removed,
                                                    order.remaining_volume, order.total_fees)
-        self.match_events.cancel(now, self.name, order.client_order_id, -volume_removed)
+        self.match_events.cancel(now, self.name, order.client_order_id, order.instrument, -volume_removed)
 
         self.active_volume -= volume_removed
 
-        del self.orders[order.client_order_id]
         if order.side == Side.BUY:
             self.buy_prices.pop(bisect.bisect(self.buy_prices, order.price) - 1)
         else:
@@ -123,7 +120,6 @@ class Competitor(ICompetitor, IOrderListener):
         self.active_volume -= volume
 
         if order.remaining_volume == 0:
-            del self.orders[order.client_order_id]
             if order.side == Side.BUY:
                 self.buy_prices.pop()
             else:
@@ -144,6 +140,37 @@ class Competitor(ICompetitor, IOrderListener):
         if not (-self.position_limit <= self.account.etf_position <= self.position_limit):
             self.hard_breach(now, order.client_order_id, b"ETF position limit breached")
 
+    def on_order_fills(self, now: float, order: Order, fills: List[Tuple[int, int, int]]) -> None:
+        """Called once an aggressive order has finished trading, with all of its fills."""
+        total_volume: int = 0
+        for price, volume, fee in fills:
+            total_volume += volume
+            self.match_events.fill(now, self.name, order.client_order_id, order.instrument, order.side, price, volume,
+                                   fee)
+            self.account.transact(Instrument.ETF, order.side, price, volume, fee)
+            if self.exec_connection is not None:
+                self.exec_connection.send_order_filled(order.client_order_id, price, volume)
+
+        self.active_volume -= total_volume
+
+        if order.remaining_volume == 0:
+            if order.side == Side.BUY:
+                self.buy_prices.pop()
+            else:
+                self.sell_prices.pop()
+
+        self.unhedged_etf_lots.apply_position_delta(total_volume if order.side == Side.BUY else -total_volume)
+
+        last_traded: int = self.future_book.last_traded_price() or round(self.future_book.midpoint_price())
+        self.account.update(last_traded, fills[-1][0])
+
+        if self.exec_connection is not None:
+            self.exec_connection.send_order_status(order.client_order_id, order.volume - order.remaining_volume,
+                                                   order.remaining_volume, order.total_fees)
+
+        if not (-self.position_limit <= self.account.etf_position <= self.position_limit):
+            self.hard_breach(now, order.client_order_id, b"ETF position limit breached")
+
     def on_unhedged_lots_expiry(self):
         """Called when unhedged lots have been held for too long."""
         self.logger.info("Unhedged lots timer expired for %s at etf=%d fut=%d rel=%d", self.name,
@@ -160,8 +187,8 @@ class Competitor(ICompetitor, IOrderListener):
             self.send_error(now, client_order_id, b"out-of-order client_order_id in amend message")
             return
 
-        if client_order_id in self.orders:
-            order = self.orders[client_order_id]
+        order = self.etf_book.get(self.name, client_order_id)
+        if order is not None:
             if volume > order.volume:
                 self.send_error(now, client_order_id, b"amend operation would increase order volume")
             else:
@@ -173,8 +200,7 @@ class Competitor(ICompetitor, IOrderListener):
             self.send_error(now, client_order_id, b"out-of-order client_order_id in cancel message")
             return
 
-        if client_order_id in self.orders:
-            self.etf_book.cancel(now, self.orders[client_order_id])
+        self.etf_book.cancel_by_id(now, self.name, client_order_id)
 
     def on_hedge_message(self, now: float, client_order_id: int, side: int, price: int, volume: int) -> None:
         """Called when a hedge order request is received from the competitor."""
@@ -205,7 +231,7 @@ class Competitor(ICompetitor, IOrderListener):
             return
 
         side_: Side = Side(side)
-        volume_traded, average_price = self.future_book.try_trade(side_, price, volume)
+        volume_traded, average_price = self.future_book.sweep_curve(side_).try_trade(price, volume)
         if volume_traded == 0:
             # The trade could have failed because there were no orders on the opposite side
             best: Optional[int] = self.future_book.best_ask() if side_ == Side.BID else self.future_book.best_bid()
@@ -260,7 +286,7 @@ class Competitor(ICompetitor, IOrderListener):
             self.send_error(now, client_order_id, b"price is not a multiple of tick size")
             return
 
-        if len(self.orders) == self.order_count_limit:
+        if self.etf_book.order_count(self.name) == self.order_count_limit:
             self.send_error(now, client_order_id, b"order rejected: active order count limit breached")
             return
 
@@ -281,8 +307,7 @@ class Competitor(ICompetitor, IOrderListener):
             self.send_error(now, client_order_id, b"order rejected: in cross with an existing order")
             return
 
-        order = self.orders[client_order_id] = Order(client_order_id, Instrument.ETF, Lifespan(lifespan), Side(side),
-                                                     price, volume, self)
+        order = Order(client_order_id, Instrument.ETF, Lifespan(lifespan), Side(side), price, volume, self, self.name)
         if side == Side.BUY:
             bisect.insort(self.buy_prices, price)
         else:
@@ -328,7 +353,7 @@ class CompetitorManager:
         self.__order_count_limit: int = limits_config["ActiveOrderCountLimit"]
         self.__position_limit: int = limits_config["PositionLimit"]
         self.__score_board_writer: ScoreBoardWriter = score_board_writer
-        self.__start_time: float = 0.0
+        self.__start_time: Optional[float] = None
         self.__traders: Dict[str, str] = traders_config
         self.__unhedged_lots_factory: UnhedgedLotsFactory = unhedged_lots_factory
         self.__tick_size: float = tick_size
@@ -356,7 +381,7 @@ class CompetitorManager:
                                 self.__tick_size, self.__unhedged_lots_factory, self.controller)
         self.__competitors[name] = competitor
 
-        if self.__start_time != 0.0:
+        if self.__start_time is not None:
             self.__logger.warning("competitor logged in after market open: name='%s'", name)
 
         for callback in self.competitor_logged_in:
@@ -17,6 +17,7 @@
 #     <https://www.gnu.org/licenses/>.
 import asyncio
 import logging
+import threading
 
 from typing import Any, Optional
 
@@ -35,10 +36,19 @@ class Controller(IController):
 
     def __init__(self, market_open_delay: float, exec_server: ExecutionServer, info_publisher: InformationPublisher,
                  market_events_reader: MarketEventsReader, match_events_writer: MatchEventsWriter,
-                 score_board_writer: ScoreBoardWriter, market_timer: Timer, tick_timer: Timer):
-        """Initialise a new instance of the Controller class."""
+                 score_board_writer: ScoreBoardWriter, market_timer: Timer, tick_timer: Timer,
+                 competitor_count: Optional[int] = None):
+        """Initialise a new instance of the Controller class.
+
+        If a competitor count is given, the market open delay is measured in
+        real time, rather than by the event loop's clock, and ends early once
+        that many competitors have logged in.
+        """
         self.heads_up_display_server: Optional[HeadsUpDisplayServer] = None
 
+        self.__catch_up_handle: Optional[asyncio.Handle] = None
+        self.__competitor_count: Optional[int] = competitor_count
+        self.__competitors_ready: threading.Event = threading.Event()
         self.__done: bool = False
         self.__execution_server: ExecutionServer = exec_server
         self.__information_publisher: InformationPublisher = info_publisher
@@ -59,10 +69,13 @@ class Controller(IController):
         self.__tick_timer.timer_ticked.append(self.on_tick_timer_ticked)
 
     def advance_time(self):
-        """Return the current time after accounting for events."""
-        now: float = self.__market_timer.advance()
-        self.__market_events_reader.process_market_events(now)
-        return now
+        """Return the current time after accounting for events.
+
+        If the market events reader is behind and can only process a slice
+        of its backlog, the time returned is the time it has reached, so
+        that the caller's request is ordered correctly among market events.
+        """
+        return self.__process_market_events(self.__market_timer.advance())
 
     def cleanup(self) -> None:
         """Ensure the controller shuts down gracefully"""
@@ -72,9 +85,21 @@ class Controller(IController):
         if self.__score_board_writer:
             self.__score_board_writer.finish()
 
+    def on_catch_up(self) -> None:
+        """Called when the event loop is free to process more of a backlog of market events."""
+        self.__catch_up_handle = None
+        self.__process_market_events(self.__market_timer.advance())
+
+    def on_competitor_logged_in(self, _: str) -> None:
+        """Called when a competitor logs in."""
+        if self.__competitor_count is not None:
+            self.__competitor_count -= 1
+            if self.__competitor_count <= 0:
+                self.__competitors_ready.set()
+
     def on_market_timer_ticked(self, timer: Timer, now: float, _: int):
         """Called when it is time to process market events."""
-        self.__market_events_reader.process_market_events(now)
+        self.__process_market_events(now)
 
     def on_task_complete(self, task: Any) -> None:
         """Called when a reader or writer task is complete"""
@@ -99,6 +124,18 @@ class Controller(IController):
             timer.shutdown(now, "match complete")
             return
 
+    def __process_market_events(self, now: float) -> float:
+        """Process market events up to now and return the time reached.
+
+        If the reader stops short of now, the rest of the backlog is
+        processed a slice at a time in later callbacks, so that execution
+        requests can be handled in between.
+        """
+        reached: float = self.__market_events_reader.process_market_events(now)
+        if reached < now and self.__catch_up_handle is None:
+            self.__catch_up_handle = asyncio.get_running_loop().call_soon(self.on_catch_up)
+        return reached
+
     async def start(self) -> None:
         """Start running the match."""
         self.__logger.info("starting the match")
@@ -113,7 +150,11 @@ class Controller(IController):
         self.__score_board_writer.start()
 
         # Give the auto-traders time to start up and connect
-        await asyncio.sleep(self.__market_open_delay)
+        if self.__competitor_count is None:
+            await asyncio.sleep(self.__market_open_delay)
+        elif self.__competitor_count > 0:
+            await asyncio.get_running_loop().run_in_executor(None, self.__competitors_ready.wait,
+                                                             self.__market_open_delay)
         # self.__execution_server.close()
 
         self.__logger.info("market open")
@@ -15,24 +15,28 @@
 #     You should have received a copy of the GNU Affero General Public
 #     License along with Ready Trader Go.  If not, see
 #     <https://www.gnu.org/licenses/>.
+import random
 import socket
 
+from typing import Optional
+
 from .account import AccountFactory
 from .application import Application
 from .competitor import CompetitorManager
 from .controller import Controller
 from .execution import ExecutionServer
 from .heads_up import HeadsUpDisplayServer
-from .information import InformationPublisher
+from .information import MAXIMUM_DEPTH, InformationPublisher
 from .limiter import FrequencyLimiterFactory
-from .market_events import MarketEventsReader
+from .market_events import MARKET_EVENT_STATISTICS_INTERVAL, MarketEventsReader, NumPyMarketEventsReader
 from .match_events import MatchEvents, MatchEventsWriter
-from .order_book import OrderBook
+from .order_book import TOP_LEVEL_COUNT, OrderBookFactory, OrderPool
 from .pubsub import PublisherFactory
 from .score_board import ScoreBoardWriter
 from .timer import Timer
 from .types import Instrument
 from .unhedged_lots import UnhedgedLotsFactory
+from .virtual_clock import DEFAULT_IDLE_WAIT, VirtualTimeEventLoop
 
 
 def __validate_hostname(config, section, key):
@@ -48,7 +52,7 @@ def __validate_object(config, section, required_keys, value_types):
         raise Exception("%s configuration should be a JSON object" % section)
     if any(k not in obj for k in required_keys):
         raise Exception("A required key is missing from the %s configuration" % section)
-    if any(type(obj[k]) is not t for k, t in zip(required_keys, value_types)):
+    if any(type(obj[k]) not in (t if type(t) is tuple else (t,)) for k, t in zip(required_keys, value_types)):
         raise Exception("Element of inappropriate type in %s configuration" % section)
 
 
@@ -61,7 +65,7 @@ def __exchange_config_validator(config):
 
     __validate_object(config, "Engine", ("MarketDataFile", "MarketEventInterval", "MarketOpenDelay", "MatchEventsFile",
                                          "ScoreBoardFile", "Speed", "TickInterval"),
-                      (str, float, float, str, str, float, float))
+                      ((str, list), float, float, str, str, float, float))
     __validate_object(config, "Execution", ("Host", "Port"), (str, int))
     __validate_object(config, "Fees", ("Maker", "Taker"), (float, float))
     __validate_object(config, "Information", ("Type", "Name"), (str, str))
@@ -70,6 +74,49 @@ def __exchange_config_validator(config):
                                          "MessageFrequencyLimit", "PositionLimit"), (int, int, float, int, int))
     __validate_hostname(config, "Execution", "Host")
 
+    market_data_file = config["Engine"]["MarketDataFile"]
+    if type(market_data_file) is list and (not market_data_file or any(type(f) is not str for f in market_data_file)):
+        raise Exception("Engine.MarketDataFile configuration should be a filename or a list of filenames")
+    if "MarketDataLoader" in config["Engine"] and config["Engine"]["MarketDataLoader"] not in ("thread", "numpy"):
+        raise Exception("Engine.MarketDataLoader configuration should be either 'thread' or 'numpy'")
+    if "OrderBook" in config["Engine"] and config["Engine"]["OrderBook"] not in ("sorted", "ladder"):
+        raise Exception("Engine.OrderBook configuration should be either 'sorted' or 'ladder'")
+    if "AggregateFills" in config["Engine"] and type(config["Engine"]["AggregateFills"]) is not bool:
+        raise Exception("Engine.AggregateFills configuration should be either true or false")
+    if "OrderPool" in config["Engine"] and type(config["Engine"]["OrderPool"]) is not bool:
+        raise Exception("Engine.OrderPool configuration should be either true or false")
+    if "StartTime" in config["Engine"] and (type(config["Engine"]["StartTime"]) is not float
+                                            or config["Engine"]["StartTime"] < 0.0):
+        raise Exception("Engine.StartTime configuration should be a number of seconds that is not negative")
+
+    if "MarketEventSliceSize" in config["Engine"] and (type(config["Engine"]["MarketEventSliceSize"]) is not int
+                                                       or config["Engine"]["MarketEventSliceSize"] < 0):
+        raise Exception("Engine.MarketEventSliceSize configuration should be an integer that is not negative")
+    if "MarketEventSliceTime" in config["Engine"] and (type(config["Engine"]["MarketEventSliceTime"]) is not int
+                                                       or config["Engine"]["MarketEventSliceTime"] < 0):
+        raise Exception("Engine.MarketEventSliceTime configuration should be an integer number of microseconds that"
+                        " is not negative")
+    if "MarketEventStatisticsInterval" in config["Engine"] and (
+            type(config["Engine"]["MarketEventStatisticsInterval"]) is not float
+            or config["Engine"]["MarketEventStatisticsInterval"] < 0.0):
+        raise Exception("Engine.MarketEventStatisticsInterval configuration should be a number of seconds that is"
+                        " not negative")
+
+    if "Clock" in config["Engine"] and config["Engine"]["Clock"] not in ("real", "virtual"):
+        raise Exception("Engine.Clock configuration should be either 'real' or 'virtual'")
+    if "VirtualIdleWait" in config["Engine"] and (type(config["Engine"]["VirtualIdleWait"]) is not float
+                                                  or config["Engine"]["VirtualIdleWait"] < 0.0):
+        raise Exception("Engine.VirtualIdleWait configuration should be a number of seconds that is not negative")
+    if "MessageLatency" in config["Engine"] and (type(config["Engine"]["MessageLatency"]) is not float
+                                                 or config["Engine"]["MessageLatency"] < 0.0):
+        raise Exception("Engine.MessageLatency configuration should be a number of seconds that is not negative")
+    if "Seed" in config["Engine"] and type(config["Engine"]["Seed"]) is not int:
+        raise Exception("Engine.Seed configuration should be an integer")
+
+    if "Depth" in config["Information"] and (type(config["Information"]["Depth"]) is not int
+                                             or not 0 < config["Information"]["Depth"] <= MAXIMUM_DEPTH):
+        raise Exception("Information.Depth configuration should be an integer from 1 to %d" % MAXIMUM_DEPTH)
+
     if "Hud" in config:
         __validate_object(config, "Hud", ("Host", "Port"), (str, int))
         __validate_hostname(config, "Hud", "Host")
@@ -92,32 +139,48 @@ def setup(app: Application) -> Controller:
     instrument = app.config["Instrument"]
     limits = app.config["Limits"]
 
-    future_book = OrderBook(Instrument.FUTURE, 0.0, 0.0)
-    etf_book = OrderBook(Instrument.ETF, app.config["Fees"]["Maker"], app.config["Fees"]["Taker"])
+    order_book_factory = OrderBookFactory(engine.get("OrderBook", "sorted"), instrument["TickSize"],
+                                          info.get("Depth", TOP_LEVEL_COUNT), engine.get("AggregateFills", False))
+    future_book = order_book_factory.create(Instrument.FUTURE, 0.0, 0.0)
+    etf_book = order_book_factory.create(Instrument.ETF, app.config["Fees"]["Maker"], app.config["Fees"]["Taker"])
 
     match_events = MatchEvents()
     match_events_writer = MatchEventsWriter(match_events, engine["MatchEventsFile"], app.event_loop)
-    market_events_reader = MarketEventsReader(engine["MarketDataFile"], app.event_loop, future_book, etf_book,
-                                              match_events)
+    order_pool = OrderPool() if engine.get("OrderPool", False) else None
+    reader_class = MarketEventsReader
+    if engine.get("MarketDataLoader", "thread") == "numpy":
+        reader_class = NumPyMarketEventsReader
+    market_events_reader = reader_class(engine["MarketDataFile"], app.event_loop, future_book, etf_book, match_events,
+                                        order_pool, engine.get("StartTime", 0.0), engine.get("MarketEventSliceSize", 0),
+                                        engine.get("MarketEventSliceTime", 0) / 1e6,
+                                        engine.get("MarketEventStatisticsInterval", MARKET_EVENT_STATISTICS_INTERVAL))
     score_board_writer = ScoreBoardWriter(engine["ScoreBoardFile"], app.event_loop)
 
-    tick_timer = Timer(engine["TickInterval"], engine["Speed"])
+    # With a virtual clock, tick jitter comes from a seeded generator so that it is the same in each run
+    virtual_clock = engine.get("Clock", "real") == "virtual"
+    clock: Optional[VirtualTimeEventLoop] = app.event_loop if virtual_clock else None
+    tick_timer = Timer(engine["TickInterval"], engine["Speed"],
+                       random.Random(engine.get("Seed", 0)) if virtual_clock else None)
     account_factory = AccountFactory(instrument["EtfClamp"], instrument["TickSize"])
-    unhedged_lots_factory = UnhedgedLotsFactory()
+    unhedged_lots_factory = UnhedgedLotsFactory(engine["Speed"])
     competitor_manager = CompetitorManager(app.config["Limits"], app.config["Traders"], account_factory, etf_book,
                                            future_book, match_events, score_board_writer, instrument["TickSize"],
                                            tick_timer, unhedged_lots_factory)
 
     limiter_factory = FrequencyLimiterFactory(limits["MessageFrequencyInterval"] / engine["Speed"],
                                               limits["MessageFrequencyLimit"])
-    exec_server = ExecutionServer(exec_["Host"], exec_["Port"], competitor_manager, limiter_factory)
+    exec_server = ExecutionServer(exec_["Host"], exec_["Port"], competitor_manager, limiter_factory,
+                                  engine.get("MessageLatency", 0.0) / engine["Speed"], clock)
     info_publisher = InformationPublisher(app.event_loop, PublisherFactory(info["Type"], info["Name"]),
-                                          (future_book, etf_book), tick_timer)
+                                          (future_book, etf_book), tick_timer, clock)
 
-    market_timer = Timer(engine["MarketEventInterval"], engine["Speed"])
+    market_timer = Timer(engine["MarketEventInterval"], engine["Speed"],
+                         random.Random(engine.get("Seed", 0) + 1) if virtual_clock else None)
     controller = Controller(engine["MarketOpenDelay"], exec_server, info_publisher, market_events_reader,
-                            match_events_writer, score_board_writer, market_timer, tick_timer)
+                            match_events_writer, score_board_writer, market_timer, tick_timer,
+                            len(app.config["Traders"]) if virtual_clock else None)
     competitor_manager.controller = controller
+    competitor_manager.competitor_logged_in.append(controller.on_competitor_logged_in)
     exec_server.controller = controller
 
     if "Hud" in app.config:
@@ -129,8 +192,15 @@ def setup(app: Application) -> Controller:
     return controller
 
 
+def __create_event_loop(config) -> Optional[VirtualTimeEventLoop]:
+    """Return a virtual time event loop if the configuration asks for one."""
+    if config["Engine"].get("Clock", "real") == "virtual":
+        return VirtualTimeEventLoop(config["Engine"].get("VirtualIdleWait", DEFAULT_IDLE_WAIT))
+    return None
+
+
 def main():
-    app = Application("exchange", __exchange_config_validator)
+    app = Application("exchange", __exchange_config_validator, __create_event_loop)
     controller: Controller = setup(app)
     app.run()
     controller.cleanup()
@@ -29,22 +29,33 @@ from .messages import (AMEND_MESSAGE, AMEND_MESSAGE_SIZE, CANCEL_MESSAGE, CANCEL
                        ORDER_FILLED_MESSAGE_SIZE, ORDER_STATUS_MESSAGE, ORDER_STATUS_MESSAGE_SIZE,
                        Connection, MessageType)
 from .types import IController, IExecutionConnection
+from .virtual_clock import VirtualTimeEventLoop
 
 
 class ExecutionConnection(Connection, IExecutionConnection):
     def __init__(self, competitor_manager: CompetitorManager, frequency_limiter: FrequencyLimiter,
-                 controller: IController):
-        """Initialise a new instance of the ExecutionChannel class."""
+                 controller: IController, message_latency: float = 0.0,
+                 clock: Optional[VirtualTimeEventLoop] = None):
+        """Initialise a new instance of the ExecutionChannel class.
+
+        If the message latency is more than zero, each message from the
+        auto-trader is handled that many seconds after it arrives. If a
+        virtual clock is given, it is held until the auto-trader has logged
+        in and told to expect input whenever a message is sent.
+        """
         Connection.__init__(self)
 
         self.competitor: Optional[Competitor] = None
         self.competitor_manager: CompetitorManager = competitor_manager
         self.controller: IController = controller
+        self.clock: Optional[VirtualTimeEventLoop] = clock
         self.closing: bool = False
         self.frequency_limiter: FrequencyLimiter = frequency_limiter
         self.logger: logging.Logger = logging.getLogger("EXECUTION")
+        self.message_latency: float = message_latency
         self.login_timeout: asyncio.Handle = asyncio.get_running_loop().call_later(1.0, self.close)
 
+        self.__awaiting_login: bool = False
         self.__error_message = bytearray(ERROR_MESSAGE_SIZE)
         self.__hedge_filled_message = bytearray(HEDGE_FILLED_MESSAGE_SIZE)
         self.__order_status_message = bytearray(ORDER_STATUS_MESSAGE_SIZE)
@@ -63,6 +74,7 @@ class ExecutionConnection(Connection, IExecutionConnection):
         """Close the connection associated with this ExecutionChannel instance."""
         Connection.close(self)
         self.login_timeout.cancel()
+        self.__end_login()
         self.closing = True
         if self._connection_transport and not self._connection_transport.is_closing():
             self._connection_transport.close()
@@ -72,6 +84,7 @@ class ExecutionConnection(Connection, IExecutionConnection):
         Connection.connection_lost(self, exc)
 
         self.login_timeout.cancel()
+        self.__end_login()
         if self.competitor is not None:
             self.competitor.on_connection_lost(self.controller.advance_time())
         self.competitor_manager.on_competitor_disconnect()
@@ -82,9 +95,25 @@ class ExecutionConnection(Connection, IExecutionConnection):
         """Called when the connection is established."""
         Connection.connection_made(self, transport)
         self.competitor_manager.on_competitor_connect()
+        if self.clock is not None:
+            self.__awaiting_login = True
+            self.clock.hold()
 
     def on_message(self, typ: int, data: bytes, start: int, length: int) -> None:
         """Called when a message is received from the auto-trader."""
+        if self.message_latency:
+            asyncio.get_running_loop().call_later(self.message_latency, self.__on_delayed_message, typ,
+                                                  data[start:start + length - HEADER_SIZE], length)
+        else:
+            self.__handle_message(typ, data, start, length)
+
+    def __on_delayed_message(self, typ: int, data: bytes, length: int) -> None:
+        """Called when a message's latency has passed."""
+        if not self._closing and self._connection_transport is not None:
+            self.__handle_message(typ, data, 0, length)
+
+    def __handle_message(self, typ: int, data: bytes, start: int, length: int) -> None:
+        """Handle a message from the auto-trader."""
         now: float = self.controller.advance_time()
 
         if self.frequency_limiter.check_event(now):
@@ -122,9 +151,21 @@ class ExecutionConnection(Connection, IExecutionConnection):
                                  self._file_number, self.competitor.name, now, length, typ)
             self.close()
 
+    def __end_login(self) -> None:
+        """Release the hold on the virtual clock, if any, now that the login is over."""
+        if self.__awaiting_login:
+            self.__awaiting_login = False
+            self.clock.release()
+
+    def __on_sent(self) -> None:
+        """Called after a message is sent to the auto-trader, which may answer it."""
+        if self.clock is not None:
+            self.clock.expect_input()
+
     def on_login(self, name: str, secret: str) -> None:
         """Called when a login message is received."""
         self.login_timeout.cancel()
+        self.__end_login()
 
         self.competitor = self.competitor_manager.login_competitor(name, secret, self)
         if self.competitor is None:
@@ -138,29 +179,34 @@ class ExecutionConnection(Connection, IExecutionConnection):
         """Send an error message to the auto-trader."""
         ERROR_MESSAGE.pack_into(self.__error_message, HEADER_SIZE, client_order_id, error_message)
         self._connection_transport.write(self.__error_message)
+        self.__on_sent()
 
     def send_hedge_filled(self, client_order_id: int, average_price: int, volume: int) -> None:
         """Send a hedge filled message to the auto-trader."""
         HEDGE_FILLED_MESSAGE.pack_into(self.__hedge_filled_message, HEADER_SIZE, client_order_id, average_price,
                                        volume)
         self._connection_transport.write(self.__hedge_filled_message)
+        self.__on_sent()
 
     def send_order_filled(self, client_order_id: int, price: int, volume: int) -> None:
         """Send an order filled message to the auto-trader."""
         ORDER_FILLED_MESSAGE.pack_into(self.__order_filled_message, HEADER_SIZE, client_order_id, price, volume)
         self._connection_transport.write(self.__order_filled_message)
+        self.__on_sent()
 
     def send_order_status(self, client_order_id: int, fill_volume: int, remaining_volume: int, fees: int) -> None:
         """Send an order status message to the auto-trader."""
         ORDER_STATUS_MESSAGE.pack_into(self.__order_status_message, HEADER_SIZE, client_order_id, fill_volume,
                                        remaining_volume, fees)
         self._connection_transport.write(self.__order_status_message)
+        self.__on_sent()
 
 
 class ExecutionServer:
     """A server for execution connections."""
     def __init__(self, host: str, port: int, competitor_manager: CompetitorManager,
-                 limiter_factory: FrequencyLimiterFactory):
+                 limiter_factory: FrequencyLimiterFactory, message_latency: float = 0.0,
+                 clock: Optional[VirtualTimeEventLoop] = None):
         """Initialise a new instance of the ExecutionServer class."""
         self.controller: Optional[IController] = None
         self.host: str = host
@@ -168,7 +214,9 @@ class ExecutionServer:
 
         self.__competitor_manager: CompetitorManager = competitor_manager
         self.__limiter_factory: FrequencyLimiterFactory = limiter_factory
+        self.__clock: Optional[VirtualTimeEventLoop] = clock
         self.__logger = logging.getLogger("EXECUTION")
+        self.__message_latency: float = message_latency
         self.__server: Optional[asyncio.AbstractServer] = None
 
     def close(self):
@@ -177,7 +225,8 @@ class ExecutionServer:
 
     def __on_new_connection(self) -> ExecutionConnection:
         """Callback for when a new connection is accepted."""
-        return ExecutionConnection(self.__competitor_manager, self.__limiter_factory.create(), self.controller)
+        return ExecutionConnection(self.__competitor_manager, self.__limiter_factory.create(), self.controller,
+                                    self.__message_latency, self.__clock)
 
     async def start(self) -> None:
         """Start the server."""
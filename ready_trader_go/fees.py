@@ -0,0 +1,60 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+# Fee rates are held as integers in micro basis points (millionths of a
+# hundredth of a percent), so a rate of 1.0 is FEE_SCALE micro basis points
+FEE_SCALE = 10_000_000_000
+
+
+def to_micro_basis_points(rate: float) -> int:
+    """Return the given fee rate (e.g. 0.0002) in micro basis points."""
+    return round(rate * FEE_SCALE)
+
+
+def scaled_fee(amount: int) -> int:
+    """Return the fee for an amount in cents times micro basis points.
+
+    The result is rounded to the nearest cent, with halves rounded to the
+    nearest even number of cents.
+    """
+    fee, remainder = divmod(amount, FEE_SCALE)
+    remainder *= 2
+    if remainder > FEE_SCALE or (remainder == FEE_SCALE and fee & 1):
+        fee += 1
+    return fee
+
+
+class FeeSchedule(object):
+    """Maker and taker fees calculated in fixed-point arithmetic.
+
+    The fee for a fill is price times volume times the fee rate, rounded to
+    the nearest cent. Because the rates are integers the result is exact and
+    does not depend on floating-point rounding.
+    """
+
+    def __init__(self, maker_fee: float, taker_fee: float):
+        """Initialise a new instance of the FeeSchedule class."""
+        self.maker_rate: int = to_micro_basis_points(maker_fee)
+        self.taker_rate: int = to_micro_basis_points(taker_fee)
+
+    def maker_fee_per_lot(self, price: int) -> int:
+        """Return the fee per lot, in cents times micro basis points, for passive fills at a price."""
+        return price * self.maker_rate
+
+    def taker_fee(self, price: int, volume: int) -> int:
+        """Return the fee, in cents, for an aggressive fill."""
+        return scaled_fee(price * self.taker_rate * volume)
@@ -115,11 +115,13 @@ class HudConnection(Connection, IExecutionConnection):
         """Called when a match event occurs."""
         if event.operation == MatchEventOperation.AMEND:
             AMEND_EVENT_MESSAGE.pack_into(self.__amend_event_message, HEADER_SIZE, event.time,
-                                          self.__competitor_ids[event.competitor], event.order_id, event.volume)
+                                          self.__competitor_ids[event.competitor], event.order_id,
+                                          event.instrument.value, event.volume)
             self._connection_transport.write(self.__amend_event_message)
         elif event.operation == MatchEventOperation.CANCEL:
             CANCEL_EVENT_MESSAGE.pack_into(self.__cancel_event_message, HEADER_SIZE, event.time,
-                                           self.__competitor_ids[event.competitor], event.order_id)
+                                           self.__competitor_ids[event.competitor], event.order_id,
+                                           event.instrument.value)
             self._connection_transport.write(self.__cancel_event_message)
         elif event.operation == MatchEventOperation.INSERT:
             INSERT_EVENT_MESSAGE.pack_into(self.__insert_event_message, HEADER_SIZE, event.time,
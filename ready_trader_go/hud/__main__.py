@@ -23,11 +23,13 @@ import string
 import sys
 import time
 
-from typing import Any, Mapping, Tuple
+from typing import Any, List, Mapping, Optional, Tuple
 
 from PySide6 import QtGui, QtWidgets
 from PySide6.QtCore import Qt
 
+from ready_trader_go.market_cache import MarketSnapshot, load_snapshots
+
 from .event_source import EventSource, LiveEventSource, RecordedEventSource
 from .main_window.main_window import MainWindow
 
@@ -98,13 +100,17 @@ def __validate_configuration(filename: pathlib.Path, config: Mapping[str, Any])
     return True
 
 
-def replay(path: pathlib.Path):
+def replay(path: pathlib.Path, market_data: Optional[pathlib.Path] = None, start_time: float = 0.0):
     app = __create_application()
     splash = __show_splash()
+    market_snapshots: Optional[List[MarketSnapshot]] = None
+    if market_data is not None:
+        splash.showMessage("Loading snapshots of %s..." % str(market_data), Qt.AlignBottom, QtGui.QColor("#F0F0F0"))
+        market_snapshots = load_snapshots(str(market_data))
     splash.showMessage("Processing %s..." % str(path), Qt.AlignBottom, QtGui.QColor("#F0F0F0"))
     etf_clamp, tick_size = __read_exchange_config()
     with path.open("r", newline="") as csv_file:
-        event_source = RecordedEventSource.from_csv(csv_file, etf_clamp, tick_size)
+        event_source = RecordedEventSource.from_csv(csv_file, etf_clamp, tick_size, market_snapshots, start_time)
     window = __show_main_window(splash, event_source)
     return app.exec_()
 
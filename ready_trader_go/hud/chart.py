@@ -110,6 +110,9 @@ class MidpointChartGadget(BaseChartGadget):
             line_series.attachAxis(self.chart.axisY())
             line_series.setColor(self._COLOURS[i])
 
+        # Only replays with market data snapshots have market-only midpoint prices, so these are added when needed
+        self.market_series: Dict[Instrument, QtCharts.QSplineSeries] = dict()
+
         self.__last_price: Optional[float] = None
         self.__timer = QtCore.QTimer(self)
         self.__timer.timeout.connect(self.__on_timer_tick)
@@ -135,6 +138,22 @@ class MidpointChartGadget(BaseChartGadget):
         if not self.__timer.isActive():
             self.__timer.start(6000)
 
+    def on_market_midpoint_price_changed(self, instrument: Instrument, time: float, mid_price: float) -> None:
+        """Callback when the midpoint price of an instrument's market-only order book changes."""
+        line_series: Optional[QtCharts.QSplineSeries] = self.market_series.get(instrument)
+        if line_series is None:
+            line_series = self.market_series[instrument] = QtCharts.QSplineSeries()
+            line_series.setName(Instrument(instrument).name + " (market only)")
+            self.chart.addSeries(line_series)
+            line_series.attachAxis(self.chart.axisX())
+            line_series.attachAxis(self.chart.axisY())
+            pen = QtGui.QPen(self._COLOURS[instrument])
+            pen.setStyle(Qt.DashLine)
+            line_series.setPen(pen)
+        price = mid_price / 100.0
+        self._update_y_axis(price)
+        line_series.append(time, price)
+
 
 class ProfitLossChartGadget(BaseChartGadget):
     """A chart of the profit, or loss, of each team."""
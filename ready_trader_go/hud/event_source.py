@@ -19,11 +19,12 @@ import collections
 import csv
 import itertools
 
-from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Set, TextIO, Tuple
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, TextIO, Tuple
 
 from PySide6 import QtCore,  QtNetwork
 
 from ready_trader_go.account import AccountFactory, CompetitorAccount
+from ready_trader_go.market_cache import MarketSnapshot, find_snapshot
 from ready_trader_go.messages import (AMEND_EVENT_MESSAGE, AMEND_EVENT_MESSAGE_SIZE, CANCEL_EVENT_MESSAGE,
                                       CANCEL_EVENT_MESSAGE_SIZE, ERROR_MESSAGE, ERROR_MESSAGE_SIZE, HEADER_SIZE,
                                       HEDGE_EVENT_MESSAGE, HEDGE_EVENT_MESSAGE_SIZE, INSERT_EVENT_MESSAGE,
@@ -49,6 +50,9 @@ class EventSource(QtCore.QObject):
 
     login_occurred = QtCore.Signal(str)   # team
 
+    # instrument, time, midpoint price in cents of the order book with market data orders only
+    market_midpoint_price_changed = QtCore.Signal(Instrument, float, float)
+
     match_over = QtCore.Signal()
 
     midpoint_price_changed = QtCore.Signal(Instrument, float, float)  # instrument, time, price in cents
@@ -99,8 +103,8 @@ class LiveEventSource(EventSource):
 
         self.__accounts: Dict[int, CompetitorAccount] = dict()
         self.__now: float = 0.0
+        self.__order_book_versions: List[int] = [-1 for _ in Instrument]
         self.__order_books: List[OrderBook] = list(OrderBook(i, 0.0, 0.0) for i in Instrument)
-        self.__orders: Dict[int, Dict[int, Order]] = {0: dict()}
         self.__stop_later: bool = False
         self.__teams: Dict[int, str] = {0: ""}
 
@@ -168,23 +172,22 @@ class LiveEventSource(EventSource):
     def on_error_message(self, client_order_id: int, error_message: bytes):
         """Callback when an error message is received."""
 
-    def on_amend_event_message(self, now: float, competitor_id: int, order_id: int, volume_delta: int) -> None:
+    def on_amend_event_message(self, now: float, competitor_id: int, order_id: int, instrument: int,
+                               volume_delta: int) -> None:
         """Callback when an amend event message is received."""
         self.__now = now
-        order = self.__orders[competitor_id].get(order_id)
+        order = self.__order_books[instrument].get(competitor_id, order_id)
         if order is not None:
-            self.__order_books[order.instrument].amend(now, order, order.volume + volume_delta)
-            if order.remaining_volume == 0:
-                del self.__orders[competitor_id][order_id]
+            self.__order_books[instrument].amend(now, order, order.volume + volume_delta)
         if competitor_id != 0:
             self.order_amended.emit(self.__teams[competitor_id], now, order_id, volume_delta)
 
-    def on_cancel_event_message(self, now: float, competitor_id: int, order_id: int) -> None:
+    def on_cancel_event_message(self, now: float, competitor_id: int, order_id: int, instrument: int) -> None:
         """Callback when an cancel event message is received."""
         self.__now = now
-        order = self.__orders[competitor_id].pop(order_id, None)
+        order = self.__order_books[instrument].get(competitor_id, order_id)
         if order is not None:
-            self.__order_books[order.instrument].cancel(now, order)
+            self.__order_books[instrument].cancel(now, order)
         if competitor_id != 0:
             self.order_cancelled.emit(self.__teams[competitor_id], now, order_id)
 
@@ -192,8 +195,8 @@ class LiveEventSource(EventSource):
                                 volume: int, price: int, lifespan: int) -> None:
         """Callback when an insert event message is received."""
         self.__now = now
-        order = Order(order_id, Instrument(instrument), Lifespan(lifespan), Side(side), price, volume)
-        self.__orders[competitor_id][order_id] = order
+        order = Order(order_id, Instrument(instrument), Lifespan(lifespan), Side(side), price, volume,
+                      owner=competitor_id)
         self.__order_books[instrument].insert(now, order)
         if competitor_id != 0:
             self.order_inserted.emit(self.__teams[competitor_id], now, order_id, Instrument(instrument),
@@ -209,7 +212,6 @@ class LiveEventSource(EventSource):
         """Callback when an login event message is received."""
         self.__accounts[competitor_id] = self._account_factory.create()
         self.__teams[competitor_id] = name
-        self.__orders[competitor_id] = dict()
         self.login_occurred.emit(name)
 
     def _on_timer_tick(self):
@@ -221,10 +223,13 @@ class LiveEventSource(EventSource):
             midpoint_price: float = self.__order_books[i].midpoint_price()
             if midpoint_price is not None:
                 self.midpoint_price_changed.emit(i, self.__now, midpoint_price)
-                self.__order_books[i].top_levels(self.__ask_prices, self.__ask_volumes, self.__bid_prices,
-                                                 self.__bid_volumes)
-                self.order_book_changed.emit(i, self.__now, self.__ask_prices, self.__ask_volumes,
-                                             self.__bid_prices, self.__bid_volumes)
+                version: int = self.__order_books[i].top_levels_version()
+                if version != self.__order_book_versions[i]:
+                    self.__order_book_versions[i] = version
+                    self.__order_books[i].top_levels(self.__ask_prices, self.__ask_volumes, self.__bid_prices,
+                                                     self.__bid_volumes)
+                    self.order_book_changed.emit(i, self.__now, self.__ask_prices, self.__ask_volumes,
+                                                 self.__bid_prices, self.__bid_volumes)
 
         future_price: int = self.__order_books[Instrument.FUTURE].last_traded_price()
         etf_price: int = self.__order_books[Instrument.ETF].last_traded_price()
@@ -249,10 +254,6 @@ class LiveEventSource(EventSource):
         self.__accounts[competitor_id].transact(Instrument(instrument), Side(side), price, volume, fee)
         self.trade_occurred.emit(self.__teams[competitor_id], now, order_id, Side(side), volume, price, fee)
 
-        order = self.__orders[competitor_id].get(order_id)
-        if order and order.remaining_volume == 0:
-            del self.__orders[competitor_id][order_id]
-
     def start(self) -> None:
         """Start this live event source."""
         self.__socket.connectToHost(self.host, self.port)
@@ -306,8 +307,15 @@ class RecordedEventSource(EventSource):
 
     @staticmethod
     def from_csv(file_object: TextIO, etf_clamp: float, tick_size: float,
+                 market_snapshots: Optional[Sequence[MarketSnapshot]] = None, start_time: float = 0.0,
                  parent: Optional[QtCore.QObject] = None):
-        """Create a new RecordedEventSource instance from a CSV file."""
+        """Create a new RecordedEventSource instance from a CSV file.
+
+        If the snapshots of the market data file the match was run with are
+        given, the midpoint prices of the market-only order books are
+        replayed alongside those of the match. The start time is the number
+        of seconds into the market data file at which the match started.
+        """
         source = RecordedEventSource(etf_clamp, tick_size, parent)
         events = source.__events
 
@@ -316,18 +324,37 @@ class RecordedEventSource(EventSource):
 
         accounts: Dict[str, CompetitorAccount] = collections.defaultdict(source._account_factory.create)
         books: Tuple[OrderBook, ...] = tuple(OrderBook(i, 0.0, 0.0) for i in Instrument)
-        orders: Dict[str, Dict[int, Order]] = collections.defaultdict(dict)
 
         ask_prices = [0] * TOP_LEVEL_COUNT
         ask_volumes = [0] * TOP_LEVEL_COUNT
         bid_prices = [0] * TOP_LEVEL_COUNT
         bid_volumes = [0] * TOP_LEVEL_COUNT
+        snapshots: Tuple[List[int], ...] = tuple([0] * (4 * TOP_LEVEL_COUNT) for _ in Instrument)
+        versions: List[int] = [-1 for _ in Instrument]
+
+        def find_order(row: List[str], team: str, order_id: int) -> Optional[Order]:
+            # Files recorded before amends and cancels gave their instrument do not say which book to look in
+            if row[4]:
+                return books[int(row[4])].get(team, order_id)
+            return books[Instrument.FUTURE].get(team, order_id) or books[Instrument.ETF].get(team, order_id)
 
         def take_snapshot(when: float):
             for i in Instrument:
                 events.append(Event(when, source.midpoint_price_changed.emit, (i, when, books[i].midpoint_price())))
-                books[i].top_levels(ask_prices, ask_volumes, bid_prices, bid_volumes)
-                source.__order_books[i].extend(itertools.chain(ask_prices, ask_volumes, bid_prices, bid_volumes))
+                version: int = books[i].top_levels_version()
+                if version != versions[i]:
+                    versions[i] = version
+                    books[i].top_levels(ask_prices, ask_volumes, bid_prices, bid_volumes)
+                    snapshots[i][:] = itertools.chain(ask_prices, ask_volumes, bid_prices, bid_volumes)
+                source.__order_books[i].extend(snapshots[i])
+
+            if market_snapshots:
+                market: Optional[MarketSnapshot] = find_snapshot(market_snapshots, start_time + when)
+                if market is not None:
+                    for i, book in zip(Instrument, (market.future, market.etf)):
+                        midpoint: Optional[float] = book.midpoint_price()
+                        if midpoint is not None:
+                            events.append(Event(when, source.market_midpoint_price_changed.emit, (i, when, midpoint)))
 
             future_price: int = books[Instrument.FUTURE].last_traded_price()
             etf_price: int = books[Instrument.ETF].last_traded_price()
@@ -356,21 +383,19 @@ class RecordedEventSource(EventSource):
 
             if operation == "Insert":
                 order = Order(order_id, Instrument(int(row[4])), Lifespan[row[8]], Side[row[5]],
-                              int(row[7]), int(row[6]))
+                              int(row[7]), int(row[6]), owner=team)
                 books[order.instrument].insert(tm, order)
-                orders[team][order_id] = order
                 events.append(Event(tm, source.order_inserted.emit, (team, tm, order_id, order.instrument,
                                                                      order.side, order.volume, order.price,
                                                                      order.lifespan)))
             elif operation == "Amend":
-                order = orders[team][order_id]
                 volume_delta = int(row[6])
-                books[order.instrument].amend(tm, order, order.volume + volume_delta)
-                if order.remaining_volume == 0:
-                    del orders[team][order_id]
+                order = find_order(row, team, order_id)
+                if order:
+                    books[order.instrument].amend(tm, order, order.volume + volume_delta)
                 events.append(Event(tm, source.order_amended.emit, (team, tm, order_id, volume_delta)))
             elif operation == "Cancel":
-                order = orders[team].pop(order_id, None)
+                order = find_order(row, team, order_id)
                 if order:
                     books[order.instrument].cancel(tm, order)
                 events.append(Event(tm, source.order_cancelled.emit, (team, tm, order_id)))
@@ -382,8 +407,6 @@ class RecordedEventSource(EventSource):
                 fee = int(row[9]) if row[9] else 0
                 accounts[team].transact(instrument, side, price, volume, fee)
                 if operation == "Trade":
-                    if order_id in orders[team] and orders[team][order_id].remaining_volume == 0:
-                        del orders[team][order_id]
                     events.append(Event(tm, source.trade_occurred.emit, (team, tm, order_id, side, volume, price,
                                                                          fee)))
 
@@ -221,6 +221,7 @@ class MainWindow(Ui_main_window, QtWidgets.QMainWindow):
         self.midpoint_price_chart_action.setEnabled(False)
         self.__mcg = MidpointChartGadget(self)
         self.event_source.midpoint_price_changed.connect(self.__mcg.on_midpoint_price_changed)
+        self.event_source.market_midpoint_price_changed.connect(self.__mcg.on_market_midpoint_price_changed)
         self.__show_sub_window(self.__mcg, self.__on_midpoint_price_chart_closed, 0.55, 0.3)
 
     def __show_profit_loss_chart(self) -> None:
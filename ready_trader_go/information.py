@@ -20,24 +20,35 @@ import logging
 
 from typing import Iterable, List, Optional, Tuple
 
-from .messages import (HEADER, HEADER_SIZE, ORDER_BOOK_HEADER, ORDER_BOOK_HEADER_SIZE,
-                       ORDER_BOOK_MESSAGE, ORDER_BOOK_MESSAGE_SIZE, TRADE_TICKS_HEADER, TRADE_TICKS_HEADER_SIZE,
-                       TRADE_TICKS_MESSAGE, TRADE_TICKS_MESSAGE_SIZE, MessageType)
+from .messages import (BOOK_LEVEL_SIZE, HEADER, HEADER_SIZE, ORDER_BOOK_HEADER, ORDER_BOOK_HEADER_SIZE,
+                       TRADE_TICKS_HEADER, TRADE_TICKS_HEADER_SIZE, MessageType, book_message_struct,
+                       order_book_message_size, trade_ticks_message_size)
 from .order_book import TOP_LEVEL_COUNT, OrderBook
-from .pubsub import PublisherFactory
+from .pubsub import MAXIMUM_PAYLOAD_LENGTH, PublisherFactory
 from .timer import Timer
 from .types import Instrument
+from .virtual_clock import VirtualTimeEventLoop
+
+# The deepest order book that fits in a single information channel frame
+MAXIMUM_DEPTH: int = (MAXIMUM_PAYLOAD_LENGTH - max(ORDER_BOOK_HEADER_SIZE, TRADE_TICKS_HEADER_SIZE)) // BOOK_LEVEL_SIZE
 
 
 class InformationPublisher(asyncio.DatagramProtocol):
     """A publisher of exchange information."""
 
     def __init__(self, loop: asyncio.AbstractEventLoop, publisher_factory: PublisherFactory,
-                 order_books: Iterable[OrderBook], timer: Timer):
-        """Initialize a new instance of the InformationChannel class."""
+                 order_books: Iterable[OrderBook], timer: Timer, clock: Optional[VirtualTimeEventLoop] = None):
+        """Initialize a new instance of the InformationChannel class.
+
+        The number of price levels published on each side is the depth of the
+        order books, which must all have the same depth. If a virtual clock
+        is given, it is told to expect input whenever information is sent.
+        """
+        self.__clock: Optional[VirtualTimeEventLoop] = clock
         self.__event_loop: asyncio.AbstractEventLoop = loop
         self.__file_number: int = 0
         self.__logger: logging.Logger = logging.getLogger("INFORMATION")
+        self.__book_versions: List[int] = [-1 for _ in Instrument]
         self.__order_books: Tuple[OrderBook] = tuple(order_books)
         self.__publisher_factory: PublisherFactory = publisher_factory
         self.__send_ticks_handles: List[Optional[asyncio.Handle]] = [None for _ in Instrument]
@@ -49,17 +60,28 @@ class InformationPublisher(asyncio.DatagramProtocol):
             book.trade_occurred.append(self.on_trade)
         timer.timer_ticked.append(self.on_timer_tick)
 
+        depth: int = self.__order_books[0].depth if self.__order_books else TOP_LEVEL_COUNT
+        if any(book.depth != depth for book in self.__order_books):
+            raise ValueError("order books must all have the same depth")
+        if depth > MAXIMUM_DEPTH:
+            raise ValueError("order book depth must not be greater than %d" % MAXIMUM_DEPTH)
+
         # Store book data for dissemination to competitors.
-        self.__ask_prices: List[int] = [0] * TOP_LEVEL_COUNT
-        self.__ask_volumes: List[int] = [0] * TOP_LEVEL_COUNT
-        self.__bid_prices: List[int] = [0] * TOP_LEVEL_COUNT
-        self.__bid_volumes: List[int] = [0] * TOP_LEVEL_COUNT
+        self.__ask_prices: List[int] = [0] * depth
+        self.__ask_volumes: List[int] = [0] * depth
+        self.__bid_prices: List[int] = [0] * depth
+        self.__bid_volumes: List[int] = [0] * depth
 
-        # Message buffers
-        self.__book_message = bytearray(ORDER_BOOK_MESSAGE_SIZE)
-        self.__ticks_message = bytearray(TRADE_TICKS_MESSAGE_SIZE)
-        HEADER.pack_into(self.__book_message, 0, ORDER_BOOK_MESSAGE_SIZE, MessageType.ORDER_BOOK_UPDATE)
-        HEADER.pack_into(self.__ticks_message, 0, TRADE_TICKS_MESSAGE_SIZE, MessageType.TRADE_TICKS)
+        # Message buffers (one order book message per instrument so that it
+        # only needs to be repacked when that book's top levels change)
+        book_message_size: int = order_book_message_size(depth)
+        ticks_message_size: int = trade_ticks_message_size(depth)
+        self.__book_messages = [bytearray(book_message_size) for _ in Instrument]
+        self.__levels_message = book_message_struct(depth)
+        self.__ticks_message = bytearray(ticks_message_size)
+        for book_message in self.__book_messages:
+            HEADER.pack_into(book_message, 0, book_message_size, MessageType.ORDER_BOOK_UPDATE)
+        HEADER.pack_into(self.__ticks_message, 0, ticks_message_size, MessageType.TRADE_TICKS)
 
     def connection_made(self, transport: asyncio.WriteTransport) -> None:
         """Called when the datagram endpoint is created."""
@@ -69,11 +91,17 @@ class InformationPublisher(asyncio.DatagramProtocol):
     def on_timer_tick(self, timer: Timer, now: float, tick_number: int) -> None:
         """Called each time the timer ticks."""
         for book in self.__order_books:
-            book.top_levels(self.__ask_prices, self.__ask_volumes, self.__bid_prices, self.__bid_volumes)
-            ORDER_BOOK_HEADER.pack_into(self.__book_message, HEADER_SIZE, book.instrument, tick_number)
-            ORDER_BOOK_MESSAGE.pack_into(self.__book_message, ORDER_BOOK_HEADER_SIZE, *self.__ask_prices,
-                                         *self.__ask_volumes, *self.__bid_prices, *self.__bid_volumes)
-            self.__transport.write(self.__book_message)
+            book_message = self.__book_messages[book.instrument]
+            version = book.top_levels_version()
+            if version != self.__book_versions[book.instrument]:
+                self.__book_versions[book.instrument] = version
+                book.top_levels(self.__ask_prices, self.__ask_volumes, self.__bid_prices, self.__bid_volumes)
+                self.__levels_message.pack_into(book_message, ORDER_BOOK_HEADER_SIZE, *self.__ask_prices,
+                                                *self.__ask_volumes, *self.__bid_prices, *self.__bid_volumes)
+            ORDER_BOOK_HEADER.pack_into(book_message, HEADER_SIZE, book.instrument, tick_number)
+            self.__transport.write(book_message)
+        if self.__clock is not None:
+            self.__clock.expect_input()
 
     def on_trade(self, book: OrderBook) -> None:
         """Called when a trade occurs in one of the order books."""
@@ -88,9 +116,11 @@ class InformationPublisher(asyncio.DatagramProtocol):
             self.__trade_ticks_sequences[order_book.instrument] += 1
             TRADE_TICKS_HEADER.pack_into(self.__ticks_message, HEADER_SIZE, order_book.instrument,
                                          self.__trade_ticks_sequences[order_book.instrument])
-            TRADE_TICKS_MESSAGE.pack_into(self.__ticks_message, TRADE_TICKS_HEADER_SIZE, *self.__ask_prices,
-                                          *self.__ask_volumes, *self.__bid_prices, *self.__bid_volumes)
+            self.__levels_message.pack_into(self.__ticks_message, TRADE_TICKS_HEADER_SIZE, *self.__ask_prices,
+                                            *self.__ask_volumes, *self.__bid_prices, *self.__bid_volumes)
             self.__transport.write(self.__ticks_message)
+            if self.__clock is not None:
+                self.__clock.expect_input()
 
     async def start(self) -> None:
         """Start this publisher."""
@@ -0,0 +1,188 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+import bisect
+import hashlib
+import os
+import struct
+
+from typing import List, NamedTuple, Optional, Tuple
+
+from .market_data import read_market_data
+from .market_index import apply_market_event
+from .order_book import TOP_LEVEL_COUNT, OrderBook
+from .types import Instrument
+
+# Snapshot files are kept in this directory, named after the hash of the
+# market data file they were made from, so renamed or copied market data
+# files share a cache and changed ones never use a stale one
+CACHE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "ready_trader_go")
+CACHE_SUFFIX = ".snap"
+SNAPSHOT_INTERVAL = 0.25  # Seconds of market data between snapshots, the same as the default tick interval
+
+CACHE_MAGIC = b"RTGS"
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct("<4sB3x32sdII")  # Magic, version, market data hash, interval, depth and snapshot count
+
+
+class BookSnapshot(NamedTuple):
+    """The top levels of an order book, holding market data orders only, at one moment."""
+    last_traded_price: Optional[int]
+    ask_prices: Tuple[int, ...]
+    ask_volumes: Tuple[int, ...]
+    bid_prices: Tuple[int, ...]
+    bid_volumes: Tuple[int, ...]
+
+    def midpoint_price(self) -> Optional[float]:
+        """Return the midpoint price, or None if either side of the book is empty."""
+        if self.ask_prices[0] and self.bid_prices[0]:
+            return (self.ask_prices[0] + self.bid_prices[0]) / 2.0
+        return None
+
+
+class MarketSnapshot(NamedTuple):
+    """The state of both order books after every market event before the given time."""
+    time: float
+    future: BookSnapshot
+    etf: BookSnapshot
+
+
+def __snapshot_struct(depth: int) -> struct.Struct:
+    """Return the struct for a snapshot with the given number of levels on each side."""
+    book: str = "i%di" % (4 * depth)  # Last traded price, then ask prices and volumes and bid prices and volumes
+    return struct.Struct("<d" + book * len(Instrument))
+
+
+def build_snapshots(filename: str, interval: float = SNAPSHOT_INTERVAL,
+                    depth: int = TOP_LEVEL_COUNT) -> List[MarketSnapshot]:
+    """Return snapshots of the order books at every multiple of the interval through a market data file.
+
+    The market events are applied to a pair of order books with no other
+    orders, as they are by the exchange simulator, so a snapshot at a given
+    time holds the effect of every event before that time. The last
+    snapshot is at the first multiple of the interval after the last event.
+    """
+    books: Tuple[OrderBook, ...] = tuple(OrderBook(i, 0.0, 0.0, depth) for i in Instrument)
+    snapshots: List[MarketSnapshot] = []
+    next_time: float = interval
+
+    for row in read_market_data(filename):
+        while row[0] >= next_time:
+            snapshots.append(__take_snapshot(next_time, books))
+            next_time += interval
+        apply_market_event(books, row)
+
+    snapshots.append(__take_snapshot(next_time, books))
+    return snapshots
+
+
+def cache_filename(digest: bytes, interval: float, depth: int, directory: str = CACHE_DIRECTORY) -> str:
+    """Return the name of the snapshot file for market data with the given hash."""
+    return os.path.join(directory, "%s-%r-%d%s" % (digest.hex(), interval, depth, CACHE_SUFFIX))
+
+
+def file_hash(filename: str) -> bytes:
+    """Return the SHA-256 hash of a file's contents."""
+    digest = hashlib.sha256()
+    with open(filename, "rb") as market_data:
+        for block in iter(lambda: market_data.read(1 << 20), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+def find_snapshot(snapshots: List[MarketSnapshot], time: float) -> Optional[MarketSnapshot]:
+    """Return the latest snapshot at or before the given time, or None if there is no such snapshot."""
+    i = bisect.bisect_right(snapshots, time, key=lambda s: s.time)
+    return snapshots[i - 1] if i else None
+
+
+def load_snapshots(filename: str, interval: float = SNAPSHOT_INTERVAL, depth: int = TOP_LEVEL_COUNT,
+                   directory: str = CACHE_DIRECTORY) -> List[MarketSnapshot]:
+    """Return the snapshots of a market data file, from the cache if possible.
+
+    If the cache has no snapshots for the file's contents, interval and
+    depth, they are built and saved in the cache. Failing to save them is
+    not an error, because they can always be built again.
+    """
+    digest: bytes = file_hash(filename)
+    cache_file: str = cache_filename(digest, interval, depth, directory)
+    snapshots: Optional[List[MarketSnapshot]] = read_snapshots(cache_file, digest, interval, depth)
+    if snapshots is None:
+        snapshots = build_snapshots(filename, interval, depth)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            write_snapshots(cache_file, digest, interval, depth, snapshots)
+        except OSError:
+            pass
+    return snapshots
+
+
+def read_snapshots(cache_file: str, digest: bytes, interval: float, depth: int) -> Optional[List[MarketSnapshot]]:
+    """Return the snapshots in a snapshot file.
+
+    Return None if there is no such file, or if it was made from different
+    market data or with a different interval or depth.
+    """
+    try:
+        with open(cache_file, "rb") as snapshot_file:
+            data = snapshot_file.read()
+    except OSError:
+        return None
+
+    record: struct.Struct = __snapshot_struct(depth)
+    try:
+        magic, version, cache_digest, cache_interval, cache_depth, count = CACHE_HEADER.unpack_from(data, 0)
+    except struct.error:
+        return None
+    if (magic != CACHE_MAGIC or version != CACHE_VERSION or cache_digest != digest or cache_interval != interval
+            or cache_depth != depth or len(data) != CACHE_HEADER.size + count * record.size):
+        return None
+
+    book_size: int = 1 + 4 * depth
+    snapshots: List[MarketSnapshot] = []
+    for fields in record.iter_unpack(memoryview(data)[CACHE_HEADER.size:]):
+        books = [BookSnapshot(fields[i] or None, fields[i + 1:i + 1 + depth], fields[i + 1 + depth:i + 1 + 2 * depth],
+                              fields[i + 1 + 2 * depth:i + 1 + 3 * depth], fields[i + 1 + 3 * depth:i + book_size])
+                 for i in range(1, len(fields), book_size)]
+        snapshots.append(MarketSnapshot(fields[0], *books))
+    return snapshots
+
+
+def __take_snapshot(time: float, books: Tuple[OrderBook, ...]) -> MarketSnapshot:
+    """Return a snapshot of a pair of order books."""
+    depth: int = books[0].depth
+    snapshot: List[BookSnapshot] = []
+    for book in books:
+        ask_prices, ask_volumes, bid_prices, bid_volumes = [0] * depth, [0] * depth, [0] * depth, [0] * depth
+        book.top_levels(ask_prices, ask_volumes, bid_prices, bid_volumes)
+        snapshot.append(BookSnapshot(book.last_traded_price(), tuple(ask_prices), tuple(ask_volumes),
+                                     tuple(bid_prices), tuple(bid_volumes)))
+    return MarketSnapshot(time, *snapshot)
+
+
+def write_snapshots(cache_file: str, digest: bytes, interval: float, depth: int,
+                    snapshots: List[MarketSnapshot]) -> None:
+    """Write snapshots of market data with the given hash to a snapshot file."""
+    record: struct.Struct = __snapshot_struct(depth)
+    with open(cache_file, "wb") as snapshot_file:
+        snapshot_file.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, digest, interval, depth, len(snapshots)))
+        for snapshot in snapshots:
+            fields: List = [snapshot.time]
+            for book in (snapshot.future, snapshot.etf):
+                fields.append(book.last_traded_price or 0)
+                fields.extend(book.ask_prices + book.ask_volumes + book.bid_prices + book.bid_volumes)
+            snapshot_file.write(record.pack(*fields))
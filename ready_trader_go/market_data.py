@@ -0,0 +1,316 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+import bz2
+import csv
+import enum
+import gzip
+import io
+import lzma
+import mmap
+import os
+import struct
+
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, TextIO, Tuple, Union
+
+from .types import Instrument, Lifespan, MarketEventOperation, Side
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Prices in market data files are in dollars, but order books work in cents
+INPUT_SCALING = 100
+
+# A binary market data file is a header followed by one fixed-width record
+# per market event, in the order the events appear in the CSV file
+BINARY_MAGIC = b"RTGM"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sB3xQ")  # Magic, version and number of records
+BINARY_RECORD = struct.Struct("<dqiiBBBB")  # Time, order id, volume, price, instrument, operation, side and lifespan
+BINARY_NONE = 0xFF  # Stands for an empty side or lifespan
+BINARY_STREAM_BLOCK = 4096  # Records read at a time from a compressed binary file
+
+# Market data files with these extensions are decompressed as they are read
+DECOMPRESSORS: Dict[str, Callable[..., BinaryIO]] = {".bz2": bz2.open, ".gz": gzip.open, ".lzma": lzma.open,
+                                                     ".xz": lzma.open}
+
+# Fields of the NumPy structured array used for market data, which have the
+# same layout as a binary market data record
+ARRAY_FIELDS = [("time", "<f8"), ("order_id", "<i8"), ("volume", "<i4"), ("price", "<i4"), ("instrument", "u1"),
+                ("operation", "u1"), ("side", "u1"), ("lifespan", "u1")]
+
+# The columns of a market data CSV file as read by load_csv_array
+CSV_FIELDS = [("time", "<f8"), ("instrument", "<U8"), ("operation", "<U8"), ("order_id", "<i8"), ("side", "<U8"),
+              ("volume", "<U24"), ("price", "<U24"), ("lifespan", "<U8")]
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+MarketDataRow = Tuple[float, Instrument, MarketEventOperation, int, Optional[Side], int, int, Optional[Lifespan]]
+
+
+def convert_csv(source: TextIO, destination: BinaryIO) -> int:
+    """Compile a market data CSV file into the binary format.
+
+    The destination must be seekable, because the header is rewritten with
+    the number of records once they have all been written. Return the number
+    of records written.
+    """
+    return write_binary(parse_csv(source), destination)
+
+
+def binary_record_count(data: Buffer) -> int:
+    """Return the number of records in the given binary market data.
+
+    Raise ValueError if the data is not binary market data or it is
+    truncated.
+    """
+    count: int = __binary_header_count(data)
+    if len(data) < BINARY_HEADER.size + count * BINARY_RECORD.size:
+        raise ValueError("market data file is truncated")
+    return count
+
+
+def __binary_header_count(data: Buffer) -> int:
+    """Return the number of records given in the header of binary market data."""
+    try:
+        magic, version, count = BINARY_HEADER.unpack_from(data, 0)
+    except struct.error as e:
+        raise ValueError("market data file is truncated") from e
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ValueError("data is not a binary market data file")
+    return count
+
+
+def __binary_rows(records: Buffer) -> Iterator[MarketDataRow]:
+    """Yield the market events in a buffer of binary market data records."""
+    instruments = tuple(Instrument)
+    operations = tuple(MarketEventOperation)
+    sides = {s.value: s for s in Side}
+    sides[BINARY_NONE] = None
+    lifespans = {l.value: l for l in Lifespan}
+    lifespans[BINARY_NONE] = None
+
+    for time, order_id, volume, price, instrument, operation, side, lifespan in BINARY_RECORD.iter_unpack(records):
+        yield (time, instruments[instrument], operations[operation], order_id, sides[side], volume, price,
+               lifespans[lifespan])
+
+
+def __enum_codes(column: Any, members: Mapping[str, enum.IntEnum], allow_empty: bool) -> Any:
+    """Return an array of the values of the enum members named in a column, with BINARY_NONE for empty cells."""
+    codes = numpy.full(len(column), BINARY_NONE, dtype=numpy.uint8)
+    known = column == "" if allow_empty else numpy.zeros(len(column), dtype=bool)
+    for name, member in members.items():
+        mask = column == name
+        codes[mask] = member.value
+        known |= mask
+    if not known.all():
+        raise ValueError("unknown value '%s' in market data" % column[~known][0])
+    return codes
+
+
+def __numbers(column: Any) -> Any:
+    """Return a column of numbers as an array of floats, with zero for empty cells."""
+    return numpy.where(column == "", "0", column).astype(numpy.float64)
+
+
+def is_binary(prefix: bytes) -> bool:
+    """Return True if the given leading bytes of a file belong to a binary market data file."""
+    return prefix[:len(BINARY_MAGIC)] == BINARY_MAGIC
+
+
+def load_array(filename: str) -> Any:
+    """Load a CSV or binary market data file into a NumPy structured array.
+
+    The array has the fields listed in ARRAY_FIELDS, with prices in cents
+    and BINARY_NONE for an empty side or lifespan. A binary file is
+    memory-mapped and the array uses the mapped memory directly. Raise
+    RuntimeError if NumPy is not installed and ValueError if the file is not
+    valid market data.
+    """
+    if numpy is None:
+        raise RuntimeError("NumPy is not installed")
+
+    compressed: Optional[BinaryIO] = open_compressed(filename)
+    with compressed or open(filename, "rb") as market_data:
+        if is_binary(market_data.read(len(BINARY_MAGIC))):
+            if compressed is None:
+                data = mmap.mmap(market_data.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                market_data.seek(0)
+                data = market_data.read()
+            return numpy.frombuffer(data, numpy.dtype(ARRAY_FIELDS), binary_record_count(data), BINARY_HEADER.size)
+        market_data.seek(0)
+        return load_csv_array(io.TextIOWrapper(market_data, newline=""))
+
+
+def load_csv_array(source: TextIO) -> Any:
+    """Load a market data CSV file into a NumPy structured array with the fields listed in ARRAY_FIELDS.
+
+    NumPy parses the file straight into typed columns. Columns that hold
+    enum names or may be empty are read as short strings and then converted
+    as a whole.
+    """
+    columns = numpy.loadtxt(source, dtype=CSV_FIELDS, delimiter=",", skiprows=1, ndmin=1, quotechar='"')
+
+    result = numpy.empty(len(columns), numpy.dtype(ARRAY_FIELDS))
+    result["time"] = columns["time"]
+    result["instrument"] = __enum_codes(columns["instrument"], {str(i.value): i for i in Instrument}, False)
+    result["operation"] = __enum_codes(columns["operation"], MarketEventOperation.__members__, False)
+    result["order_id"] = columns["order_id"]
+    result["side"] = __enum_codes(columns["side"], Side.__members__, True)
+    result["volume"] = __numbers(columns["volume"]).astype(numpy.int32)
+    result["price"] = (__numbers(columns["price"]) * INPUT_SCALING).astype(numpy.int32)
+    result["lifespan"] = __enum_codes(columns["lifespan"], Lifespan.__members__, True)
+    return result
+
+
+def open_compressed(filename: str, mode: str = "rb") -> Optional[BinaryIO]:
+    """Open a compressed market data file, if its extension is one of those in DECOMPRESSORS, or return None.
+
+    Reading the returned file decompresses it as it goes.
+    """
+    opener = DECOMPRESSORS.get(os.path.splitext(filename)[1].lower())
+    return opener(filename, mode) if opener is not None else None
+
+
+def parse_binary(data: Buffer, first: int = 0) -> Iterator[MarketDataRow]:
+    """Yield the market events in the given binary market data, starting with the record numbered first.
+
+    Raise ValueError if the data is not binary market data or it is
+    truncated.
+    """
+    start: int = BINARY_HEADER.size + first * BINARY_RECORD.size
+    end: int = BINARY_HEADER.size + binary_record_count(data) * BINARY_RECORD.size
+    with memoryview(data) as view, view[start:end] as records:
+        yield from __binary_rows(records)
+
+
+def parse_binary_stream(source: BinaryIO, first: int = 0) -> Iterator[MarketDataRow]:
+    """Yield the market events in a binary market data file, starting with the record numbered first.
+
+    The file is read a block of records at a time, so it may be a
+    decompressing file object. Raise ValueError if the file is not binary
+    market data or it is truncated.
+    """
+    remaining: int = __binary_header_count(source.read(BINARY_HEADER.size)) - first
+    source.seek(BINARY_HEADER.size + first * BINARY_RECORD.size)
+    while remaining > 0:
+        count: int = remaining if remaining < BINARY_STREAM_BLOCK else BINARY_STREAM_BLOCK
+        block: bytes = source.read(count * BINARY_RECORD.size)
+        if len(block) < count * BINARY_RECORD.size:
+            raise ValueError("market data file is truncated")
+        yield from __binary_rows(block)
+        remaining -= count
+
+
+def parse_csv(source: TextIO, skip_header: bool = True) -> Iterator[MarketDataRow]:
+    """Yield the market events in the given market data CSV file.
+
+    If skip_header is False, the source must be positioned after the header
+    row.
+    """
+    csv_reader = csv.reader(source)
+    if skip_header:
+        next(csv_reader)
+    for row in csv_reader:
+        yield parse_csv_row(row)
+
+
+def parse_csv_row(row: List[str]) -> MarketDataRow:
+    """Return the market event in a row of a market data CSV file."""
+    # time, instrument, operation, order_id, side, volume, price, lifespan
+    return (float(row[0]), Instrument(int(row[1])), MarketEventOperation[row[2]], int(row[3]),
+            Side[row[4]] if row[4] else None, int(float(row[5])) if row[5] else 0,
+            int(float(row[6]) * INPUT_SCALING) if row[6] else 0, Lifespan[row[7]] if row[7] else None)
+
+
+def read_market_data(filename: str) -> Iterator[MarketDataRow]:
+    """Yield the market events in a CSV or binary market data file, which may be compressed.
+
+    Raise ValueError if the file is not valid market data.
+    """
+    with open_compressed(filename) or open(filename, "rb") as market_data:
+        binary: bool = is_binary(market_data.read(len(BINARY_MAGIC)))
+        market_data.seek(0)
+        if binary:
+            yield from parse_binary_stream(market_data)
+        else:
+            yield from parse_csv(io.TextIOWrapper(market_data, newline=""))
+
+
+def write_binary(rows: Iterable[MarketDataRow], destination: BinaryIO) -> int:
+    """Write market events to a binary market data file and return the number written.
+
+    The destination must be seekable, because the header is rewritten with
+    the number of records once they have all been written.
+    """
+    destination.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0))
+
+    pack = BINARY_RECORD.pack
+    count: int = 0
+    for time, instrument, operation, order_id, side, volume, price, lifespan in rows:
+        destination.write(pack(time, order_id, volume, price, instrument, operation,
+                               BINARY_NONE if side is None else side,
+                               BINARY_NONE if lifespan is None else lifespan))
+        count += 1
+
+    destination.seek(0)
+    destination.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, count))
+    destination.seek(0, 2)
+    return count
+
+
+def write_csv(rows: Iterable[MarketDataRow], destination: TextIO) -> int:
+    """Write market events to a market data CSV file and return the number written.
+
+    Empty cells are written for the fields an event does not use, as in the
+    recorded market data files.
+    """
+    csv_writer = csv.writer(destination)
+    csv_writer.writerow(("Time", "Instrument", "Operation", "OrderId", "Side", "Volume", "Price", "Lifespan"))
+
+    count: int = 0
+    for time, instrument, operation, order_id, side, volume, price, lifespan in rows:
+        csv_writer.writerow((time, instrument.value, operation.name.capitalize(), order_id,
+                             "" if side is None else ("B" if side == Side.BUY else "A"),
+                             volume if volume else "",
+                             "%.2f" % (price / INPUT_SCALING) if price else "",
+                             "" if lifespan is None else lifespan.name[0]))
+        count += 1
+    return count
+
+
+def write_market_data(filename: str, rows: Iterable[MarketDataRow], binary: bool) -> int:
+    """Write market events to a CSV or binary market data file and return the number written.
+
+    The file is compressed if its extension is one of those in
+    DECOMPRESSORS. A compressed binary file is assembled in memory first,
+    because its header can only be written once the records have been
+    counted.
+    """
+    compressed: Optional[BinaryIO] = open_compressed(filename, "wb")
+    with compressed or open(filename, "wb") as destination:
+        if not binary:
+            with io.TextIOWrapper(destination, newline="") as text:
+                return write_csv(rows, text)
+        if compressed is None:
+            return write_binary(rows, destination)
+        buffer = io.BytesIO()
+        count: int = write_binary(rows, buffer)
+        destination.write(buffer.getbuffer())
+        return count
@@ -16,29 +16,37 @@
 #     License along with Ready Trader Go.  If not, see
 #     <https://www.gnu.org/licenses/>.
 import asyncio
-import csv
-import enum
+import io
+import itertools
 import logging
+import math
+import mmap
+import os
 import queue
+import sys
 import threading
+import time
 
-from typing import Callable, Dict, List, Optional, TextIO
+from typing import (Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple,
+                    Union)
 
+from .market_data import (BINARY_MAGIC, BINARY_NONE, MarketDataRow, binary_record_count, is_binary, load_array,
+                          open_compressed, parse_binary, parse_binary_stream, parse_csv)
+from .market_index import IndexEntry, build_index, find_entry, index_filename, read_index, write_index
 from .match_events import MatchEvents
-from .order_book import IOrderListener, Order, OrderBook
-from .types import Instrument, Lifespan, Side
+from .order_book import IOrderListener, Order, OrderBook, OrderPool
+from .types import Instrument, Lifespan, MarketEventOperation, Side
 
-MARKET_EVENT_QUEUE_SIZE = 1024
-INPUT_SCALING = 100
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
-
-class MarketEventOperation(enum.IntEnum):
-    AMEND = 0
-    CANCEL = 1
-    INSERT = 2
-    Amend = AMEND
-    Cancel = CANCEL
-    Insert = INSERT
+# Market events are passed from the reader thread in chunks, so that the
+# queue is locked once per chunk rather than once per event
+MARKET_EVENT_CHUNK_SIZE = 2048
+MARKET_EVENT_QUEUE_SIZE = 8  # Chunks
+MARKET_EVENT_STATISTICS_INTERVAL = 60.0  # Seconds of match time between reports of the reader statistics
 
 
 class MarketEvent(object):
@@ -58,23 +66,170 @@ class MarketEvent(object):
         self.lifespan: Optional[Lifespan] = lifespan
 
 
+class MarketEventsStatistics(object):
+    """Counters and gauges showing whether the market events reader is keeping up.
+
+    The counters cover the calls to process_market_events since the last
+    reset. Blocked times are in seconds of wall clock time, and lag is in
+    seconds of match time.
+    """
+
+    def __init__(self):
+        """Initialise a new instance of the MarketEventsStatistics class."""
+        self.calls: int = 0
+        self.consumer_wait_time: float = 0.0  # Time spent waiting for the reader thread
+        self.consumer_waits: int = 0
+        self.events: int = 0
+        self.max_events: int = 0  # Most events processed by one call
+        self.max_lag: float = 0.0  # Furthest the oldest unprocessed event was behind the time of a call
+        self.max_queue_size: int = 0  # In chunks
+        self.producer_wait_time: float = 0.0  # Time the reader thread spent waiting for room in the queue
+        self.producer_waits: int = 0
+        self.total_queue_size: int = 0
+
+    def record_call(self, events: int, lag: float, queue_size: int) -> None:
+        """Record a call to process_market_events."""
+        self.calls += 1
+        self.events += events
+        if events > self.max_events:
+            self.max_events = events
+        if lag > self.max_lag:
+            self.max_lag = lag
+        self.total_queue_size += queue_size
+        if queue_size > self.max_queue_size:
+            self.max_queue_size = queue_size
+
+
+class PrefetchedFile(object):
+    """A market data file that is opened, and its first chunk of rows decoded, by a background thread.
+
+    The thread is started by the reader thread while it plays the file
+    before, so the next file is ready to play as soon as that one ends. The
+    rest of the file is decoded by the reader thread, so only one chunk of
+    the next file is held in memory.
+    """
+
+    def __init__(self, filename: str, opener: Callable[[str], Iterator[MarketDataRow]],
+                 reader: "MarketEventsReader"):
+        """Initialise a new instance of the PrefetchedFile class and start its thread."""
+        self.error: Optional[Exception] = None
+        self.filename: str = filename
+        self.finish_time: float = 0.0
+        self.first_rows: List[MarketDataRow] = []
+        self.queue_wait_time: float = 0.0  # The reader's queue wait time when the thread finished
+        self.rest: Iterator[MarketDataRow] = iter(())
+
+        self.__opener: Callable[[str], Iterator[MarketDataRow]] = opener
+        self.__reader: MarketEventsReader = reader
+        self.__thread: threading.Thread = threading.Thread(target=self.__prefetch, daemon=True, name="prefetch")
+        self.__thread.start()
+
+    def rows(self) -> Iterator[MarketDataRow]:
+        """Wait for the thread to finish and return an iterator over the rows of the file.
+
+        Raise the exception that stopped the thread if the file could not be
+        opened.
+        """
+        self.__thread.join()
+        if self.error is not None:
+            raise self.error
+        return itertools.chain(self.first_rows, self.rest)
+
+    def idle_time(self) -> float:
+        """Return the time, in seconds, that the decoded rows have waited to be played.
+
+        Time the reader thread spent waiting for room in the queue in the
+        meantime is left out.
+        """
+        idle: float = (time.perf_counter() - self.finish_time
+                       - (self.__reader.queue_wait_time - self.queue_wait_time))
+        return idle if idle > 0.0 else 0.0
+
+    def __prefetch(self) -> None:
+        """Ask the operating system to start reading the file, then open it and decode its first chunk."""
+        if hasattr(os, "posix_fadvise"):
+            try:
+                fd: int = os.open(self.filename, os.O_RDONLY)
+                try:
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+                finally:
+                    os.close(fd)
+            except OSError:
+                pass  # Any problem with the file is reported when it is opened
+
+        try:
+            self.rest = self.__opener(self.filename)
+            self.first_rows = list(itertools.islice(self.rest, MARKET_EVENT_CHUNK_SIZE))
+        except (OSError, ValueError) as e:
+            self.error = e
+        self.finish_time = time.perf_counter()
+        self.queue_wait_time = self.__reader.queue_wait_time
+
+
 class MarketEventsReader(IOrderListener):
     """A processor of market events read from a file."""
 
-    def __init__(self, filename: str, loop: asyncio.AbstractEventLoop, future_book: OrderBook, etf_book: OrderBook,
-                 match_events: MatchEvents):
+    def __init__(self, filename: Union[str, Sequence[str]], loop: asyncio.AbstractEventLoop, future_book: OrderBook,
+                 etf_book: OrderBook, match_events: MatchEvents, order_pool: Optional[OrderPool] = None,
+                 start_time: float = 0.0, slice_size: int = 0, slice_time: float = 0.0,
+                 statistics_interval: float = MARKET_EVENT_STATISTICS_INTERVAL):
         """Initialise a new instance of the MarketEvents class.
+
+        The filename may be a list of market data files, which are played
+        one after the other as if they were one long file.
+
+        If an order pool is given, orders are taken from it and returned to it
+        once they have been filled, cancelled or amended to zero volume.
+
+        If the start time is not zero, the market data is played from that
+        time. The order books are restored from the latest checkpoint in the
+        first market data file's index before the start time, the events between
+        the checkpoint and the start time are applied at once and later
+        events are shifted earlier by the start time.
+
+        If slice_size or slice_time is not zero, each call to
+        process_market_events processes at most about that many events, or
+        for about that many seconds, and leaves the rest for the next call.
+
+        Statistics on the reader are logged every statistics_interval
+        seconds of match time, unless it is zero.
         """
         self.etf_book: OrderBook = etf_book
-        self.etf_orders: Dict[int, Order] = dict()
         self.event_loop: asyncio.AbstractEventLoop = loop
-        self.filename: str = filename
+        self.filenames: List[str] = [filename] if isinstance(filename, str) else list(filename)
+        self.filename: str = self.filenames[0]
         self.future_book: OrderBook = future_book
-        self.future_orders: Dict[int, Order] = dict()
+        self.finished_orders: List[Order] = list()
         self.logger: logging.Logger = logging.getLogger("MARKET_EVENTS")
         self.match_events: MatchEvents = match_events
+        self.order_pool: Optional[OrderPool] = order_pool
+        # Time decoded rows of prefetched files have waited for the file before to finish
+        self.prefetch_idle_time: float = 0.0
         self.queue: queue.Queue = queue.Queue(MARKET_EVENT_QUEUE_SIZE)
+        self.queue_wait_time: float = 0.0  # Time the reader thread has spent waiting for room in the queue
+        self.queue_waits: int = 0
+        self.events: Iterator[Optional[MarketEvent]] = iter(())  # Remainder of the current chunk
         self.reader_task: Optional[threading.Thread] = None
+        self.restored_orders: Dict[int, Instrument] = dict()  # Instruments of the orders restored from a checkpoint
+        self.slice_size: int = slice_size
+        self.slice_time: float = slice_time
+        self.start_time: float = start_time
+        self.statistics: MarketEventsStatistics = MarketEventsStatistics()
+        self.statistics_interval: float = statistics_interval
+
+        self.__chunk: List[Optional[MarketEvent]] = []  # Events waiting to be queued by the reader thread
+
+        # Reader thread totals at the last report, and when the next is due
+        self.__next_report_time: float = statistics_interval
+        self.__reported_wait_time: float = 0.0
+        self.__reported_waits: int = 0
+
+        # State of the current call to process_market_events, which is shared by its batches of operations
+        self.slice_deadline: float = math.inf
+        self.slice_end: float = 0.0  # Events before this time are processed
+        self.slice_events_left: int = 0
+        self.slice_lag: float = 0.0
+        self.slice_limited: bool = False
 
         # Prime the event pump with a no-op event
         self.next_event: Optional[MarketEvent] = MarketEvent(0.0, Instrument.FUTURE, MarketEventOperation.CANCEL, 0,
@@ -87,96 +242,584 @@ class MarketEventsReader(IOrderListener):
 
     def on_order_amended(self, now: float, order: Order, volume_removed: int) -> None:
         """Called when the order is amended."""
-        self.match_events.amend(now, "", order.client_order_id, -volume_removed)
-        if order.remaining_volume == 0:
-            if order.instrument == Instrument.FUTURE:
-                del self.future_orders[order.client_order_id]
-            elif order.instrument == Instrument.ETF:
-                del self.etf_orders[order.client_order_id]
+        self.match_events.amend(now, "", order.client_order_id, order.instrument, -volume_removed)
+        if order.remaining_volume == 0 and self.order_pool is not None:
+            self.finished_orders.append(order)
 
     def on_order_cancelled(self, now: float, order: Order, volume_removed: int) -> None:
         """Called when the order is cancelled."""
-        self.match_events.cancel(now, "", order.client_order_id, -volume_removed)
-        if order.instrument == Instrument.FUTURE and order.client_order_id in self.future_orders:
-            del self.future_orders[order.client_order_id]
-        elif order.instrument == Instrument.ETF and order.client_order_id in self.etf_orders:
-            del self.etf_orders[order.client_order_id]
-
-    def on_order_placed(self, now: float, order: Order) -> None:
-        """Called when a good-for-day order is placed in the order book."""
-        if order.instrument == Instrument.FUTURE:
-            self.future_orders[order.client_order_id] = order
-        elif order.instrument == Instrument.ETF:
-            self.etf_orders[order.client_order_id] = order
+        self.match_events.cancel(now, "", order.client_order_id, order.instrument, -volume_removed)
+        if self.order_pool is not None:
+            self.finished_orders.append(order)
 
     def on_order_filled(self, now: float, order: Order, price: int, volume: int, fee: int) -> None:
         """Called when the order is partially or completely filled."""
-        if order.remaining_volume == 0:
-            if order.instrument == Instrument.FUTURE and order.client_order_id in self.future_orders:
-                del self.future_orders[order.client_order_id]
-            elif order.instrument == Instrument.ETF and order.client_order_id in self.etf_orders:
-                del self.etf_orders[order.client_order_id]
+        if order.remaining_volume == 0 and self.order_pool is not None:
+            self.finished_orders.append(order)
+
+    def on_order_fills(self, now: float, order: Order, fills: List[Tuple[int, int, int]]) -> None:
+        """Called once an aggressive order has finished trading, with the price, volume and fee of each fill."""
+        if order.remaining_volume == 0 and self.order_pool is not None:
+            self.finished_orders.append(order)
 
     def on_reader_done(self, num_events: int) -> None:
         """Called when the market data reader thread is done."""
         self.logger.info("reader thread complete after processing %d market events", num_events)
 
-    def process_market_events(self, elapsed_time: float) -> None:
-        """Process market events from the queue."""
+    def process_market_events(self, elapsed_time: float) -> float:
+        """Process market events from the queue and return the time up to which they have been processed.
+
+        The returned time is elapsed_time unless the slice size or time ran
+        out first, in which case it is the time of the next event: every
+        event before that time has been processed and none after it, so an
+        order placed at that time sees the market as it was at that time.
+        """
+        self._start_slice(elapsed_time, self.next_event.time if self.next_event else None)
         evt: MarketEvent = self.next_event
 
-        while evt and evt.time < elapsed_time:
-            if evt.instrument == Instrument.FUTURE:
-                orders = self.future_orders
-                book = self.future_book
-            else:
-                orders = self.etf_orders
-                book = self.etf_book
+        # Consecutive events for the same instrument are applied to the book
+        # as a single batch, which preserves the order of events across books.
+        while evt and evt.time < self.slice_end:
+            book = self.future_book if evt.instrument == Instrument.FUTURE else self.etf_book
+            book.apply_batch(self.__book_operations(book, evt))
+            evt = self.next_event
+
+        self._finish_slice(elapsed_time)
+        if evt is None:
+            self._market_data_complete()
+            return elapsed_time
+        return evt.time if evt.time < elapsed_time else elapsed_time
+
+    def _restore_checkpoint(self) -> Optional[IndexEntry]:
+        """Restore the order books from the latest checkpoint before the start time and return its index entry.
+
+        The index is built, and saved next to the market data file, if there
+        is no up-to-date copy. An insert match event, at time zero, is made
+        for each restored order, so that the match events describe the same
+        order books. Return None if the start time is before the first
+        checkpoint.
+        """
+        if self.start_time <= 0.0:
+            return None
+
+        entries: Optional[List[IndexEntry]] = read_index(self.filename)
+        if entries is None:
+            self.logger.info("building market data index: filename='%s'", self.filename)
+            entries = build_index(self.filename)
+            try:
+                write_index(self.filename, entries)
+            except OSError as e:
+                self.logger.warning("failed to write market data index: filename='%s'",
+                                    index_filename(self.filename), exc_info=e)
+
+        entry: Optional[IndexEntry] = find_entry(entries, self.start_time)
+        if entry is not None:
+            checkpoints = ((self.future_book, entry.future_checkpoint), (self.etf_book, entry.etf_checkpoint))
+            for book, checkpoint in checkpoints:
+                for order in book.restore(checkpoint, self):
+                    self.restored_orders[order.client_order_id] = order.instrument
+                    self.match_events.insert(0.0, "", order.client_order_id, order.instrument, order.side,
+                                             order.remaining_volume, order.price, order.lifespan)
+            self.logger.info("restored order books from the checkpoint at time=%.3f", entry.time)
+        return entry
+
+    def report_statistics(self) -> None:
+        """Log the reader statistics and start counting afresh."""
+        stats: MarketEventsStatistics = self.statistics
+        stats.producer_wait_time = self.queue_wait_time - self.__reported_wait_time
+        stats.producer_waits = self.queue_waits - self.__reported_waits
+        self.__reported_wait_time += stats.producer_wait_time
+        self.__reported_waits += stats.producer_waits
+
+        self.logger.info("reader statistics: calls=%d events=%d mean_events=%.1f max_events=%d max_lag=%.6f"
+                         " mean_queue=%.2f max_queue=%d queue_capacity=%d producer_blocked=%.6f"
+                         " producer_waits=%d consumer_blocked=%.6f consumer_waits=%d", stats.calls, stats.events,
+                         stats.events / stats.calls if stats.calls else 0.0, stats.max_events, stats.max_lag,
+                         stats.total_queue_size / stats.calls if stats.calls else 0.0, stats.max_queue_size,
+                         self.queue.maxsize, stats.producer_wait_time, stats.producer_waits,
+                         stats.consumer_wait_time, stats.consumer_waits)
+        self.statistics = MarketEventsStatistics()
+
+    def _finish_slice(self, elapsed_time: float) -> None:
+        """Record statistics at the end of a call to process_market_events and report them if they are due."""
+        self.statistics.record_call((self.slice_size or sys.maxsize) - self.slice_events_left, self.slice_lag,
+                                    self.queue.qsize())
+        if self.statistics_interval and elapsed_time >= self.__next_report_time:
+            self.report_statistics()
+            while self.__next_report_time <= elapsed_time:
+                self.__next_report_time += self.statistics_interval
+
+    def _start_slice(self, elapsed_time: float, next_time: Optional[float]) -> None:
+        """Reset the slice state at the start of a call to process_market_events.
+
+        The next time is that of the oldest unprocessed event, if it is known.
+        """
+        self.slice_lag = elapsed_time - next_time if next_time is not None and next_time < elapsed_time else 0.0
+        self.slice_deadline = time.perf_counter() + self.slice_time if self.slice_time else math.inf
+        self.slice_end = elapsed_time
+        self.slice_events_left = self.slice_size or sys.maxsize
+        self.slice_limited = bool(self.slice_size or self.slice_time)
+
+    def _market_data_complete(self) -> None:
+        """Called when every market event has been processed."""
+        if self.order_pool is not None:
+            self.logger.info("order pool: hits=%d misses=%d", self.order_pool.hits, self.order_pool.misses)
+        for c in self.task_complete:
+            c(self)
+
+    def __book_operations(self, book: OrderBook,
+                          evt: MarketEvent) -> Iterator[Tuple[float, MarketEventOperation, Order, int]]:
+        """Yield order book operations for a run of events for one instrument.
+
+        Operations are generated lazily so that each one sees the effect of
+        the operations before it. The first event not consumed is left in
+        next_event. Once the slice runs out, the slice end is brought
+        forward so that only the remaining events with the same time as the
+        last one are consumed. Market data orders have no owner, so cancels and amends
+        look them up in the order book's index under an owner of None.
+
+        Orders which finished during an operation are only returned to the
+        order pool once the generator resumes, by which time the order book
+        has finished with them.
+        """
+        instrument: Instrument = evt.instrument
+        get_order = book.get
+        pool: Optional[OrderPool] = self.order_pool
+        finished: List[Order] = self.finished_orders
+        events: Iterator[Optional[MarketEvent]] = self.events
+        end: float = self.slice_end
+        events_left: int = self.slice_events_left
+        limited: bool = self.slice_limited
+
+        while evt and evt.time < end and evt.instrument == instrument:
+            if finished:
+                for order in finished:
+                    pool.release(order)
+                finished.clear()
 
             if evt.operation == MarketEventOperation.INSERT:
-                order = Order(evt.order_id, evt.instrument, evt.lifespan, evt.side, evt.price, evt.volume, self)
+                if pool is None:
+                    order = Order(evt.order_id, evt.instrument, evt.lifespan, evt.side, evt.price, evt.volume, self)
+                else:
+                    order = pool.acquire(evt.order_id, evt.instrument, evt.lifespan, evt.side, evt.price, evt.volume,
+                                         self)
                 self.match_events.insert(evt.time, "", order.client_order_id, order.instrument, order.side,
                                          abs(order.volume), order.price, order.lifespan)
-                book.insert(evt.time, order)
-            elif evt.order_id in orders:
-                order = orders[evt.order_id]
-                if evt.operation == MarketEventOperation.CANCEL:
-                    book.cancel(evt.time, order)
-                elif evt.volume < 0:
-                    # evt.operation must be MarketEventOperation.AMEND
-                    book.amend(evt.time, order, order.volume + evt.volume)
+                yield evt.time, MarketEventOperation.INSERT, order, order.volume
+            else:
+                order = get_order(None, evt.order_id)
+                if order is not None:
+                    if evt.operation == MarketEventOperation.CANCEL:
+                        yield evt.time, MarketEventOperation.CANCEL, order, 0
+                    elif evt.volume < 0:
+                        # evt.operation must be MarketEventOperation.AMEND
+                        yield evt.time, MarketEventOperation.AMEND, order, order.volume + evt.volume
 
-            evt = self.queue.get()
+            events_left -= 1
+            if limited and (events_left <= 0 or time.perf_counter() >= self.slice_deadline):
+                end = self.slice_end = math.nextafter(evt.time, math.inf)
+                limited = self.slice_limited = False
+
+            try:
+                evt = next(events)
+            except StopIteration:
+                events = self.events = iter(self.__get())
+                evt = next(events)
 
         self.next_event = evt
-        if evt is None:
-            for c in self.task_complete:
-                c(self)
+        self.slice_events_left = events_left
+
+    def binary_reader(self, market_data: mmap.mmap, first: int = 0) -> Iterator[MarketDataRow]:
+        """Yield the market events in a memory-mapped binary market data file."""
+        with market_data:
+            yield from parse_binary(market_data, first)
+
+    def compressed_reader(self, filename: str, market_data: BinaryIO, binary: bool,
+                          entry: Optional[IndexEntry]) -> Iterator[MarketDataRow]:
+        """Yield the market events in a compressed market data file, decompressing it as it is read.
 
-    def reader(self, market_data: TextIO) -> None:
-        """Read the market data file and place order events in the queue."""
-        fifo = self.queue
+        The rate at which the file was decompressed, leaving out the time
+        spent waiting for room in the queue and, if the file was prefetched,
+        for the file before to finish, is logged at the end.
+        """
+        started: float = time.perf_counter()
+        idle_time: float = self.prefetch_idle_time
+        queue_wait_time: float = self.queue_wait_time
+        with market_data:
+            if binary:
+                yield from parse_binary_stream(market_data, entry.event_number if entry else 0)
+            else:
+                market_data.seek(entry.offset if entry else 0)
+                text: TextIO = io.TextIOWrapper(market_data)
+                yield from parse_csv(text, entry is None)
+            size: int = market_data.tell()
+        elapsed: float = (time.perf_counter() - started - (self.queue_wait_time - queue_wait_time)
+                          - (self.prefetch_idle_time - idle_time))
+        self.logger.info("decompressed %d bytes of market data from %d bytes in %.3f seconds (%.1f MB/s)", size,
+                         os.path.getsize(filename), elapsed, size / elapsed / 1e6 if elapsed else 0.0)
+
+    def playlist_reader(self, rows: Iterator[MarketDataRow]) -> None:
+        """Place the market events of each market data file in the queue, starting with the first file's rows.
+
+        Each file after the first is opened once the one before it has been
+        read, while the end of that file is still waiting in the queue to be
+        processed, so there is no gap between them. Its event times are moved
+        to follow on from the last event of the file before, and its order ids
+        are increased so that they follow on from the largest order id so far.
+        The good-for-day orders left from a file are cancelled before the
+        next file's events, so that each file starts with its own order book.
+        """
+        num_events: int = 0
+        time_offset: float = 0.0
+        id_offset: int = 0
+        last_file: int = len(self.filenames) - 1
+
+        prefetched: Optional[PrefetchedFile] = None
+
+        for i, filename in enumerate(self.filenames):
+            if i:
+                try:
+                    rows = prefetched.rows()
+                except (OSError, ValueError) as e:
+                    self.logger.error("failed to open market data file: filename='%s'" % filename, exc_info=e)
+                    break
+                self.prefetch_idle_time += prefetched.idle_time()
+                self.logger.info("playing market data file: filename='%s' time_offset=%.6f order_id_offset=%d",
+                                 filename, time_offset, id_offset)
+            if i < last_file:
+                prefetched = PrefetchedFile(self.filenames[i + 1], self.__open_whole, self)
 
+            resting: Optional[Dict[int, Instrument]] = None
+            if i < last_file:
+                resting = self.restored_orders.copy() if i == 0 else dict()
+            count, last_time, max_order_id = self.__enqueue(rows, time_offset, id_offset, resting)
+            num_events += count
+
+            if resting is not None:
+                self.__enqueue(((last_time, instrument, MarketEventOperation.CANCEL, order_id, None, 0, 0, None)
+                                for order_id, instrument in resting.items()), time_offset, 0, None)
+                time_offset += last_time
+                id_offset = max(max_order_id, max(self.restored_orders, default=0))
+
+        self.__chunk.append(None)
+        self.__put(self.__chunk)
+        self.event_loop.call_soon_threadsafe(self.on_reader_done, num_events)
+
+    def reader(self, market_data: TextIO, skip_header: bool = True) -> Iterator[MarketDataRow]:
+        """Yield the market events in a market data CSV file."""
         with market_data:
-            csv_reader = csv.reader(market_data)
-            next(csv_reader)  # Skip header row
-            for row in csv_reader:
-                # time, instrument, operation, order_id, side, volume, price, lifespan
-                fifo.put(MarketEvent(float(row[0]), Instrument(int(row[1])), MarketEventOperation[row[2]],
-                                     int(row[3]), Side[row[4]] if row[4] else None,
-                                     int(float(row[5])) if row[5] else 0, int(float(row[6]) * INPUT_SCALING) if row[6] else 0,
-                                     Lifespan[row[7]] if row[7] else None))
-            fifo.put(None)
-
-        self.event_loop.call_soon_threadsafe(self.on_reader_done, csv_reader.line_num - 1)
+            yield from parse_csv(market_data, skip_header)
 
     def start(self):
-        """Start the market events reader thread"""
+        """Start the market events reader thread.
+
+        Each market data file may be either a CSV file or a binary file made
+        by the convert command, which is memory-mapped. Either may be
+        compressed with gzip, bz2 or lzma (with a ".gz", ".bz2", ".xz" or
+        ".lzma" extension), in which case it is decompressed by the reader
+        thread as it is read. The first file is opened, and the others are
+        checked to exist, before the reader thread starts.
+        """
+        filename: str = self.filename
         try:
-            market_data = open(self.filename)
-        except OSError as e:
-            self.logger.error("failed to open market data file: filename='%s'" % self.filename, exc_info=e)
+            entry: Optional[IndexEntry] = self._restore_checkpoint()
+            rows: Iterator[MarketDataRow] = self.__open(filename, entry)
+            for filename in self.filenames[1:]:
+                os.stat(filename)
+        except (OSError, ValueError) as e:
+            self.logger.error("failed to open market data file: filename='%s'" % filename, exc_info=e)
             raise
         else:
-            self.reader_task = threading.Thread(target=self.reader, args=(market_data,), daemon=True, name="reader")
+            self.reader_task = threading.Thread(target=self.playlist_reader, args=(rows,), daemon=True,
+                                                name="reader")
             self.reader_task.start()
+
+    def __open(self, filename: str, entry: Optional[IndexEntry]) -> Iterator[MarketDataRow]:
+        """Open a market data file and return an iterator over its market events, starting from the index entry."""
+        compressed: Optional[BinaryIO] = open_compressed(filename)
+        if compressed is None:
+            return self.__open_uncompressed(filename, entry)
+
+        try:
+            binary: bool = is_binary(compressed.read(len(BINARY_MAGIC)))
+            compressed.seek(0)
+        except (OSError, EOFError) as e:
+            compressed.close()
+            raise ValueError("market data file could not be decompressed") from e
+        return self.compressed_reader(filename, compressed, binary, entry)
+
+    def __open_whole(self, filename: str) -> Iterator[MarketDataRow]:
+        """Open a market data file and return an iterator over all of its market events."""
+        return self.__open(filename, None)
+
+    def __open_uncompressed(self, filename: str, entry: Optional[IndexEntry]) -> Iterator[MarketDataRow]:
+        """Open an uncompressed market data file and return an iterator over its market events."""
+        with open(filename, "rb") as market_data:
+            if is_binary(market_data.read(len(BINARY_MAGIC))):
+                data = mmap.mmap(market_data.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    binary_record_count(data)
+                except ValueError:
+                    data.close()
+                    raise
+                return self.binary_reader(data, entry.event_number if entry else 0)
+
+        csv_file = open(filename, "rb")
+        csv_file.seek(entry.offset if entry else 0)
+        return self.reader(io.TextIOWrapper(csv_file), entry is None)
+
+    def __enqueue(self, rows: Iterable[MarketDataRow], time_offset: float, id_offset: int,
+                  resting: Optional[Dict[int, Instrument]]) -> Tuple[int, float, int]:
+        """Place a market event in the queue for each of the given rows.
+
+        Event times are moved later by the time offset and earlier by the
+        start time (but not before zero) and order ids are increased by the id
+        offset. If resting is given, it is kept up to date with the order ids
+        and instruments of the good-for-day orders inserted and not cancelled.
+        Events are queued in chunks of MARKET_EVENT_CHUNK_SIZE, and the last
+        part-filled chunk is kept for the next call.
+
+        Return the number of rows and, if resting is given, the time in the
+        last row and the largest order id inserted (after the id offset).
+        """
+        shift: float = time_offset - self.start_time
+        chunk: List[Optional[MarketEvent]] = self.__chunk
+        count: int = -len(chunk)
+        last_time: float = 0.0
+        max_order_id: int = id_offset
+        for row in rows:
+            evt = MarketEvent(*row)
+            if shift:
+                evt.time += shift
+                if evt.time < 0.0:
+                    evt.time = 0.0
+            if id_offset:
+                evt.order_id += id_offset
+            if resting is not None:
+                last_time = row[0]
+                if evt.operation == MarketEventOperation.INSERT:
+                    if evt.lifespan == Lifespan.GOOD_FOR_DAY:
+                        resting[evt.order_id] = evt.instrument
+                    if evt.order_id > max_order_id:
+                        max_order_id = evt.order_id
+                elif evt.operation == MarketEventOperation.CANCEL:
+                    resting.pop(evt.order_id, None)
+            chunk.append(evt)
+            if len(chunk) == MARKET_EVENT_CHUNK_SIZE:
+                self.__put(chunk)
+                count += MARKET_EVENT_CHUNK_SIZE
+                chunk = self.__chunk = []
+        count += len(chunk)
+        return count, last_time, max_order_id
+
+    def __get(self) -> List[Optional[MarketEvent]]:
+        """Take a chunk of market events from the queue, recording any time spent waiting in the statistics."""
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            started: float = time.perf_counter()
+            chunk: List[Optional[MarketEvent]] = self.queue.get()
+            self.statistics.consumer_wait_time += time.perf_counter() - started
+            self.statistics.consumer_waits += 1
+            return chunk
+
+    def __put(self, chunk: List[Optional[MarketEvent]]) -> None:
+        """Place a chunk of market events in the queue, adding any time spent waiting to queue_wait_time."""
+        try:
+            self.queue.put_nowait(chunk)
+        except queue.Full:
+            started: float = time.perf_counter()
+            self.queue.put(chunk)
+            self.queue_wait_time += time.perf_counter() - started
+            self.queue_waits += 1
+
+
+class NumPyMarketEventsReader(MarketEventsReader):
+    """A processor of market events loaded into a NumPy structured array.
+
+    The whole market data file is loaded when the reader starts, so no
+    reader thread is needed. Events are processed by index, with the columns
+    converted to lists of Python values a chunk at a time, rather than as a
+    MarketEvent object per event.
+    """
+
+    def __init__(self, filename: str, loop: asyncio.AbstractEventLoop, future_book: OrderBook, etf_book: OrderBook,
+                 match_events: MatchEvents, order_pool: Optional[OrderPool] = None, start_time: float = 0.0,
+                 slice_size: int = 0, slice_time: float = 0.0,
+                 statistics_interval: float = MARKET_EVENT_STATISTICS_INTERVAL):
+        """Initialise a new instance of the NumPyMarketEventsReader class."""
+        super().__init__(filename, loop, future_book, etf_book, match_events, order_pool, start_time, slice_size,
+                         slice_time, statistics_interval)
+        self.market_data: Any = None
+
+        # Columns of the current chunk and the index of the next event in it
+        self.__chunk_start: int = 0
+        self.__index: int = 0
+        self.__instruments: List[int] = []
+        self.__lifespans: List[int] = []
+        self.__operations: List[int] = []
+        self.__order_ids: List[int] = []
+        self.__prices: List[int] = []
+        self.__sides: List[int] = []
+        self.__times: List[float] = []
+        self.__volumes: List[int] = []
+
+    def process_market_events(self, elapsed_time: float) -> float:
+        """Process market events from the array and return the time up to which they have been processed.
+
+        See MarketEventsReader.process_market_events.
+        """
+        self._start_slice(elapsed_time, self.__times[self.__index] if self.__index < len(self.__times) else None)
+        while self.__index < len(self.__times) or self.__next_chunk():
+            next_time: float = self.__times[self.__index]
+            if next_time >= self.slice_end:
+                self._finish_slice(elapsed_time)
+                return next_time if next_time < elapsed_time else elapsed_time
+            instrument = self.__instruments[self.__index]
+            book = self.future_book if instrument == Instrument.FUTURE else self.etf_book
+            book.apply_batch(self.__book_operations(book, instrument))
+
+        self._finish_slice(elapsed_time)
+        self._market_data_complete()
+        return elapsed_time
+
+    def start(self):
+        """Load the market data files."""
+        filename: str = self.filename
+        try:
+            entry: Optional[IndexEntry] = self._restore_checkpoint()
+            arrays: List[Any] = [load_array(filename)[entry.event_number if entry else 0:]]
+            for filename in self.filenames[1:]:
+                arrays.append(load_array(filename))
+        except (OSError, RuntimeError, ValueError) as e:
+            self.logger.error("failed to load market data file: filename='%s'" % filename, exc_info=e)
+            raise
+        self.market_data = arrays[0] if len(arrays) == 1 else self.__join(arrays)
+        self.event_loop.call_soon(self.on_reader_done, len(self.market_data))
+
+    def __book_operations(self, book: OrderBook,
+                          instrument: int) -> Iterator[Tuple[float, MarketEventOperation, Order, int]]:
+        """Yield order book operations for a run of events for one instrument.
+
+        This works like MarketEventsReader.__book_operations, leaving the
+        index at the first event not consumed.
+        """
+        instrument_member: Instrument = Instrument(instrument)
+        get_order = book.get
+        pool: Optional[OrderPool] = self.order_pool
+        finished: List[Order] = self.finished_orders
+        lifespans: Tuple[Lifespan, ...] = tuple(Lifespan)
+        sides: Tuple[Side, ...] = tuple(Side)
+        end: float = self.slice_end
+        events_left: int = self.slice_events_left
+        limited: bool = self.slice_limited
+
+        while self.__index < len(self.__times) or self.__next_chunk():
+            i = self.__index
+            event_time: float = self.__times[i]
+            if event_time >= end or self.__instruments[i] != instrument:
+                break
+            self.__index = i + 1
+
+            if finished:
+                for order in finished:
+                    pool.release(order)
+                finished.clear()
+
+            operation: int = self.__operations[i]
+            if operation == MarketEventOperation.INSERT:
+                side: Side = sides[self.__sides[i]]
+                lifespan: Lifespan = lifespans[self.__lifespans[i]]
+                order_id: int = self.__order_ids[i]
+                price: int = self.__prices[i]
+                volume: int = self.__volumes[i]
+                if pool is None:
+                    order = Order(order_id, instrument_member, lifespan, side, price, volume, self)
+                else:
+                    order = pool.acquire(order_id, instrument_member, lifespan, side, price, volume, self)
+                self.match_events.insert(event_time, "", order_id, instrument_member, side, abs(volume), price,
+                                         lifespan)
+                yield event_time, MarketEventOperation.INSERT, order, volume
+            else:
+                order = get_order(None, self.__order_ids[i])
+                if order is not None:
+                    if operation == MarketEventOperation.CANCEL:
+                        yield event_time, MarketEventOperation.CANCEL, order, 0
+                    elif self.__volumes[i] < 0:
+                        # operation must be MarketEventOperation.AMEND
+                        yield event_time, MarketEventOperation.AMEND, order, order.volume + self.__volumes[i]
+
+            events_left -= 1
+            if limited and (events_left <= 0 or time.perf_counter() >= self.slice_deadline):
+                end = self.slice_end = math.nextafter(event_time, math.inf)
+                limited = self.slice_limited = False
+
+        self.slice_events_left = events_left
+
+    def __join(self, arrays: List[Any]) -> Any:
+        """Join the arrays of a list of market data files into one.
+
+        Times and order ids are moved on, and the good-for-day orders left
+        from each file are cancelled, as they are by
+        MarketEventsReader.playlist_reader.
+        """
+        parts: List[Any] = []
+        time_offset: float = 0.0
+        id_offset: int = 0
+        for i, array in enumerate(arrays):
+            if i:
+                array = array.copy()
+                array["time"] += time_offset
+                array["order_id"] += id_offset
+            parts.append(array)
+            if i == len(arrays) - 1:
+                break
+
+            inserted = array[(array["operation"] == MarketEventOperation.INSERT)
+                             & (array["lifespan"] == Lifespan.GOOD_FOR_DAY)]
+            order_ids = inserted["order_id"]
+            instruments = inserted["instrument"]
+            if i == 0 and self.restored_orders:
+                order_ids = numpy.concatenate((numpy.fromiter(self.restored_orders.keys(), numpy.int64), order_ids))
+                instruments = numpy.concatenate((numpy.fromiter(self.restored_orders.values(), numpy.uint8),
+                                                 instruments))
+            left = ~numpy.isin(order_ids, array["order_id"][array["operation"] == MarketEventOperation.CANCEL])
+
+            if len(array):
+                time_offset = array["time"][-1]
+            cancels = numpy.zeros(numpy.count_nonzero(left), array.dtype)
+            cancels["time"] = time_offset
+            cancels["order_id"] = order_ids[left]
+            cancels["instrument"] = instruments[left]
+            cancels["operation"] = MarketEventOperation.CANCEL
+            cancels["side"] = cancels["lifespan"] = BINARY_NONE
+            parts.append(cancels)
+
+            all_inserted = array["order_id"][array["operation"] == MarketEventOperation.INSERT]
+            id_offset = max(id_offset, int(all_inserted.max(initial=0)), max(self.restored_orders, default=0))
+        return numpy.concatenate(parts)
+
+    def __next_chunk(self) -> bool:
+        """Convert the next chunk of the array to lists and return True, or return False if there are no more."""
+        if self.market_data is None:
+            return False
+
+        start: int = self.__chunk_start + len(self.__times)
+        chunk = self.market_data[start:start + MARKET_EVENT_CHUNK_SIZE]
+        if len(chunk) == 0:
+            return False
+
+        self.__chunk_start = start
+        self.__index = 0
+        self.__instruments = chunk["instrument"].tolist()
+        self.__lifespans = chunk["lifespan"].tolist()
+        self.__operations = chunk["operation"].tolist()
+        self.__order_ids = chunk["order_id"].tolist()
+        self.__prices = chunk["price"].tolist()
+        self.__sides = chunk["side"].tolist()
+        if self.start_time:
+            self.__times = (chunk["time"] - self.start_time).clip(min=0.0).tolist()
+        else:
+            self.__times = chunk["time"].tolist()
+        self.__volumes = chunk["volume"].tolist()
+        return True
@@ -0,0 +1,236 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+import math
+import random
+
+from typing import Dict, Iterator, List, Tuple
+
+from .market_data import INPUT_SCALING, MarketDataRow
+from .types import Instrument, Lifespan, MarketEventOperation, Side
+
+# Order volumes are a whole number of these units, as in the recorded market data
+VOLUME_UNIT = 1000
+MAXIMUM_VOLUME_UNITS = 10
+SWEEP_TICKS = 2  # Aggressive orders may trade up to this many ticks through the best price
+
+
+class MarketDataGenerator:
+    """Generates synthetic market data for load and scaling tests.
+
+    Each instrument has a fair price that follows a random walk, with the
+    ETF's moves correlated with the future's, and passive orders rest up to
+    a given number of ticks either side of the fair price. The generator
+    keeps its own copy of each order book, so that cancels and amends only
+    refer to resting orders and aggressive orders only trade with orders
+    it knows about. Orders that end up on the wrong side of the fair price,
+    or too far from it, as the price moves are cancelled as well.
+
+    The same settings and seed always give the same market data.
+    """
+
+    def __init__(self, duration: float, event_rate: float, depth: int = 10, cancel_ratio: float = 0.45,
+                 volatility: float = 0.0001, correlation: float = 0.9, seed: int = 0, start_price: float = 1000.0,
+                 tick_size: float = 1.0, etf_ratio: float = 0.05, aggressive_ratio: float = 0.02,
+                 amend_ratio: float = 0.01):
+        """Initialise a new instance of the MarketDataGenerator class.
+
+        The event rate is the average number of market events per second,
+        volatility is the standard deviation of the future's return over one
+        second, correlation is that of the ETF's returns with the future's,
+        and the ratios give the share of events of each kind, with the rest
+        being passive inserts. Raise ValueError if a setting is out of range.
+        """
+        if duration <= 0.0 or event_rate <= 0.0:
+            raise ValueError("duration and event rate must be positive")
+        if depth < 1:
+            raise ValueError("depth must be at least one")
+        if volatility < 0.0 or not -1.0 <= correlation <= 1.0:
+            raise ValueError("volatility must not be negative and correlation must be from -1 to 1")
+        if start_price <= 0.0 or tick_size <= 0.0 or round(tick_size * INPUT_SCALING) < 1:
+            raise ValueError("start price and tick size must be positive")
+        if min(cancel_ratio, etf_ratio, aggressive_ratio, amend_ratio) < 0.0 or etf_ratio > 1.0 \
+                or cancel_ratio + aggressive_ratio + amend_ratio > 1.0:
+            raise ValueError("ratios must not be negative and the event ratios must not add up to more than one")
+
+        self.duration: float = duration
+        self.event_rate: float = event_rate
+        self.depth: int = depth
+        self.cancel_ratio: float = cancel_ratio
+        self.volatility: float = volatility
+        self.correlation: float = correlation
+        self.seed: int = seed
+        self.start_price: float = start_price
+        self.tick_size: int = round(tick_size * INPUT_SCALING)
+        self.etf_ratio: float = etf_ratio
+        self.aggressive_ratio: float = aggressive_ratio
+        self.amend_ratio: float = amend_ratio
+
+        self.__random: random.Random = random.Random(seed)
+        self.__next_order_id: int = 1
+        # Price levels of each instrument's bids and asks, keyed by price in ticks, with order ids in time priority
+        self.__levels: Tuple[Tuple[Dict[int, List[int]], ...], ...] = tuple(({}, {}) for _ in Instrument)
+        self.__orders: Dict[int, List[int]] = dict()  # Instrument, side, price in ticks and remaining volume
+        self.__resting: Tuple[List[int], ...] = tuple([] for _ in Instrument)  # For choosing an order at random
+        self.__positions: Dict[int, int] = dict()  # Index of each order in its instrument's resting list
+
+    def rows(self) -> Iterator[MarketDataRow]:
+        """Yield the market events in time order."""
+        rnd = self.__random
+        scale: float = self.volatility
+        independent: float = math.sqrt(1.0 - self.correlation * self.correlation)
+        log_prices: List[float] = [math.log(self.start_price * INPUT_SCALING / self.tick_size)] * len(Instrument)
+
+        for instrument in Instrument:
+            reference: int = self.__reference(log_prices[instrument])
+            for k in range(1, self.depth + 1):
+                yield self.__insert(0.0, instrument, Side.BUY, reference - k)
+                yield self.__insert(0.0, instrument, Side.SELL, reference + k)
+
+        now: float = rnd.expovariate(self.event_rate)
+        previous: float = 0.0
+        while now < self.duration:
+            root_dt: float = math.sqrt(now - previous)
+            future_shock: float = rnd.gauss(0.0, 1.0)
+            log_prices[Instrument.FUTURE] += scale * root_dt * future_shock
+            log_prices[Instrument.ETF] += scale * root_dt * (self.correlation * future_shock
+                                                             + independent * rnd.gauss(0.0, 1.0))
+
+            time: float = round(now, 6)
+            instrument: Instrument = Instrument.ETF if rnd.random() < self.etf_ratio else Instrument.FUTURE
+            reference = self.__reference(log_prices[instrument])
+            yield from self.__prune(time, instrument, reference)
+
+            choice: float = rnd.random()
+            side: Side = Side.BUY if rnd.random() < 0.5 else Side.SELL
+            resting: List[int] = self.__resting[instrument]
+            if choice < self.cancel_ratio and resting:
+                yield self.__cancel(time, resting[rnd.randrange(len(resting))])
+            elif choice < self.cancel_ratio + self.amend_ratio and resting:
+                order_id: int = resting[rnd.randrange(len(resting))]
+                remaining: int = self.__orders[order_id][3]
+                if remaining > VOLUME_UNIT:
+                    yield self.__amend(time, order_id, rnd.randrange(1, remaining // VOLUME_UNIT) * VOLUME_UNIT)
+                else:
+                    yield self.__cancel(time, order_id)
+            elif (choice < self.cancel_ratio + self.amend_ratio + self.aggressive_ratio
+                  and self.__levels[instrument][Side.SELL if side == Side.BUY else Side.BUY]):
+                yield self.__trade(time, instrument, side)
+            else:
+                ticks: int = rnd.randint(1, self.depth)
+                yield self.__insert(time, instrument, side,
+                                    reference - ticks if side == Side.BUY else reference + ticks)
+
+            previous = now
+            now += rnd.expovariate(self.event_rate)
+
+    def __add_resting(self, order_id: int, instrument: Instrument, side: Side, price: int, volume: int) -> None:
+        """Add a passive order to the generator's copy of the order book."""
+        self.__levels[instrument][side].setdefault(price, []).append(order_id)
+        self.__orders[order_id] = [instrument, side, price, volume]
+        resting: List[int] = self.__resting[instrument]
+        self.__positions[order_id] = len(resting)
+        resting.append(order_id)
+
+    def __amend(self, time: float, order_id: int, reduction: int) -> MarketDataRow:
+        """Return an amend event that reduces a resting order's volume."""
+        order: List[int] = self.__orders[order_id]
+        order[3] -= reduction
+        return time, Instrument(order[0]), MarketEventOperation.AMEND, order_id, None, -reduction, 0, None
+
+    def __cancel(self, time: float, order_id: int) -> MarketDataRow:
+        """Return a cancel event for a resting order."""
+        instrument, side, price, _ = self.__orders[order_id]
+        level: List[int] = self.__levels[instrument][side][price]
+        level.remove(order_id)
+        if not level:
+            del self.__levels[instrument][side][price]
+        self.__remove_resting(order_id)
+        return time, Instrument(instrument), MarketEventOperation.CANCEL, order_id, None, 0, 0, None
+
+    def __insert(self, time: float, instrument: Instrument, side: Side, price: int) -> MarketDataRow:
+        """Return an insert event for a new passive order at the given price in ticks."""
+        order_id: int = self.__next_order_id
+        self.__next_order_id += 1
+        volume: int = self.__random.randint(1, MAXIMUM_VOLUME_UNITS) * VOLUME_UNIT
+        self.__add_resting(order_id, instrument, side, price, volume)
+        return (time, instrument, MarketEventOperation.INSERT, order_id, side, volume, price * self.tick_size,
+                Lifespan.GOOD_FOR_DAY)
+
+    def __prune(self, time: float, instrument: Instrument, reference: int) -> Iterator[MarketDataRow]:
+        """Yield cancel events for resting orders that are no longer within depth ticks of the reference price."""
+        bids, asks = self.__levels[instrument][Side.BUY], self.__levels[instrument][Side.SELL]
+        lowest_bid: int = reference - self.depth
+        highest_ask: int = reference + self.depth
+        for price in [p for p in bids if p >= reference or p < lowest_bid]:
+            for order_id in tuple(bids[price]):
+                yield self.__cancel(time, order_id)
+        for price in [p for p in asks if p <= reference or p > highest_ask]:
+            for order_id in tuple(asks[price]):
+                yield self.__cancel(time, order_id)
+
+    def __reference(self, log_price: float) -> int:
+        """Return the reference price in ticks for the given log price, leaving room for the full depth of bids."""
+        return max(round(math.exp(log_price)), self.depth + 1)
+
+    def __remove_resting(self, order_id: int) -> None:
+        """Remove an order from the generator's copy of the order book, except for its price level."""
+        instrument: int = self.__orders.pop(order_id)[0]
+        resting: List[int] = self.__resting[instrument]
+        position: int = self.__positions.pop(order_id)
+        last: int = resting.pop()
+        if last != order_id:
+            resting[position] = last
+            self.__positions[last] = position
+
+    def __trade(self, time: float, instrument: Instrument, side: Side) -> MarketDataRow:
+        """Return a fill-and-kill insert event that trades with the resting orders on the other side.
+
+        The order's price is up to SWEEP_TICKS ticks through the best price
+        on the other side, and the generator's copy of the order book is
+        updated with the fills in price-time priority.
+        """
+        rnd = self.__random
+        opposite: Dict[int, List[int]] = self.__levels[instrument][Side.SELL if side == Side.BUY else Side.BUY]
+        volume: int = rnd.randint(1, MAXIMUM_VOLUME_UNITS) * VOLUME_UNIT
+        sweep: int = rnd.randint(0, SWEEP_TICKS)
+        if side == Side.BUY:
+            price: int = min(opposite) + sweep
+            prices: List[int] = sorted(p for p in opposite if p <= price)
+        else:
+            price = max(opposite) - sweep
+            prices = sorted((p for p in opposite if p >= price), reverse=True)
+
+        remaining: int = volume
+        for level_price in prices:
+            level: List[int] = opposite[level_price]
+            while level and remaining:
+                order: List[int] = self.__orders[level[0]]
+                fill: int = min(remaining, order[3])
+                order[3] -= fill
+                remaining -= fill
+                if order[3] == 0:
+                    self.__remove_resting(level.pop(0))
+            if not level:
+                del opposite[level_price]
+            if not remaining:
+                break
+
+        order_id: int = self.__next_order_id
+        self.__next_order_id += 1
+        return (time, instrument, MarketEventOperation.INSERT, order_id, side, volume, price * self.tick_size,
+                Lifespan.FILL_AND_KILL)
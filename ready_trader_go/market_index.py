@@ -0,0 +1,163 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+import bisect
+import csv
+import os
+import struct
+
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from .market_data import (BINARY_HEADER, BINARY_MAGIC, BINARY_RECORD, MarketDataRow, is_binary, open_compressed,
+                          parse_binary, parse_csv_row)
+from .order_book import Order, OrderBook
+from .types import Instrument, MarketEventOperation
+
+# An index is kept in a file next to the market data file with this suffix
+INDEX_SUFFIX = ".idx"
+CHECKPOINT_INTERVAL = 60.0  # Seconds of market data between checkpoints
+
+INDEX_MAGIC = b"RTGI"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("<4sB3xQqdI")  # Magic, version, market data size and mtime, interval and entry count
+INDEX_ENTRY = struct.Struct("<dQQII")  # Time, event number, offset and future and ETF checkpoint sizes
+
+
+class IndexEntry(NamedTuple):
+    """The state of the market at a point in a market data file.
+
+    The order book checkpoints hold the effect of every event before the
+    given time, and the event number and file offset locate the first event
+    at or after that time.
+    """
+    time: float
+    event_number: int
+    offset: int
+    future_checkpoint: bytes
+    etf_checkpoint: bytes
+
+
+def __rows_with_offsets(filename: str) -> Iterator[Tuple[int, MarketDataRow]]:
+    """Yield the file offset and market event of each row in a CSV or binary market data file.
+
+    The offsets of a compressed file are offsets into the decompressed data.
+    """
+    with open_compressed(filename) or open(filename, "rb") as market_data:
+        if is_binary(market_data.read(len(BINARY_MAGIC))):
+            market_data.seek(0)
+            for i, row in enumerate(parse_binary(market_data.read())):
+                yield BINARY_HEADER.size + i * BINARY_RECORD.size, row
+        else:
+            market_data.seek(0)
+            offset: int = len(market_data.readline())  # Skip header row
+            for line in market_data:
+                if line.strip():
+                    yield offset, parse_csv_row(next(csv.reader((line.decode(),))))
+                offset += len(line)
+
+
+def apply_market_event(books: Sequence[OrderBook], row: MarketDataRow) -> None:
+    """Apply a market event to the order book for its instrument, in a pair of books with no other orders."""
+    time, instrument, operation, order_id, side, volume, price, lifespan = row
+    book = books[instrument]
+    if operation == MarketEventOperation.INSERT:
+        book.insert(time, Order(order_id, instrument, lifespan, side, price, volume))
+    else:
+        order = book.get(None, order_id)
+        if order is not None:
+            if operation == MarketEventOperation.CANCEL:
+                book.cancel(time, order)
+            elif volume < 0:
+                book.amend(time, order, order.volume + volume)
+
+
+def build_index(filename: str, interval: float = CHECKPOINT_INTERVAL) -> List[IndexEntry]:
+    """Return an index of a market data file with order book checkpoints at the given interval.
+
+    The market events are applied to a pair of order books, with no other
+    orders, and the books are checkpointed at every multiple of the interval.
+    """
+    books: Tuple[OrderBook, ...] = tuple(OrderBook(i, 0.0, 0.0) for i in Instrument)
+    entries: List[IndexEntry] = []
+    next_time: float = interval
+
+    for event_number, (offset, row) in enumerate(__rows_with_offsets(filename)):
+        while row[0] >= next_time:
+            entries.append(IndexEntry(next_time, event_number, offset, books[Instrument.FUTURE].checkpoint(),
+                                      books[Instrument.ETF].checkpoint()))
+            next_time += interval
+        apply_market_event(books, row)
+
+    return entries
+
+
+def find_entry(entries: List[IndexEntry], start_time: float) -> Optional[IndexEntry]:
+    """Return the latest index entry at or before the given time, or None if there is no such entry."""
+    i = bisect.bisect_right([e.time for e in entries], start_time)
+    return entries[i - 1] if i else None
+
+
+def index_filename(filename: str) -> str:
+    """Return the name of the index file for a market data file."""
+    return filename + INDEX_SUFFIX
+
+
+def read_index(filename: str, interval: float = CHECKPOINT_INTERVAL) -> Optional[List[IndexEntry]]:
+    """Return the cached index of a market data file.
+
+    Return None if there is no index file, or if the index was built with a
+    different interval or for a different version of the market data file.
+    """
+    try:
+        with open(index_filename(filename), "rb") as index_file:
+            data = index_file.read()
+        stat = os.stat(filename)
+    except OSError:
+        return None
+
+    try:
+        magic, version, size, mtime, index_interval, count = INDEX_HEADER.unpack_from(data, 0)
+        if (magic != INDEX_MAGIC or version != INDEX_VERSION or size != stat.st_size or mtime != stat.st_mtime_ns
+                or index_interval != interval):
+            return None
+
+        entries: List[IndexEntry] = []
+        offset: int = INDEX_HEADER.size
+        for _ in range(count):
+            time, event_number, file_offset, future_size, etf_size = INDEX_ENTRY.unpack_from(data, offset)
+            offset += INDEX_ENTRY.size
+            future_checkpoint = data[offset:offset + future_size]
+            etf_checkpoint = data[offset + future_size:offset + future_size + etf_size]
+            offset += future_size + etf_size
+            entries.append(IndexEntry(time, event_number, file_offset, future_checkpoint, etf_checkpoint))
+    except struct.error:
+        return None
+
+    return entries if offset == len(data) else None
+
+
+def write_index(filename: str, entries: List[IndexEntry], interval: float = CHECKPOINT_INTERVAL) -> None:
+    """Write the index of a market data file to its index file."""
+    stat = os.stat(filename)
+    with open(index_filename(filename), "wb") as index_file:
+        index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns, interval,
+                                           len(entries)))
+        for entry in entries:
+            index_file.write(INDEX_ENTRY.pack(entry.time, entry.event_number, entry.offset,
+                                              len(entry.future_checkpoint), len(entry.etf_checkpoint)))
+            index_file.write(entry.future_checkpoint)
+            index_file.write(entry.etf_checkpoint)
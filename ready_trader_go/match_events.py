@@ -78,15 +78,15 @@ class MatchEvents:
         # Callbacks
         self.event_occurred: List[Callable[[MatchEvent], None]] = list()
 
-    def amend(self, now: float, name: str, order_id: int, diff: int) -> None:
+    def amend(self, now: float, name: str, order_id: int, instrument: Instrument, diff: int) -> None:
         """Create a new amend event."""
-        event = MatchEvent(now, name, MatchEventOperation.AMEND, order_id, None, None, diff, None, None, None)
+        event = MatchEvent(now, name, MatchEventOperation.AMEND, order_id, instrument, None, diff, None, None, None)
         for callback in self.event_occurred:
             callback(event)
 
-    def cancel(self, now: float, name: str, order_id: int, diff: int) -> None:
+    def cancel(self, now: float, name: str, order_id: int, instrument: Instrument, diff: int) -> None:
         """Create a new cancel event."""
-        event = MatchEvent(now, name, MatchEventOperation.CANCEL, order_id, None, None, diff, None, None, None)
+        event = MatchEvent(now, name, MatchEventOperation.CANCEL, order_id, instrument, None, diff, None, None, None)
         for callback in self.event_occurred:
             callback(event)
 
@@ -17,6 +17,7 @@
 #     <https://www.gnu.org/licenses/>.
 import asyncio
 import enum
+import functools
 import logging
 import struct
 
@@ -65,19 +66,40 @@ LOGIN_MESSAGE = struct.Struct("!50s50s")  # Name, secret
 ERROR_MESSAGE = struct.Struct("!I50s")  # message
 HEDGE_FILLED_MESSAGE = struct.Struct("!III")  # Client order id, price, volume
 ORDER_BOOK_HEADER = struct.Struct("!BI")  # Instrument and sequence number
-ORDER_BOOK_MESSAGE = struct.Struct("!%dI" % (4 * order_book.TOP_LEVEL_COUNT))  # Prices & volumes for best bids & asks
 ORDER_FILLED_MESSAGE = struct.Struct("!III")  # Client order id, price, volume
 ORDER_STATUS_MESSAGE = struct.Struct("!IIIi")  # Client order id, fill volume, remaining volume and fees
 TRADE_TICKS_HEADER = struct.Struct("!BI")  # Instrument and sequence number
-TRADE_TICKS_MESSAGE = struct.Struct("!%dI" % (4 * order_book.TOP_LEVEL_COUNT))  # Prices & volumes for best bids & asks
+
+
+# Order book and trade ticks messages carry the prices and volumes of the
+# best asks and bids to a configurable depth, so their structs are generated
+# for each depth. Each level occupies BOOK_LEVEL_SIZE bytes (ask price, ask
+# volume, bid price and bid volume).
+BOOK_LEVEL_SIZE: int = 4 * struct.calcsize("!I")
+
+
+@functools.lru_cache(maxsize=None)
+def book_message_struct(depth: int) -> struct.Struct:
+    """Return the struct for the prices and volumes in an order book or trade ticks message of the given depth."""
+    return struct.Struct("!%dI" % (4 * depth))
+
+
+@functools.lru_cache(maxsize=None)
+def book_part_struct(depth: int) -> struct.Struct:
+    """Return the struct for one of the four parts of an order book or trade ticks message of the given depth."""
+    return struct.Struct("!%dI" % depth)
+
+
+ORDER_BOOK_MESSAGE = book_message_struct(order_book.TOP_LEVEL_COUNT)  # Prices & volumes for best bids & asks
+TRADE_TICKS_MESSAGE = book_message_struct(order_book.TOP_LEVEL_COUNT)  # Prices & volumes for best bids & asks
 
 # Helpers for decoding order book and trade ticks messages
-BOOK_PART = struct.Struct("!%dI" % order_book.TOP_LEVEL_COUNT)
-TICKS_PART = struct.Struct("!%dI" % order_book.TOP_LEVEL_COUNT)
+BOOK_PART = book_part_struct(order_book.TOP_LEVEL_COUNT)
+TICKS_PART = book_part_struct(order_book.TOP_LEVEL_COUNT)
 
 # Matching engine to HUD messages
-AMEND_EVENT_MESSAGE = struct.Struct("!dIIi")  # Time, team id, order id, volume delta
-CANCEL_EVENT_MESSAGE = struct.Struct("!dII")  # Time, team id, order id
+AMEND_EVENT_MESSAGE = struct.Struct("!dIIBi")  # Time, team id, order id, instrument, volume delta
+CANCEL_EVENT_MESSAGE = struct.Struct("!dIIB")  # Time, team id, order id, instrument
 INSERT_EVENT_MESSAGE = struct.Struct("!dIIBBIIB")  # Time, team id, order id, inst, side, volume, price, lifespan
 LOGIN_EVENT_MESSAGE = struct.Struct("!50sI")  # Team name, team id
 HEDGE_EVENT_MESSAGE = struct.Struct("!dIBBId")  # Time, team id, side, instrument, volume, price
@@ -109,6 +131,16 @@ TRADE_EVENT_MESSAGE_SIZE: int = HEADER.size + TRADE_EVENT_MESSAGE.size
 LOGIN_EVENT_MESSAGE_SIZE: int = HEADER.size + LOGIN_EVENT_MESSAGE.size
 
 
+def order_book_message_size(depth: int) -> int:
+    """Return the size of an order book message of the given depth."""
+    return ORDER_BOOK_HEADER_SIZE + depth * BOOK_LEVEL_SIZE
+
+
+def trade_ticks_message_size(depth: int) -> int:
+    """Return the size of a trade ticks message of the given depth."""
+    return TRADE_TICKS_HEADER_SIZE + depth * BOOK_LEVEL_SIZE
+
+
 class Connection(asyncio.Protocol):
     """A stream-based network connection."""
 
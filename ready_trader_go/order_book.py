@@ -16,16 +16,30 @@
 #     License along with Ready Trader Go.  If not, see
 #     <https://www.gnu.org/licenses/>.
 from bisect import bisect, insort_left
-import collections
+import struct
 
-from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, MutableSequence, Optional, Set, Tuple
 
-from .types import Instrument, Lifespan, Side
+from .fees import FeeSchedule, scaled_fee
+from .sweep_curve import SweepCurve
+from .types import Instrument, Lifespan, MarketEventOperation, Side
 
 
 MINIMUM_BID = 1
 MAXIMUM_ASK = 2 ** 31 - 1
 TOP_LEVEL_COUNT = 5
+LADDER_SIZE = 4096
+
+# Binary order book checkpoints: a header, then the pending trade ticks for
+# each side (a count followed by price and volume pairs), then the levels for
+# each side, best first (a count followed by, for each level, its price and
+# order count and then its orders in time priority).
+CHECKPOINT_MAGIC = b"RTGB"
+CHECKPOINT_VERSION = 1
+CHECKPOINT_HEADER = struct.Struct("!4sBBI")  # Magic, format version, instrument, last traded price (zero if none)
+CHECKPOINT_COUNT = struct.Struct("!I")  # Number of trade ticks or levels on one side
+CHECKPOINT_PAIR = struct.Struct("!II")  # Price and volume of a trade tick, or price and order count of a level
+CHECKPOINT_ORDER = struct.Struct("!IIIi")  # Client order id, volume, remaining volume and fees
 
 
 class IOrderListener(object):
@@ -45,14 +59,28 @@ class IOrderListener(object):
         """Called when the order is partially or completely filled."""
         pass
 
+    def on_order_fills(self, now: float, order, fills: List[Tuple[int, int, int]]) -> None:
+        """Called once an aggressive order has finished trading, with the price, volume and fee of each fill.
+
+        This is only called by order books that aggregate fills, in place of
+        a call to on_order_filled for each fill of the aggressive order.
+        """
+        for price, volume, fee in fills:
+            self.on_order_filled(now, order, price, volume, fee)
+
 
 class Order(object):
-    """A request to buy or sell at a given price."""
-    __slots__ = ("client_order_id", "instrument", "lifespan", "listener", "price", "remaining_volume", "side",
-                 "total_fees", "volume")
+    """A request to buy or sell at a given price.
+
+    The owner identifies who placed the order (for example, a team name) and,
+    together with the client order id, is the key for the order in an order
+    book's index of resting orders.
+    """
+    __slots__ = ("client_order_id", "instrument", "lifespan", "listener", "next_order", "owner", "previous_order",
+                 "price", "remaining_volume", "side", "total_fees", "volume")
 
     def __init__(self, client_order_id: int, instrument: Instrument, lifespan: Lifespan, side: Side, price: int,
-                 volume: int, listener: Optional[IOrderListener] = None):
+                 volume: int, listener: Optional[IOrderListener] = None, owner: Any = None):
         """Initialise a new instance of the Order class."""
         self.client_order_id: int = client_order_id
         self.instrument: Instrument = instrument
@@ -63,6 +91,11 @@ class Order(object):
         self.total_fees: int = 0
         self.volume: int = volume
         self.listener: IOrderListener = listener
+        self.owner: Any = owner
+
+        # Links to the neighbouring orders at the same price level
+        self.next_order: Optional[Order] = None
+        self.previous_order: Optional[Order] = None
 
     def __str__(self):
         """Return a string containing a description of this order object."""
@@ -73,32 +106,224 @@ class Order(object):
         return s % args
 
 
+class OrderPool(object):
+    """A free list of Order objects which can be reused once they are done.
+
+    An order may be released to the pool when its remaining volume is zero
+    and neither an order book nor a listener will use it again. Releasing an
+    order that is already in the pool is an error, because the pool would
+    then hand the same order out twice. The hits and misses attributes count
+    the number of acquisitions which were, and were not, satisfied from the
+    free list.
+    """
+
+    def __init__(self):
+        """Initialise a new instance of the OrderPool class."""
+        self.hits: int = 0
+        self.misses: int = 0
+        self.__free: List[Order] = []
+        self.__free_ids: Set[int] = set()  # Identities of the orders in the free list
+
+    def __len__(self) -> int:
+        """Return the number of orders available for reuse."""
+        return len(self.__free)
+
+    def acquire(self, client_order_id: int, instrument: Instrument, lifespan: Lifespan, side: Side, price: int,
+                volume: int, listener: Optional[IOrderListener] = None, owner: Any = None) -> Order:
+        """Return an order with the given attributes, reusing a free one if there is one."""
+        if not self.__free:
+            self.misses += 1
+            return Order(client_order_id, instrument, lifespan, side, price, volume, listener, owner)
+
+        self.hits += 1
+        order: Order = self.__free.pop()
+        self.__free_ids.remove(id(order))
+        order.client_order_id = client_order_id
+        order.instrument = instrument
+        order.lifespan = lifespan
+        order.side = side
+        order.price = price
+        order.remaining_volume = volume
+        order.total_fees = 0
+        order.volume = volume
+        order.listener = listener
+        order.owner = owner
+        order.next_order = order.previous_order = None
+        return order
+
+    def release(self, order: Order) -> None:
+        """Return a finished order to the pool."""
+        if id(order) in self.__free_ids:
+            raise ValueError("order %d is already in the pool" % order.client_order_id)
+        order.listener = order.owner = None
+        self.__free.append(order)
+        self.__free_ids.add(id(order))
+
+
+class PriceLevel(object):
+    """The orders at a single price, in time priority.
+
+    Orders are kept in a doubly-linked list threaded through their
+    next_order and previous_order slots, so that an order can be removed from
+    anywhere in the queue in constant time.
+    """
+    __slots__ = ("first", "last", "total_volume")
+
+    def __init__(self):
+        """Initialise a new instance of the PriceLevel class."""
+        self.first: Optional[Order] = None
+        self.last: Optional[Order] = None
+        self.total_volume: int = 0
+
+    def append(self, order: Order) -> None:
+        """Add an order to the back of the queue."""
+        order.previous_order = self.last
+        if self.last is None:
+            self.first = order
+        else:
+            self.last.next_order = order
+        self.last = order
+
+    def remove(self, order: Order) -> None:
+        """Unlink an order from the queue."""
+        previous_order = order.previous_order
+        next_order = order.next_order
+        if previous_order is None:
+            self.first = next_order
+        else:
+            previous_order.next_order = next_order
+        if next_order is None:
+            self.last = previous_order
+        else:
+            next_order.previous_order = previous_order
+        order.next_order = order.previous_order = None
+
+
+class TradeTicks(object):
+    """The best traded prices, and the volume traded at each, on one side.
+
+    Only the best depth prices are kept and they are kept in order
+    as trades are added, so a flush is a straight copy with no sorting. Prices
+    are stored multiplied by sign (+1 when higher prices are better, -1 when
+    lower prices are better) so that both sides are ordered best first by
+    descending key.
+    """
+    __slots__ = ("count", "depth", "keys", "sign", "volumes")
+
+    def __init__(self, sign: int, depth: int = TOP_LEVEL_COUNT):
+        """Initialise a new instance of the TradeTicks class."""
+        self.count: int = 0
+        self.depth: int = depth
+        self.keys: List[int] = [0] * depth
+        self.sign: int = sign
+        self.volumes: List[int] = [0] * depth
+
+    def add(self, price: int, volume: int) -> None:
+        """Record a trade of the given volume at the given price."""
+        key: int = price * self.sign
+        keys: List[int] = self.keys
+        volumes: List[int] = self.volumes
+        count: int = self.count
+        depth: int = self.depth
+
+        if count == depth and key < keys[-1]:
+            return
+
+        i: int = 0
+        while i < count and keys[i] > key:
+            i += 1
+
+        if i < count and keys[i] == key:
+            volumes[i] += volume
+            return
+
+        if i == depth:
+            return
+
+        j: int = count if count < depth else depth - 1
+        while j > i:
+            keys[j] = keys[j - 1]
+            volumes[j] = volumes[j - 1]
+            j -= 1
+        keys[i] = key
+        volumes[i] = volume
+        if count < depth:
+            self.count = count + 1
+
+    def flush(self, prices: List[int], volumes: List[int]) -> None:
+        """Copy the best prices and volumes into the given lists and reset."""
+        keys: List[int] = self.keys
+        sign: int = self.sign
+        count: int = self.count
+        i: int = 0
+        while i < count:
+            prices[i] = keys[i] * sign
+            volumes[i] = self.volumes[i]
+            i += 1
+        while i < self.depth:
+            prices[i] = volumes[i] = 0
+            i += 1
+        self.count = 0
+
+
 class OrderBook(object):
     """A collection of orders arranged by the price-time priority principle."""
 
-    def __init__(self, instrument: Instrument, maker_fee: float, taker_fee: float):
-        """Initialise a new instance of the OrderBook class."""
+    def __init__(self, instrument: Instrument, maker_fee: float, taker_fee: float, depth: int = TOP_LEVEL_COUNT,
+                 aggregate_fills: bool = False):
+        """Initialise a new instance of the OrderBook class.
+
+        The depth is the number of levels on each side reported by top_levels
+        and the number of prices on each side reported by trade_ticks. If
+        aggregate_fills is True, the listener of an aggressive order is told
+        about all of its fills in one call to on_order_fills and the
+        trade_occurred callbacks are called once per aggressive order, rather
+        than once for each price level it trades at.
+
+        Fees are calculated by a FeeSchedule in fixed-point arithmetic, so
+        they are exact and do not depend on floating-point rounding.
+        """
+        self.aggregate_fills: bool = aggregate_fills
+        self.depth: int = depth
         self.instrument: Instrument = instrument
         self.maker_fee: float = maker_fee
         self.taker_fee: float = taker_fee
+        self.fees: FeeSchedule = FeeSchedule(maker_fee, taker_fee)
 
         self.__ask_prices: List[int] = []
-        self.__ask_ticks: Dict[int, int] = collections.defaultdict(int)
+        self.__ask_ticks: TradeTicks = TradeTicks(-1, depth)
+        self.__batch_value: int = 0
+        self.__batch_volume: int = 0
         self.__bid_prices: List[int] = []
-        self.__bid_ticks: Dict[int, int] = collections.defaultdict(int)
+        self.__bid_ticks: TradeTicks = TradeTicks(1, depth)
+        self.__fills: List[Tuple[int, int, int]] = []
+        self.__in_batch: bool = False
         self.__last_traded_price: Optional[int] = None
-        self.__levels: Dict[int, Deque[Order]] = {}
-        self.__total_volumes: Dict[int, int] = {}
+        self.__levels: Dict[int, PriceLevel] = {}
+        self.__orders: Dict[Any, Dict[int, Order]] = {}  # Resting orders by owner and client order id
+
+        # Sweep curves for each side, which are rebuilt only when the levels they cover change
+        self.__side_versions: List[int] = [0, 0]  # Changes whenever a level on that side changes
+        self.__sweep_curves: List[Optional[SweepCurve]] = [None, None]
+        self.__sweep_curve_versions: List[int] = [-1, -1]
+
+        # Cached copy of the top levels, which is rebuilt only when the version changes
+        self.__cached_version: int = -1
+        self.__top_ask_prices: List[int] = [0] * depth
+        self.__top_ask_volumes: List[int] = [0] * depth
+        self.__top_bid_prices: List[int] = [0] * depth
+        self.__top_bid_volumes: List[int] = [0] * depth
+        self.__version: int = 0
 
         # Signals
         self.trade_occurred: List[Callable[[Any], None]] = list()
 
     def __str__(self):
         """Return a string representation of this order book."""
-        ask_prices = [0] * TOP_LEVEL_COUNT
-        ask_volumes = [0] * TOP_LEVEL_COUNT
-        bid_prices = [0] * TOP_LEVEL_COUNT
-        bid_volumes = [0] * TOP_LEVEL_COUNT
+        ask_prices = [0] * self.depth
+        ask_volumes = [0] * self.depth
+        bid_prices = [0] * self.depth
+        bid_volumes = [0] * self.depth
         self.top_levels(ask_prices, ask_volumes, bid_prices, bid_volumes)
         return ("BidVol\tPrice\tAskVol\n"
                 + "\n".join("\t%dc\t%6d" % (p, v) for p, v in zip(reversed(ask_prices), reversed(ask_volumes)) if p)
@@ -109,12 +334,57 @@ class OrderBook(object):
         if order.remaining_volume > 0:
             fill_volume = order.volume - order.remaining_volume
             diff = order.volume - (fill_volume if new_volume < fill_volume else new_volume)
-            self.remove_volume_from_level(order.price, diff, order.side)
+            self.remove_volume_from_level(order, diff)
             order.volume -= diff
             order.remaining_volume -= diff
+            if order.remaining_volume == 0:
+                self._unindex_order(order)
             if order.listener:
                 order.listener.on_order_amended(now, order, diff)
 
+    def amend_by_id(self, now: float, owner: Any, client_order_id: int, new_volume: int) -> Optional[Order]:
+        """Amend the resting order with the given owner and client order id, if there is one.
+
+        Return the order, or None if there is no such order.
+        """
+        order = self.get(owner, client_order_id)
+        if order is not None:
+            self.amend(now, order, new_volume)
+        return order
+
+    def apply_batch(self, operations: Iterable[Tuple[float, MarketEventOperation, Order, int]]) -> Tuple[int, int]:
+        """Apply a sequence of inserts, cancels and amends to this order book.
+
+        Each operation is a tuple of time, operation, order and volume, where
+        the volume is the new order volume for an amend and is ignored
+        otherwise. Order listeners are called as usual, but the trade_occurred
+        callbacks are called once at the end of the batch (if there were any
+        trades) rather than once per trade. Return the total volume and total
+        value of the trades in the batch.
+        """
+        insert = self.insert
+        cancel = self.cancel
+        amend = self.amend
+
+        self.__batch_value = self.__batch_volume = 0
+        self.__in_batch = True
+        try:
+            for now, operation, order, volume in operations:
+                if operation == MarketEventOperation.INSERT:
+                    insert(now, order)
+                elif operation == MarketEventOperation.CANCEL:
+                    cancel(now, order)
+                else:
+                    amend(now, order, volume)
+        finally:
+            self.__in_batch = False
+
+        if self.__batch_volume:
+            for callback in self.trade_occurred:
+                callback(self)
+
+        return self.__batch_volume, self.__batch_value
+
     def best_ask(self) -> Optional[int]:
         """Return the current best ask price, or None if there are no ask orders."""
         return -self.__ask_prices[-1] if self.__ask_prices else None
@@ -126,12 +396,102 @@ class OrderBook(object):
     def cancel(self, now: float, order: Order) -> None:
         """Cancel an order in this order book."""
         if order.remaining_volume > 0:
-            self.remove_volume_from_level(order.price, order.remaining_volume, order.side)
+            self.remove_volume_from_level(order, order.remaining_volume)
             remaining = order.remaining_volume
             order.remaining_volume = 0
+            self._unindex_order(order)
             if order.listener:
                 order.listener.on_order_cancelled(now, order, remaining)
 
+    def cancel_by_id(self, now: float, owner: Any, client_order_id: int) -> Optional[Order]:
+        """Cancel the resting order with the given owner and client order id, if there is one.
+
+        Return the order, or None if there is no such order.
+        """
+        order = self.get(owner, client_order_id)
+        if order is not None:
+            self.cancel(now, order)
+        return order
+
+    def checkpoint(self) -> bytes:
+        """Return a compact binary copy of the state of this order book.
+
+        The copy holds the resting orders in each level in time priority, the
+        last traded price and the trade ticks not yet reported by trade_ticks.
+        It can be loaded into an empty order book with restore.
+        """
+        parts: List[bytes] = [CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, self.instrument,
+                                                     self.__last_traded_price or 0)]
+
+        for ticks in (self.__ask_ticks, self.__bid_ticks):
+            parts.append(CHECKPOINT_COUNT.pack(ticks.count))
+            for i in range(ticks.count):
+                parts.append(CHECKPOINT_PAIR.pack(ticks.keys[i] * ticks.sign, ticks.volumes[i]))
+
+        for side in (Side.SELL, Side.BUY):
+            count_index = len(parts)
+            parts.append(b"")
+            level_count = 0
+            for price, level in self._walk_levels(side):
+                level_index = len(parts)
+                parts.append(b"")
+                order = level.first
+                while order is not None:
+                    parts.append(CHECKPOINT_ORDER.pack(order.client_order_id, order.volume, order.remaining_volume,
+                                                       order.total_fees))
+                    order = order.next_order
+                parts[level_index] = CHECKPOINT_PAIR.pack(price, len(parts) - level_index - 1)
+                level_count += 1
+            parts[count_index] = CHECKPOINT_COUNT.pack(level_count)
+
+        return b"".join(parts)
+
+    def depth_snapshot(self, n: int, ask_prices: MutableSequence[int], ask_volumes: MutableSequence[int],
+                       bid_prices: MutableSequence[int], bid_volumes: MutableSequence[int]) -> Tuple[int, int]:
+        """Write the prices and volumes of the best n levels on each side into the supplied buffers.
+
+        The buffers may be lists, arrays from the array module or NumPy arrays
+        and must each hold at least n elements. Elements beyond the last level
+        on a side are set to zero. Return the number of ask levels and the
+        number of bid levels written.
+        """
+        levels = self.__levels
+
+        i = 0
+        prices = self.__ask_prices
+        j = len(prices) - 1
+        while i < n and j >= 0:
+            price = -prices[j]
+            ask_prices[i] = price
+            ask_volumes[i] = levels[price].total_volume
+            i += 1
+            j -= 1
+        ask_count = i
+        while i < n:
+            ask_prices[i] = ask_volumes[i] = 0
+            i += 1
+
+        i = 0
+        prices = self.__bid_prices
+        j = len(prices) - 1
+        while i < n and j >= 0:
+            price = prices[j]
+            bid_prices[i] = price
+            bid_volumes[i] = levels[price].total_volume
+            i += 1
+            j -= 1
+        bid_count = i
+        while i < n:
+            bid_prices[i] = bid_volumes[i] = 0
+            i += 1
+
+        return ask_count, bid_count
+
+    def get(self, owner: Any, client_order_id: int) -> Optional[Order]:
+        """Return the resting order with the given owner and client order id, or None if there is no such order."""
+        orders = self.__orders.get(owner)
+        return orders.get(client_order_id) if orders is not None else None
+
     def insert(self, now: float, order: Order) -> None:
         """Insert a new order into this order book."""
         if order.side == Side.SELL and self.__bid_prices and order.price <= self.__bid_prices[-1]:
@@ -139,6 +499,9 @@ class OrderBook(object):
         elif order.side == Side.BUY and self.__ask_prices and order.price >= self.__ask_prices[-1]:
             self.trade_bid(now, order)
 
+        if self.aggregate_fills:
+            self._notify_fills(now, order)
+
         if order.remaining_volume > 0:
             if order.lifespan == Lifespan.FILL_AND_KILL:
                 remaining = order.remaining_volume
@@ -158,69 +521,149 @@ class OrderBook(object):
             return (self.__bid_prices[-1] + -self.__ask_prices[-1]) / 2.0
         return None
 
+    def side_version(self, side: Side) -> int:
+        """Return a number that changes whenever any level on the given side of this book changes."""
+        return self.__side_versions[side]
+
+    def order_count(self, owner: Any) -> int:
+        """Return the number of resting orders with the given owner."""
+        orders = self.__orders.get(owner)
+        return len(orders) if orders is not None else 0
+
+    def orders(self, owner: Any) -> List[Order]:
+        """Return a list of the resting orders with the given owner."""
+        orders = self.__orders.get(owner)
+        return list(orders.values()) if orders is not None else []
+
     def place(self, now: float, order: Order) -> None:
         """Place an order that does not match any existing order in this order book."""
         price = order.price
 
-        if price not in self.__levels:
-            self.__levels[price] = collections.deque()
-            self.__total_volumes[price] = 0
+        level = self.__levels.get(price)
+        if level is None:
+            level = self.__levels[price] = PriceLevel()
             if order.side == Side.SELL:
                 insort_left(self.__ask_prices, -price)
             else:
                 insort_left(self.__bid_prices, price)
 
-        self.__levels[price].append(order)
-        self.__total_volumes[price] += order.remaining_volume
+        level.append(order)
+        level.total_volume += order.remaining_volume
+        self._level_changed(price, order.side)
+        self._index_order(order)
 
         if order.listener:
             order.listener.on_order_placed(now, order)
 
-    def remove_volume_from_level(self, price: int, volume: int, side: Side) -> None:
-        if self.__total_volumes[price] == volume:
+    def remove_volume_from_level(self, order: Order, volume: int) -> None:
+        """Remove volume from a resting order's level, unlinking the order if none of it remains."""
+        price = order.price
+        self._level_changed(price, order.side)
+        level = self.__levels[price]
+        if level.total_volume == volume:
             del self.__levels[price]
-            del self.__total_volumes[price]
-            if side == Side.SELL:
+            if order.side == Side.SELL:
                 self.__ask_prices.pop(bisect(self.__ask_prices, -price) - 1)
-            elif side == Side.BUY:
+            elif order.side == Side.BUY:
                 self.__bid_prices.pop(bisect(self.__bid_prices, price) - 1)
         else:
-            self.__total_volumes[price] -= volume
+            level.total_volume -= volume
+            if volume == order.remaining_volume:
+                level.remove(order)
+
+    def restore(self, data: bytes, listener: Optional[IOrderListener] = None, owner: Any = None) -> List[Order]:
+        """Load a copy of an order book made by checkpoint into this order book.
+
+        This order book must be empty and for the same instrument. Each
+        restored order is given the supplied listener, which is told that the
+        order has been placed, and the supplied owner. Return the restored
+        orders.
+        """
+        if self.best_ask() is not None or self.best_bid() is not None:
+            raise ValueError("order book must be empty to restore a checkpoint")
+
+        try:
+            magic, version, instrument, last_traded_price = CHECKPOINT_HEADER.unpack_from(data, 0)
+            if magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION:
+                raise ValueError("data is not an order book checkpoint")
+            if instrument != self.instrument:
+                raise ValueError("checkpoint is for instrument %d not %d" % (instrument, self.instrument))
+            offset: int = CHECKPOINT_HEADER.size
+
+            for ticks in (self.__ask_ticks, self.__bid_ticks):
+                count, = CHECKPOINT_COUNT.unpack_from(data, offset)
+                offset += CHECKPOINT_COUNT.size
+                ticks.count = 0
+                for _ in range(count):
+                    ticks.add(*CHECKPOINT_PAIR.unpack_from(data, offset))
+                    offset += CHECKPOINT_PAIR.size
+
+            orders: List[Order] = []
+            for side in (Side.SELL, Side.BUY):
+                level_count, = CHECKPOINT_COUNT.unpack_from(data, offset)
+                offset += CHECKPOINT_COUNT.size
+                for _ in range(level_count):
+                    price, order_count = CHECKPOINT_PAIR.unpack_from(data, offset)
+                    offset += CHECKPOINT_PAIR.size
+                    for _ in range(order_count):
+                        client_order_id, volume, remaining_volume, fees = CHECKPOINT_ORDER.unpack_from(data, offset)
+                        offset += CHECKPOINT_ORDER.size
+                        order = Order(client_order_id, self.instrument, Lifespan.GOOD_FOR_DAY, side, price, volume,
+                                      listener, owner)
+                        order.remaining_volume = remaining_volume
+                        order.total_fees = fees
+                        self.place(0.0, order)
+                        orders.append(order)
+        except struct.error as e:
+            raise ValueError("order book checkpoint is truncated") from e
+
+        self.__last_traded_price = last_traded_price or None
+        return orders
+
+    def sweep_curve(self, side: Side) -> SweepCurve:
+        """Return the sweep curve for an order on the given side.
+
+        The curve covers every level on the other side of the book and is
+        cached until a level on that side next changes, so pricing many
+        orders against the same book, such as the hedges of every competitor
+        between two market events, builds it once and then only looks up
+        each order.
+        """
+        other_side: Side = Side.BUY if side == Side.SELL else Side.SELL
+        if self.__sweep_curve_versions[side] != self.__side_versions[other_side]:
+            prices: List[int] = []
+            volumes: List[int] = []
+            for price, level in self._walk_levels(other_side):
+                prices.append(price)
+                volumes.append(level.total_volume)
+            self.__sweep_curves[side] = SweepCurve(prices, volumes, side == Side.BUY)
+            self.__sweep_curve_versions[side] = self.__side_versions[other_side]
+        return self.__sweep_curves[side]
 
     def top_levels(self, ask_prices: List[int], ask_volumes: List[int], bid_prices: List[int],
                    bid_volumes: List[int]) -> None:
         """Populate the supplied lists with the top levels for this book."""
-        i = 0
-        j = len(self.__ask_prices) - 1
-        while i < TOP_LEVEL_COUNT and j >= 0:
-            ask_prices[i] = -self.__ask_prices[j]
-            ask_volumes[i] = self.__total_volumes[ask_prices[i]]
-            i += 1
-            j -= 1
-        while i < TOP_LEVEL_COUNT:
-            ask_prices[i] = ask_volumes[i] = 0
-            i += 1
+        if self.__cached_version != self.__version:
+            self.depth_snapshot(self.depth, self.__top_ask_prices, self.__top_ask_volumes, self.__top_bid_prices,
+                                self.__top_bid_volumes)
+            self.__cached_version = self.__version
+        ask_prices[:] = self.__top_ask_prices
+        ask_volumes[:] = self.__top_ask_volumes
+        bid_prices[:] = self.__top_bid_prices
+        bid_volumes[:] = self.__top_bid_volumes
 
-        i = 0
-        j = len(self.__bid_prices) - 1
-        while i < TOP_LEVEL_COUNT and j >= 0:
-            bid_prices[i] = self.__bid_prices[j]
-            bid_volumes[i] = self.__total_volumes[bid_prices[i]]
-            i += 1
-            j -= 1
-        while i < TOP_LEVEL_COUNT:
-            bid_prices[i] = bid_volumes[i] = 0
-            i += 1
+    def top_levels_version(self) -> int:
+        """Return a number that changes whenever the top levels of this book change."""
+        return self.__version
 
     def trade_ask(self, now: float, order: Order) -> None:
         """Check to see if any existing bid orders match the specified ask order."""
         best_bid = self.__bid_prices[-1]
 
-        while order.remaining_volume > 0 and best_bid >= order.price and self.__total_volumes[best_bid] > 0:
+        while order.remaining_volume > 0 and best_bid >= order.price and self.__levels[best_bid].total_volume > 0:
             self.trade_level(now, order, best_bid)
-            if self.__total_volumes[best_bid] == 0:
+            if self.__levels[best_bid].total_volume == 0:
                 del self.__levels[best_bid]
-                del self.__total_volumes[best_bid]
                 self.__bid_prices.pop()
                 if not self.__bid_prices:
                     break
@@ -230,11 +673,10 @@ class OrderBook(object):
         """Check to see if any existing ask orders match the specified bid order."""
         best_ask = -self.__ask_prices[-1]
 
-        while order.remaining_volume > 0 and best_ask <= order.price and self.__total_volumes[best_ask] > 0:
+        while order.remaining_volume > 0 and best_ask <= order.price and self.__levels[best_ask].total_volume > 0:
             self.trade_level(now, order, best_ask)
-            if self.__total_volumes[best_ask] == 0:
+            if self.__levels[best_ask].total_volume == 0:
                 del self.__levels[best_ask]
-                del self.__total_volumes[best_ask]
                 self.__ask_prices.pop()
                 if not self.__ask_prices:
                     break
@@ -242,58 +684,105 @@ class OrderBook(object):
 
     def trade_level(self, now: float, order: Order, best_price: int) -> None:
         """Match the specified order with existing orders at the given level."""
+        self._trade_queue(now, order, best_price, self.__levels[best_price])
+
+    def _trade_queue(self, now: float, order: Order, best_price: int, level: PriceLevel) -> None:
+        """Match the specified order with the queue of orders in the given level.
+
+        This is shared by the order book implementations, which differ only in
+        how they locate the level for a price.
+        """
         remaining: int = order.remaining_volume
-        order_queue: Deque[Order] = self.__levels[best_price]
-        total_volume: int = self.__total_volumes[best_price]
+        total_volume: int = level.total_volume
+        maker_fee_per_lot: int = self.fees.maker_fee_per_lot(best_price)
 
         while remaining > 0 and total_volume > 0:
-            while order_queue[0].remaining_volume == 0:
-                order_queue.popleft()
-            passive: Order = order_queue[0]
+            passive: Order = level.first
             volume: int = remaining if remaining < passive.remaining_volume else passive.remaining_volume
-            fee: int = round(best_price * volume * self.maker_fee)
+            fee: int = scaled_fee(maker_fee_per_lot * volume)
             total_volume -= volume
             remaining -= volume
             passive.remaining_volume -= volume
+            if passive.remaining_volume == 0:
+                level.remove(passive)
+                self._unindex_order(passive)
             passive.total_fees += fee
             if passive.listener:
                 passive.listener.on_order_filled(now, passive, best_price, volume, fee)
 
-        self.__total_volumes[best_price] = total_volume
+        level.total_volume = total_volume
+        self.__side_versions[Side.SELL if order.side == Side.BUY else Side.BUY] += 1
+        self.__version += 1
         traded_volume_at_this_level: int = order.remaining_volume - remaining
 
         if order.side == Side.BUY:
-            self.__ask_ticks[best_price] += traded_volume_at_this_level
+            self.__ask_ticks.add(best_price, traded_volume_at_this_level)
         else:
-            self.__bid_ticks[best_price] += traded_volume_at_this_level
+            self.__bid_ticks.add(best_price, traded_volume_at_this_level)
 
-        fee: int = round(best_price * traded_volume_at_this_level * self.taker_fee)
+        fee: int = self.fees.taker_fee(best_price, traded_volume_at_this_level)
         order.remaining_volume = remaining
         order.total_fees += fee
-        if order.listener:
+        if self.aggregate_fills:
+            self.__fills.append((best_price, traded_volume_at_this_level, fee))
+        elif order.listener:
             order.listener.on_order_filled(now, order, best_price, traded_volume_at_this_level, fee)
 
         self.__last_traded_price = best_price
-        for callback in self.trade_occurred:
-            callback(self)
+        if self.__in_batch:
+            self.__batch_volume += traded_volume_at_this_level
+            self.__batch_value += traded_volume_at_this_level * best_price
+        elif not self.aggregate_fills:
+            for callback in self.trade_occurred:
+                callback(self)
 
-    def trade_ticks(self, ask_prices: List[int], ask_volumes: List[int], bid_prices: List[int],
-                    bid_volumes: List[int]) -> bool:
-        """Return True and populate the lists if there have been trades."""
-        if self.__ask_ticks or self.__bid_ticks:
-            prices = sorted(self.__ask_ticks.keys())[:TOP_LEVEL_COUNT]
-            volumes = tuple(self.__ask_ticks[p] for p in prices)
-            ask_prices[:] = prices + [0] * (TOP_LEVEL_COUNT - len(prices))
-            ask_volumes[:] = volumes + (0,) * (TOP_LEVEL_COUNT - len(volumes))
+    def _notify_fills(self, now: float, order: Order) -> None:
+        """Report the fills of an aggressive order which has finished trading, if there were any."""
+        if self.__fills:
+            fills = self.__fills
+            self.__fills = []
+            if order.listener:
+                order.listener.on_order_fills(now, order, fills)
+            if not self.__in_batch:
+                for callback in self.trade_occurred:
+                    callback(self)
+
+    def _index_order(self, order: Order) -> None:
+        """Add a resting order to the index of orders by owner and client order id."""
+        orders = self.__orders.get(order.owner)
+        if orders is None:
+            orders = self.__orders[order.owner] = {}
+        orders[order.client_order_id] = order
 
-            prices = sorted(self.__bid_ticks.keys(), reverse=True)[:TOP_LEVEL_COUNT]
-            volumes = tuple(self.__bid_ticks[p] for p in prices)
-            bid_prices[:] = prices + [0] * (TOP_LEVEL_COUNT - len(prices))
-            bid_volumes[:] = volumes + (0,) * (TOP_LEVEL_COUNT - len(volumes))
+    def _unindex_order(self, order: Order) -> None:
+        """Remove an order that is no longer resting from the index of orders by owner and client order id."""
+        orders = self.__orders.get(order.owner)
+        if orders is not None and orders.get(order.client_order_id) is order:
+            del orders[order.client_order_id]
 
-            self.__ask_ticks.clear()
-            self.__bid_ticks.clear()
+    def _level_changed(self, price: int, side: Side) -> None:
+        """Note a change to the level at the given price, invalidating the top levels if it is one of them."""
+        self.__side_versions[side] += 1
+        if self.__cached_version == self.__version:
+            if side == Side.SELL:
+                worst = self.__top_ask_prices[-1]
+                if worst == 0 or price <= worst:
+                    self.__version += 1
+            else:
+                worst = self.__top_bid_prices[-1]
+                if worst == 0 or price >= worst:
+                    self.__version += 1
+
+    def trade_ticks(self, ask_prices: List[int], ask_volumes: List[int], bid_prices: List[int],
+                    bid_volumes: List[int]) -> bool:
+        """Return True and populate the lists if there have been trades.
 
+        Each list must already hold depth elements; they are
+        overwritten in place.
+        """
+        if self.__ask_ticks.count or self.__bid_ticks.count:
+            self.__ask_ticks.flush(ask_prices, ask_volumes)
+            self.__bid_ticks.flush(bid_prices, bid_volumes)
             return True
 
         return False
@@ -309,7 +798,7 @@ class OrderBook(object):
             i = len(self.__bid_prices) - 1
             while total_volume < volume and i >= 0 and self.__bid_prices[i] and self.__bid_prices[i] >= limit_price:
                 price: int = self.__bid_prices[i]
-                available: int = self.__total_volumes[price]
+                available: int = self.__levels[price].total_volume
                 required: int = volume - total_volume
                 weight: int = required if required <= available else available
                 total_volume += weight
@@ -319,7 +808,7 @@ class OrderBook(object):
             i = len(self.__ask_prices) - 1
             while total_volume < volume and i >= 0 and -self.__ask_prices[i] and -self.__ask_prices[i] <= limit_price:
                 price: int = -self.__ask_prices[i]
-                available: int = self.__total_volumes[price]
+                available: int = self.__levels[price].total_volume
                 required: int = volume - total_volume
                 weight: int = required if required <= available else available
                 total_volume += weight
@@ -327,3 +816,390 @@ class OrderBook(object):
                 i -= 1
 
         return total_volume, total_value // total_volume if total_volume > 0 else 0
+
+    def _walk_levels(self, side: Side) -> Iterator[Tuple[int, PriceLevel]]:
+        """Yield the price and level of each level on one side, best first."""
+        if side == Side.SELL:
+            for price in reversed(self.__ask_prices):
+                yield -price, self.__levels[-price]
+        else:
+            for price in reversed(self.__bid_prices):
+                yield price, self.__levels[price]
+
+
+class LadderOrderBook(OrderBook):
+    """An order book that keeps its price levels in an array indexed by tick.
+
+    Levels within a window of ladder_size ticks are stored in a contiguous
+    array, so adding or removing a level does not depend on the depth of the
+    book. The window always starts at or below the best ask and ends above the
+    best bid; levels that fall outside it are kept in sorted lists, and the
+    window is moved (re-centred on the touch) when the best bid or best ask
+    would leave it.
+    """
+
+    def __init__(self, instrument: Instrument, maker_fee: float, taker_fee: float, tick_size: int,
+                 ladder_size: int = LADDER_SIZE, depth: int = TOP_LEVEL_COUNT, aggregate_fills: bool = False):
+        """Initialise a new instance of the LadderOrderBook class."""
+        super().__init__(instrument, maker_fee, taker_fee, depth, aggregate_fills)
+        self.tick_size: int = tick_size
+
+        self.__ask: int = ladder_size  # Index of the best ask in the window or ladder_size if there is none
+        self.__ask_count: int = 0
+        self.__base: int = 0  # Price of the first slot in the window
+        self.__bid: int = -1  # Index of the best bid in the window or -1 if there is none
+        self.__bid_count: int = 0
+        self.__far_ask_prices: List[int] = []
+        self.__far_bid_prices: List[int] = []
+        self.__far_levels: Dict[int, PriceLevel] = {}
+        self.__levels: List[Optional[PriceLevel]] = [None] * ladder_size
+        self.__size: int = ladder_size
+
+    def best_ask(self) -> Optional[int]:
+        """Return the current best ask price, or None if there are no ask orders."""
+        if self.__ask < self.__size:
+            return self.__base + self.__ask * self.tick_size
+        return -self.__far_ask_prices[-1] if self.__far_ask_prices else None
+
+    def best_bid(self) -> Optional[int]:
+        """Return the current best bid price, or None if there are no bid orders."""
+        if self.__bid >= 0:
+            return self.__base + self.__bid * self.tick_size
+        return self.__far_bid_prices[-1] if self.__far_bid_prices else None
+
+    def depth_snapshot(self, n: int, ask_prices: MutableSequence[int], ask_volumes: MutableSequence[int],
+                       bid_prices: MutableSequence[int], bid_volumes: MutableSequence[int]) -> Tuple[int, int]:
+        """Write the prices and volumes of the best n levels on each side into the supplied buffers."""
+        base = self.__base
+        far_levels = self.__far_levels
+        levels = self.__levels
+        tick_size = self.tick_size
+
+        i = 0
+        remaining = self.__ask_count
+        index = self.__ask
+        while i < n and remaining:
+            level = levels[index]
+            if level is not None:
+                ask_prices[i] = base + index * tick_size
+                ask_volumes[i] = level.total_volume
+                i += 1
+                remaining -= 1
+            index += 1
+        prices = self.__far_ask_prices
+        j = len(prices) - 1
+        while i < n and j >= 0:
+            price = -prices[j]
+            ask_prices[i] = price
+            ask_volumes[i] = far_levels[price].total_volume
+            i += 1
+            j -= 1
+        ask_count = i
+        while i < n:
+            ask_prices[i] = ask_volumes[i] = 0
+            i += 1
+
+        i = 0
+        remaining = self.__bid_count
+        index = self.__bid
+        while i < n and remaining:
+            level = levels[index]
+            if level is not None:
+                bid_prices[i] = base + index * tick_size
+                bid_volumes[i] = level.total_volume
+                i += 1
+                remaining -= 1
+            index -= 1
+        prices = self.__far_bid_prices
+        j = len(prices) - 1
+        while i < n and j >= 0:
+            price = prices[j]
+            bid_prices[i] = price
+            bid_volumes[i] = far_levels[price].total_volume
+            i += 1
+            j -= 1
+        bid_count = i
+        while i < n:
+            bid_prices[i] = bid_volumes[i] = 0
+            i += 1
+
+        return ask_count, bid_count
+
+    def insert(self, now: float, order: Order) -> None:
+        """Insert a new order into this order book."""
+        if order.side == Side.SELL:
+            best_bid = self.best_bid()
+            if best_bid is not None and order.price <= best_bid:
+                self.trade_ask(now, order)
+        else:
+            best_ask = self.best_ask()
+            if best_ask is not None and order.price >= best_ask:
+                self.trade_bid(now, order)
+
+        if self.aggregate_fills:
+            self._notify_fills(now, order)
+
+        if order.remaining_volume > 0:
+            if order.lifespan == Lifespan.FILL_AND_KILL:
+                remaining = order.remaining_volume
+                order.remaining_volume = 0
+                if order.listener:
+                    order.listener.on_order_cancelled(now, order, remaining)
+            else:
+                self.place(now, order)
+
+    def midpoint_price(self) -> Optional[float]:
+        """Return the midpoint price."""
+        best_bid = self.best_bid()
+        best_ask = self.best_ask()
+        if best_bid is not None and best_ask is not None:
+            return (best_bid + best_ask) / 2.0
+        return None
+
+    def place(self, now: float, order: Order) -> None:
+        """Place an order that does not match any existing order in this order book."""
+        price = order.price
+        index, misalignment = divmod(price - self.__base, self.tick_size)
+        if misalignment:
+            raise ValueError("price %d is not a multiple of the tick size %d" % (price, self.tick_size))
+
+        # Asks may never be below the window and bids may never be above it
+        if order.side == Side.SELL and index < 0:
+            self.__recentre(self.best_bid(), price)
+            index = (price - self.__base) // self.tick_size
+        elif order.side == Side.BUY and index >= self.__size:
+            self.__recentre(price, self.best_ask())
+            index = (price - self.__base) // self.tick_size
+
+        if 0 <= index < self.__size:
+            level = self.__levels[index]
+            if level is None:
+                level = self.__levels[index] = PriceLevel()
+                if order.side == Side.SELL:
+                    self.__ask_count += 1
+                    if index < self.__ask:
+                        self.__ask = index
+                else:
+                    self.__bid_count += 1
+                    if index > self.__bid:
+                        self.__bid = index
+            level.append(order)
+            level.total_volume += order.remaining_volume
+            self._level_changed(price, order.side)
+        else:
+            level = self.__far_levels.get(price)
+            if level is None:
+                level = self.__far_levels[price] = PriceLevel()
+                if order.side == Side.SELL:
+                    insort_left(self.__far_ask_prices, -price)
+                else:
+                    insort_left(self.__far_bid_prices, price)
+            level.append(order)
+            level.total_volume += order.remaining_volume
+            self._level_changed(price, order.side)
+            if (self.__ask_count if order.side == Side.SELL else self.__bid_count) == 0:
+                self.__recentre_if_useful()
+
+        self._index_order(order)
+
+        if order.listener:
+            order.listener.on_order_placed(now, order)
+
+    def remove_volume_from_level(self, order: Order, volume: int) -> None:
+        """Remove volume from a resting order's level, unlinking the order if none of it remains."""
+        self._level_changed(order.price, order.side)
+        level = self.__level(order.price)
+        if level.total_volume == volume:
+            self.__delete_level(order.price, order.side)
+        else:
+            level.total_volume -= volume
+            if volume == order.remaining_volume:
+                level.remove(order)
+
+    def trade_ask(self, now: float, order: Order) -> None:
+        """Check to see if any existing bid orders match the specified ask order."""
+        best_bid = self.best_bid()
+
+        while order.remaining_volume > 0 and best_bid is not None and best_bid >= order.price:
+            self.trade_level(now, order, best_bid)
+            if self.__level(best_bid).total_volume == 0:
+                self.__delete_level(best_bid, Side.BUY)
+            best_bid = self.best_bid()
+
+    def trade_bid(self, now: float, order: Order) -> None:
+        """Check to see if any existing ask orders match the specified bid order."""
+        best_ask = self.best_ask()
+
+        while order.remaining_volume > 0 and best_ask is not None and best_ask <= order.price:
+            self.trade_level(now, order, best_ask)
+            if self.__level(best_ask).total_volume == 0:
+                self.__delete_level(best_ask, Side.SELL)
+            best_ask = self.best_ask()
+
+    def trade_level(self, now: float, order: Order, best_price: int) -> None:
+        """Match the specified order with existing orders at the given level."""
+        self._trade_queue(now, order, best_price, self.__level(best_price))
+
+    def try_trade(self, side: Side, limit_price: int, volume: int) -> Tuple[int, int]:
+        """Return the volume that would trade and the average price per lot for
+        the requested trade without changing the order book.
+        """
+        total_volume: int = 0
+        total_value: int = 0
+
+        for price, level in self._walk_levels(Side.BUY if side == Side.ASK else Side.SELL):
+            if total_volume >= volume or (price < limit_price if side == Side.ASK else price > limit_price):
+                break
+            available: int = level.total_volume
+            required: int = volume - total_volume
+            weight: int = required if required <= available else available
+            total_volume += weight
+            total_value += weight * price
+
+        return total_volume, total_value // total_volume if total_volume > 0 else 0
+
+    def __delete_level(self, price: int, side: Side) -> None:
+        """Remove the level at the given price and move the best price index if necessary."""
+        index = (price - self.__base) // self.tick_size
+        if not 0 <= index < self.__size:
+            del self.__far_levels[price]
+            if side == Side.SELL:
+                self.__far_ask_prices.pop(bisect(self.__far_ask_prices, -price) - 1)
+            else:
+                self.__far_bid_prices.pop(bisect(self.__far_bid_prices, price) - 1)
+            return
+
+        levels = self.__levels
+        levels[index] = None
+
+        if side == Side.SELL:
+            self.__ask_count -= 1
+            if index == self.__ask:
+                if self.__ask_count:
+                    index += 1
+                    while levels[index] is None:
+                        index += 1
+                    self.__ask = index
+                else:
+                    self.__ask = self.__size
+                    if self.__far_ask_prices:
+                        self.__recentre_if_useful()
+        else:
+            self.__bid_count -= 1
+            if index == self.__bid:
+                if self.__bid_count:
+                    index -= 1
+                    while levels[index] is None:
+                        index -= 1
+                    self.__bid = index
+                else:
+                    self.__bid = -1
+                    if self.__far_bid_prices:
+                        self.__recentre_if_useful()
+
+    def __level(self, price: int) -> PriceLevel:
+        """Return the level at the given price."""
+        index = (price - self.__base) // self.tick_size
+        if 0 <= index < self.__size:
+            return self.__levels[index]
+        return self.__far_levels[price]
+
+    def __recentre(self, best_bid: Optional[int], best_ask: Optional[int]) -> None:
+        """Move the window so that it is centred between the given best prices."""
+        tick_size = self.tick_size
+        size = self.__size
+
+        if best_bid is not None and best_ask is not None:
+            centre = best_bid + (best_ask - best_bid) // (2 * tick_size) * tick_size
+        else:
+            centre = best_bid if best_bid is not None else best_ask
+        base = centre - (size // 2) * tick_size
+
+        levels = [(self.__base + i * tick_size, level) for i, level in enumerate(self.__levels) if level is not None]
+        levels.extend(self.__far_levels.items())
+
+        self.__ask = size
+        self.__ask_count = 0
+        self.__base = base
+        self.__bid = -1
+        self.__bid_count = 0
+        self.__far_ask_prices.clear()
+        self.__far_bid_prices.clear()
+        self.__far_levels.clear()
+        self.__levels[:] = [None] * size
+
+        for price, level in levels:
+            index = (price - base) // tick_size
+            if 0 <= index < size:
+                self.__levels[index] = level
+                if level.first.side == Side.SELL:
+                    self.__ask_count += 1
+                    if index < self.__ask:
+                        self.__ask = index
+                else:
+                    self.__bid_count += 1
+                    if index > self.__bid:
+                        self.__bid = index
+            else:
+                self.__far_levels[price] = level
+                if level.first.side == Side.SELL:
+                    self.__far_ask_prices.append(-price)
+                else:
+                    self.__far_bid_prices.append(price)
+
+        self.__far_ask_prices.sort()
+        self.__far_bid_prices.sort()
+
+    def __recentre_if_useful(self) -> None:
+        """Re-centre the window if that would bring both best prices into it."""
+        best_bid = self.best_bid()
+        best_ask = self.best_ask()
+        if best_bid is None or best_ask is None or best_ask - best_bid < self.__size * self.tick_size:
+            self.__recentre(best_bid, best_ask)
+
+    def _walk_levels(self, side: Side) -> Iterator[Tuple[int, PriceLevel]]:
+        """Yield the price and level of each level on one side, best first."""
+        base = self.__base
+        levels = self.__levels
+        tick_size = self.tick_size
+
+        if side == Side.SELL:
+            remaining = self.__ask_count
+            index = self.__ask
+            while remaining:
+                if levels[index] is not None:
+                    yield base + index * tick_size, levels[index]
+                    remaining -= 1
+                index += 1
+            for price in reversed(self.__far_ask_prices):
+                yield -price, self.__far_levels[-price]
+        else:
+            remaining = self.__bid_count
+            index = self.__bid
+            while remaining:
+                if levels[index] is not None:
+                    yield base + index * tick_size, levels[index]
+                    remaining -= 1
+                index -= 1
+            for price in reversed(self.__far_bid_prices):
+                yield price, self.__far_levels[price]
+
+
+class OrderBookFactory:
+    """A factory class for OrderBook instances."""
+
+    def __init__(self, typ: str, tick_size: float, depth: int = TOP_LEVEL_COUNT, aggregate_fills: bool = False):
+        """Initialise a new instance of the OrderBookFactory class."""
+        if typ not in ("sorted", "ladder"):
+            raise ValueError("type must be either 'sorted' or 'ladder'")
+        self.aggregate_fills: bool = aggregate_fills
+        self.depth: int = depth
+        self.typ: str = typ
+        self.tick_size: int = int(tick_size * 100.0)  # convert tick size to cents
+
+    def create(self, instrument: Instrument, maker_fee: float, taker_fee: float) -> OrderBook:
+        """Return a new order book of the configured type."""
+        if self.typ == "ladder":
+            return LadderOrderBook(instrument, maker_fee, taker_fee, self.tick_size, depth=self.depth,
+                                   aggregate_fills=self.aggregate_fills)
+        return OrderBook(instrument, maker_fee, taker_fee, self.depth, self.aggregate_fills)
@@ -0,0 +1,90 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+import bisect
+import itertools
+
+from typing import List, Sequence, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class SweepCurve(object):
+    """The cost of trading through the levels on one side of an order book.
+
+    The curve is built from the price and volume of each level, best first.
+    For each level, cumulative_volumes holds the volume available at that
+    level's price or better, cumulative_values the total value (price times
+    volume) of that volume and average_prices the volume weighted average
+    price of trading it. These are NumPy arrays when NumPy is installed and
+    lists otherwise.
+    """
+
+    def __init__(self, prices: List[int], volumes: List[int], ascending: bool):
+        """Initialise a new instance of the SweepCurve class.
+
+        Prices are ascending for a curve of asks and descending for bids.
+        """
+        self.__sign: int = 1 if ascending else -1
+
+        if numpy is not None:
+            self.prices: Sequence[int] = numpy.array(prices, dtype=numpy.int64)
+            self.cumulative_volumes: Sequence[int] = numpy.cumsum(numpy.array(volumes, dtype=numpy.int64))
+            self.cumulative_values: Sequence[int] = numpy.cumsum(self.prices * numpy.array(volumes, dtype=numpy.int64))
+            self.average_prices: Sequence[float] = (self.cumulative_values / self.cumulative_volumes
+                                                    if prices else numpy.zeros(0))
+            self.__keys = self.prices * self.__sign
+        else:
+            self.prices = prices
+            self.cumulative_volumes = list(itertools.accumulate(volumes))
+            self.cumulative_values = list(itertools.accumulate(p * v for p, v in zip(prices, volumes)))
+            self.average_prices = [value / volume for value, volume in zip(self.cumulative_values,
+                                                                              self.cumulative_volumes)]
+            self.__keys = [p * self.__sign for p in prices]
+
+    def __len__(self) -> int:
+        """Return the number of levels in this curve."""
+        return len(self.prices)
+
+    def try_trade(self, limit_price: int, volume: int) -> Tuple[int, int]:
+        """Return the volume that would trade and the average price per lot
+        for an order with the given limit price and volume.
+
+        The result is the same as that of OrderBook.try_trade.
+        """
+        if numpy is not None:
+            count = int(numpy.searchsorted(self.__keys, limit_price * self.__sign, side="right"))
+        else:
+            count = bisect.bisect_right(self.__keys, limit_price * self.__sign)
+        if count == 0:
+            return 0, 0
+
+        available = int(self.cumulative_volumes[count - 1])
+        if volume >= available:
+            return available, int(self.cumulative_values[count - 1]) // available
+
+        if numpy is not None:
+            i = int(numpy.searchsorted(self.cumulative_volumes, volume, side="left"))
+        else:
+            i = bisect.bisect_left(self.cumulative_volumes, volume)
+        if i == 0:
+            return volume, int(self.prices[0])
+        remainder = volume - int(self.cumulative_volumes[i - 1])
+        return volume, (int(self.cumulative_values[i - 1]) + remainder * int(self.prices[i])) // volume
@@ -17,7 +17,6 @@
 #     <https://www.gnu.org/licenses/>.
 import asyncio
 import logging
-import time
 import random
 
 from typing import Any, Callable, List, Optional
@@ -26,9 +25,15 @@ from typing import Any, Callable, List, Optional
 class Timer:
     """A timer."""
 
-    def __init__(self, tick_interval: float, speed: float):
-        """Initialise a new instance of the timer class."""
+    def __init__(self, tick_interval: float, speed: float, jitter_random: Optional[random.Random] = None):
+        """Initialise a new instance of the timer class.
+
+        Time is measured by the event loop's clock, so it follows a virtual
+        clock if the event loop has one. Tick jitter is drawn from the given
+        random number generator, or the random module if there is none.
+        """
         self.__event_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.__jitter_random = jitter_random or random
         self.__logger: logging.Logger = logging.getLogger("TIMER")
         self.__speed: float = speed
         self.__start_time: float = 0.0
@@ -42,14 +47,14 @@ class Timer:
 
     def advance(self) -> float:
         """Advance the timer."""
-        if self.__start_time:
-            now = (time.monotonic() - self.__start_time) * self.__speed
+        if self.__event_loop is not None:
+            now = (self.__event_loop.time() - self.__start_time) * self.__speed
             return now
         return 0.0
 
     def __on_timer_tick(self, tick_time: float, tick_number: int):
         """Called on each timer tick."""
-        now = (time.monotonic() - self.__start_time) * self.__speed
+        now = (self.__event_loop.time() - self.__start_time) * self.__speed
 
         # There may have been a delay, so work out which tick this really is
         # We also need to prevent "skipping" ticks backwards due to negative random jitter
@@ -65,7 +70,7 @@ class Timer:
 
         # Generate random jitter, which can be +/- 20% of standard tick interval
         limit = self.__tick_interval * 0.2
-        jitter = random.uniform(-limit, +limit) / self.__speed
+        jitter = self.__jitter_random.uniform(-limit, +limit) / self.__speed
 
         self.__tick_timer_handle = self.__event_loop.call_at(self.__start_time + jitter + tick_time/self.__speed,
                                                              self.__on_timer_tick, tick_time, tick_number + 1)
@@ -73,7 +78,7 @@ class Timer:
     def start(self) -> None:
         """Start this timer."""
         self.__event_loop = asyncio.get_running_loop()
-        self.__start_time = time.monotonic()
+        self.__start_time = self.__event_loop.time()
         for callback in self.timer_started:
             callback(self, self.__start_time)
         self.__on_timer_tick(0.0, 1)
@@ -32,6 +32,15 @@ class Side(enum.IntEnum):
     B = BUY
 
 
+class MarketEventOperation(enum.IntEnum):
+    AMEND = 0
+    CANCEL = 1
+    INSERT = 2
+    Amend = AMEND
+    Cancel = CANCEL
+    Insert = INSERT
+
+
 class Lifespan(enum.IntEnum):
     FILL_AND_KILL = 0  # Fill and kill orders trade immediately if possible, otherwise they are cancelled
     GOOD_FOR_DAY = 1  # Good for day orders remain in the market until they trade or are explicitly cancelled
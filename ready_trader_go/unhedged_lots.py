@@ -1,6 +1,7 @@
 import asyncio
+import collections
 
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Deque, Optional, Tuple
 
 MAX_UNHEDGED_LOTS: int = 10
 UNHEDGED_LOTS_TIME_LIMIT: int = 60
@@ -9,11 +10,12 @@ UNHEDGED_LOTS_TIME_LIMIT: int = 60
 class UnhedgedLots:
     """Keep track of unhedged lots and call a callback if unhedged lots are held for too long."""
 
-    def __init__(self, callback: Callable[[], Any]):
+    def __init__(self, callback: Callable[[], Any], timer: "UnhedgedLotsTimer"):
         """Initialise a new instance of the UnhedgedLots class."""
         self.callback: Callable[[], None] = callback
         self.relative_position: int = 0
-        self.timer_handle: Optional[asyncio.TimerHandle] = None
+        self.timer: UnhedgedLotsTimer = timer
+        self.timer_entry: Optional[Tuple[float, UnhedgedLots]] = None
 
     @property
     def unhedged_lot_count(self) -> int:
@@ -30,26 +32,84 @@ class UnhedgedLots:
 
         if delta > 0:
             if self.relative_position < -MAX_UNHEDGED_LOTS <= new_relative_position:
-                self.timer_handle.cancel()
+                self.timer.cancel(self)
 
             if new_relative_position > MAX_UNHEDGED_LOTS >= self.relative_position:
-                self.timer_handle = asyncio.get_running_loop().call_later(UNHEDGED_LOTS_TIME_LIMIT, self.callback)
+                self.timer.start(self)
         elif delta < 0:
             if self.relative_position > MAX_UNHEDGED_LOTS >= new_relative_position:
-                self.timer_handle.cancel()
+                self.timer.cancel(self)
 
             if new_relative_position < -MAX_UNHEDGED_LOTS <= self.relative_position:
-                self.timer_handle = asyncio.get_running_loop().call_later(UNHEDGED_LOTS_TIME_LIMIT, self.callback)
+                self.timer.start(self)
 
         self.relative_position = new_relative_position
 
 
+class UnhedgedLotsTimer:
+    """A timer shared by all unhedged lots instances.
+
+    Every timer runs for the same time limit, so timers expire in the order
+    they were started and a queue of expiry times, with a single event loop
+    timer for the earliest of them, is all that is needed. Cancelled timers
+    are simply skipped when they reach the front of the queue.
+    """
+
+    def __init__(self, time_limit: float):
+        """Initialise a new instance of the UnhedgedLotsTimer class.
+
+        The time limit is in seconds measured by the event loop's clock.
+        """
+        self.time_limit: float = time_limit
+
+        self.__event_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.__expiries: Deque[Tuple[float, UnhedgedLots]] = collections.deque()
+        self.__timer_handle: Optional[asyncio.TimerHandle] = None
+
+    def cancel(self, unhedged_lots: UnhedgedLots) -> None:
+        """Cancel the timer for the given unhedged lots instance."""
+        unhedged_lots.timer_entry = None
+
+    def start(self, unhedged_lots: UnhedgedLots) -> None:
+        """Start the timer for the given unhedged lots instance."""
+        if self.__event_loop is None:
+            self.__event_loop = asyncio.get_running_loop()
+
+        entry: Tuple[float, UnhedgedLots] = (self.__event_loop.time() + self.time_limit, unhedged_lots)
+        unhedged_lots.timer_entry = entry
+        self.__expiries.append(entry)
+        if self.__timer_handle is None:
+            self.__timer_handle = self.__event_loop.call_at(entry[0], self.__on_timer)
+
+    def __on_timer(self) -> None:
+        """Called when the earliest timer expires.
+
+        The handle of this timer is kept until the callbacks have run, so a
+        callback that starts a timer leaves it to this method to reschedule.
+        """
+        expiries: Deque[Tuple[float, UnhedgedLots]] = self.__expiries
+        now: float = self.__event_loop.time()
+        while expiries and (expiries[0][0] <= now or expiries[0][1].timer_entry is not expiries[0]):
+            entry: Tuple[float, UnhedgedLots] = expiries.popleft()
+            unhedged_lots: UnhedgedLots = entry[1]
+            if unhedged_lots.timer_entry is entry:
+                unhedged_lots.timer_entry = None
+                unhedged_lots.callback()
+
+        self.__timer_handle = self.__event_loop.call_at(expiries[0][0], self.__on_timer) if expiries else None
+
+
 class UnhedgedLotsFactory:
     """A factory class for UnhedgedLots instances."""
 
-    def __init__(self):
-        """Initialise a new instance of the UnhedgedLotsFactory class."""
+    def __init__(self, speed: float = 1.0):
+        """Initialise a new instance of the UnhedgedLotsFactory class.
+
+        The time limit for holding unhedged lots is in match time, so it is
+        scaled by the speed of the match.
+        """
+        self.timer: UnhedgedLotsTimer = UnhedgedLotsTimer(UNHEDGED_LOTS_TIME_LIMIT / speed)
 
     def create(self, callback: Callable[[], Any]) -> UnhedgedLots:
         """Return a new instance of the UnhedgedLots class."""
-        return UnhedgedLots(callback)
+        return UnhedgedLots(callback, self.timer)
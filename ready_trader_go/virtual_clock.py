@@ -0,0 +1,120 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+import asyncio
+import selectors
+import time
+
+from typing import Callable, List, Optional, Tuple
+
+
+# Real seconds to wait for an auto-trader to answer a message before moving the clock on
+DEFAULT_IDLE_WAIT: float = 0.005
+
+
+class VirtualTimeSelector(selectors.DefaultSelector):
+    """A selector that moves a virtual clock on instead of waiting.
+
+    When the event loop asks it to wait for a time, it only waits, in real
+    time, for something to happen if input is expected (for up to the idle
+    wait) or the clock is held (for the whole time) and, if nothing does,
+    advances the clock by the time the event loop asked to wait. While the
+    clock is held, the clock is also advanced by the real time spent waiting
+    when something happens sooner. It waits as long as it takes if the event
+    loop has nothing scheduled.
+    """
+
+    def __init__(self, advance: Callable[[float], None], idle_wait: float = DEFAULT_IDLE_WAIT):
+        """Initialise a new instance of the VirtualTimeSelector class."""
+        super().__init__()
+        self.__advance: Callable[[float], None] = advance
+        self.__expecting_input: bool = False
+        self.__hold_count: int = 0
+        self.__idle_wait: float = idle_wait
+
+    def expect_input(self) -> None:
+        """Wait up to the idle wait for input before the clock next moves on."""
+        self.__expecting_input = True
+
+    def hold(self) -> None:
+        """Keep the clock to real time until a matching call to release."""
+        self.__hold_count += 1
+
+    def release(self) -> None:
+        """Release a hold on the clock."""
+        self.__hold_count -= 1
+
+    def select(self, timeout: Optional[float] = None) -> List[Tuple[selectors.SelectorKey, int]]:
+        """Wait until some registered file objects become ready, or until virtual time has moved on by timeout."""
+        if timeout is None:
+            return super().select(None)
+
+        if self.__hold_count:
+            start: float = time.monotonic()
+            ready = super().select(timeout)
+            if ready:
+                elapsed: float = time.monotonic() - start
+                if elapsed > 0.0:
+                    self.__advance(elapsed if elapsed < timeout else timeout)
+                return ready
+        elif self.__expecting_input:
+            ready = super().select(timeout if timeout < self.__idle_wait else self.__idle_wait)
+        else:
+            ready = super().select(0)
+        if not ready and timeout > 0.0:
+            self.__expecting_input = False
+            self.__advance(timeout)
+        return ready
+
+
+class VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+    """An event loop whose clock only moves on when there is nothing to do.
+
+    Time starts at zero and jumps to each scheduled callback in turn, so
+    timers and sleeps take no real time and a whole match runs as fast as
+    the processor allows. Input and output still happen in real time, so
+    the clock keeps to real time while it is held, for example while an
+    auto-trader is logging in, and after output that an auto-trader may
+    answer the loop waits up to the idle wait, in real seconds, for a socket
+    to become ready before moving time on.
+    """
+
+    def __init__(self, idle_wait: float = DEFAULT_IDLE_WAIT):
+        """Initialise a new instance of the VirtualTimeEventLoop class."""
+        self.__now: float = 0.0
+        self.__selector: VirtualTimeSelector = VirtualTimeSelector(self.__advance, idle_wait)
+        super().__init__(self.__selector)
+
+    def expect_input(self) -> None:
+        """Wait up to the idle wait for input before the clock next moves on."""
+        self.__selector.expect_input()
+
+    def hold(self) -> None:
+        """Keep the clock to real time until a matching call to release."""
+        self.__selector.hold()
+
+    def release(self) -> None:
+        """Release a hold on the clock."""
+        self.__selector.release()
+
+    def time(self) -> float:
+        """Return the virtual time."""
+        return self.__now
+
+    def __advance(self, interval: float) -> None:
+        """Move the virtual time on by the given interval."""
+        self.__now += interval
@@ -24,6 +24,9 @@ import time
 import traceback
 
 import ready_trader_go.exchange
+import ready_trader_go.market_cache
+import ready_trader_go.market_data
+import ready_trader_go.market_generator
 import ready_trader_go.trader
 
 try:
@@ -32,6 +35,62 @@ except ImportError:
     hud_main = hud_replay = None
 
 
+def cache(args) -> None:
+    """Build the cache of market-only order book snapshots for a market data file."""
+    source: pathlib.Path = args.filename
+    if not source.is_file():
+        print("'%s' is not a regular file" % str(source), file=sys.stderr)
+        return
+
+    try:
+        snapshots = ready_trader_go.market_cache.load_snapshots(str(source), args.interval, args.depth,
+                                                                str(args.directory))
+    except (KeyError, ValueError) as e:
+        print("'%s' is not a valid market data file: %s" % (source, e), file=sys.stderr)
+        return
+
+    digest: bytes = ready_trader_go.market_cache.file_hash(str(source))
+    print("cached %d snapshots of '%s' in '%s'" % (len(snapshots), source, ready_trader_go.market_cache.cache_filename(
+        digest, args.interval, args.depth, str(args.directory))))
+
+
+def convert(args) -> None:
+    """Convert a market data CSV file to the binary market data format."""
+    source: pathlib.Path = args.filename
+    if not source.is_file():
+        print("'%s' is not a regular file" % str(source), file=sys.stderr)
+        return
+
+    destination: pathlib.Path = args.output or source.with_suffix(".bin")
+    try:
+        with source.open(newline="") as csv_file, destination.open("wb") as binary_file:
+            count = ready_trader_go.market_data.convert_csv(csv_file, binary_file)
+    except (KeyError, ValueError) as e:
+        print("'%s' is not a valid market data file: %s" % (source, e), file=sys.stderr)
+        destination.unlink(missing_ok=True)
+        return
+
+    print("wrote %d market events to '%s'" % (count, destination))
+
+
+def generate(args) -> None:
+    """Generate a synthetic market data file."""
+    try:
+        generator = ready_trader_go.market_generator.MarketDataGenerator(
+            args.duration, args.rate, args.depth, args.cancel_ratio, args.volatility, args.correlation, args.seed,
+            args.start_price, args.tick_size, args.etf_ratio, args.aggressive_ratio, args.amend_ratio)
+    except ValueError as e:
+        print("invalid market data settings: %s" % e, file=sys.stderr)
+        return
+
+    destination: pathlib.Path = args.output
+    binary: bool = destination.suffix.lower() == ".bin" or (
+        destination.suffix.lower() in ready_trader_go.market_data.DECOMPRESSORS
+        and destination.with_suffix("").suffix.lower() == ".bin")
+    count = ready_trader_go.market_data.write_market_data(str(destination), generator.rows(), binary)
+    print("wrote %d market events to '%s'" % (count, destination))
+
+
 def no_heads_up_display() -> None:
     print("Cannot run the Ready Trader Go heads-up display. This could\n"
           "mean that the PySide6 module has not been installed. Please\n"
@@ -49,7 +108,11 @@ def replay(args) -> None:
         print("'%s' is not a regular file" % str(path), file=sys.stderr)
         return
 
-    hud_replay(path)
+    if args.market_data is not None and not args.market_data.is_file():
+        print("'%s' is not a regular file" % str(args.market_data), file=sys.stderr)
+        return
+
+    hud_replay(path, args.market_data, args.start_time)
 
 
 def on_error(name: str, error: Exception) -> None:
@@ -118,8 +181,74 @@ def main() -> None:
     replay_parser.add_argument("filename", nargs="?", default=pathlib.Path("match_events.csv"),
                                help="name of the match events file to replay (default 'match_events.csv')",
                                type=pathlib.Path)
+    replay_parser.add_argument("--market-data", type=pathlib.Path,
+                               help=("name of the market data file the match was run with, to show the midpoint "
+                                     "prices of the market without any autotraders alongside those of the match"))
+    replay_parser.add_argument("--start-time", type=float, default=0.0,
+                               help="the match's start time in seconds into the market data file (default 0)")
     replay_parser.set_defaults(func=replay)
 
+    convert_parser = subparsers.add_parser("convert", aliases=["co"],
+                                           description=("Convert a market data CSV file to the binary format, "
+                                                        "which the exchange simulator reads faster."),
+                                           help="convert a market data CSV file to the binary format")
+    convert_parser.add_argument("filename", type=pathlib.Path,
+                                help="name of the market data CSV file to convert")
+    convert_parser.add_argument("-o", "--output", type=pathlib.Path,
+                                help="name of the binary file to write (default is the CSV filename ending in '.bin')")
+    convert_parser.set_defaults(func=convert)
+
+    cache_parser = subparsers.add_parser("cache", aliases=["ca"],
+                                         description=("Build the cache of market-only order book snapshots for a "
+                                                      "market data file, for tools that need the state of the "
+                                                      "market without any autotraders."),
+                                         help="cache market-only order book snapshots for a market data file")
+    cache_parser.add_argument("filename", type=pathlib.Path,
+                              help="name of the market data file")
+    cache_parser.add_argument("--interval", type=float, default=ready_trader_go.market_cache.SNAPSHOT_INTERVAL,
+                              help="seconds of market data between snapshots (default %(default)s)")
+    cache_parser.add_argument("--depth", type=int, default=ready_trader_go.market_cache.TOP_LEVEL_COUNT,
+                              help="number of price levels on each side of each snapshot (default %(default)s)")
+    cache_parser.add_argument("--directory", type=pathlib.Path,
+                              default=pathlib.Path(ready_trader_go.market_cache.CACHE_DIRECTORY),
+                              help="directory holding the cache (default '%(default)s')")
+    cache_parser.set_defaults(func=cache)
+
+    generate_parser = subparsers.add_parser("generate", aliases=["ge"],
+                                            description=("Generate a synthetic market data file for load and "
+                                                         "scaling tests. The file is written in the binary "
+                                                         "format if its name ends in '.bin' and as CSV "
+                                                         "otherwise, and it is compressed if its name ends in "
+                                                         "'.gz', '.bz2', '.xz' or '.lzma'."),
+                                            help="generate a synthetic market data file")
+    generate_parser.add_argument("output", type=pathlib.Path,
+                                 help="name of the market data file to write")
+    generate_parser.add_argument("--duration", type=float, default=3600.0,
+                                 help="seconds of market data to generate (default 3600)")
+    generate_parser.add_argument("--rate", type=float, default=500.0,
+                                 help="average number of market events per second (default 500)")
+    generate_parser.add_argument("--depth", type=int, default=10,
+                                 help="number of price levels either side of the fair price (default 10)")
+    generate_parser.add_argument("--cancel-ratio", type=float, default=0.45,
+                                 help="share of market events that cancel a resting order (default 0.45)")
+    generate_parser.add_argument("--amend-ratio", type=float, default=0.01,
+                                 help="share of market events that reduce a resting order's volume (default 0.01)")
+    generate_parser.add_argument("--aggressive-ratio", type=float, default=0.02,
+                                 help="share of market events that are fill-and-kill orders (default 0.02)")
+    generate_parser.add_argument("--etf-ratio", type=float, default=0.05,
+                                 help="share of market events for the ETF rather than the future (default 0.05)")
+    generate_parser.add_argument("--volatility", type=float, default=0.0001,
+                                 help="standard deviation of the future's return over one second (default 0.0001)")
+    generate_parser.add_argument("--correlation", type=float, default=0.9,
+                                 help="correlation of the ETF's returns with the future's (default 0.9)")
+    generate_parser.add_argument("--start-price", type=float, default=1000.0,
+                                 help="starting price of both instruments (default 1000.00)")
+    generate_parser.add_argument("--tick-size", type=float, default=1.0,
+                                 help="price increment between levels (default 1.00)")
+    generate_parser.add_argument("--seed", type=int, default=0,
+                                 help="seed for the random number generator (default 0)")
+    generate_parser.set_defaults(func=generate)
+
     args = parser.parse_args()
     args.func(args)
 
@@ -0,0 +1,85 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+import fractions
+import random
+
+import pytest
+
+from ready_trader_go.account import AccountFactory
+from ready_trader_go.fees import FEE_SCALE, FeeSchedule, scaled_fee, to_micro_basis_points
+from ready_trader_go.types import Instrument, Side
+
+
+def exact_fee(price: int, volume: int, rate: str) -> int:
+    """Return price times volume times rate rounded half to even, using exact fractions."""
+    return round(fractions.Fraction(price * volume) * fractions.Fraction(rate))
+
+
+@pytest.mark.parametrize("amount, expected", [
+    (0, 0),
+    (FEE_SCALE // 2, 0),
+    (FEE_SCALE + FEE_SCALE // 2, 2),
+    (FEE_SCALE // 2 + 1, 1),
+    (-FEE_SCALE // 2, 0),
+    (-FEE_SCALE - FEE_SCALE // 2, -2),
+    (-FEE_SCALE // 2 - 1, -1),
+    (7 * FEE_SCALE, 7),
+])
+def test_scaled_fee_rounds_half_to_even(amount, expected):
+    assert scaled_fee(amount) == expected
+
+
+def test_to_micro_basis_points():
+    assert to_micro_basis_points(1.0) == FEE_SCALE
+    assert to_micro_basis_points(0.0002) == 2_000_000
+    assert to_micro_basis_points(-0.0001) == -1_000_000
+
+
+def test_fee_schedule_matches_exact_arithmetic():
+    fees = FeeSchedule(-0.0001, 0.0002)
+    rng = random.Random(7)
+    for _ in range(10_000):
+        price = rng.randrange(100, 1_000_000, 100)
+        volume = rng.randint(1, 200)
+        assert fees.taker_fee(price, volume) == exact_fee(price, volume, "0.0002")
+        assert scaled_fee(fees.maker_fee_per_lot(price) * volume) == exact_fee(price, volume, "-0.0001")
+
+
+def test_account_transact_is_exact():
+    account = AccountFactory(0.002, 1.00).create()
+    account.transact(Instrument.ETF, Side.BUY, 10_000_300, 3, 6)
+    account.transact(Instrument.ETF, Side.SELL, 10_000_400, 2, -2)
+    assert account.account_balance == -10_000_300 * 3 + 10_000_400 * 2 - 4
+    assert account.total_fees == 4
+    assert account.etf_position == 1
+    assert account.buy_volume == 3 and account.sell_volume == 2
+
+
+@pytest.mark.parametrize("future_price, etf_price, clamped", [
+    (100_000, 100_000, 100_000),
+    (100_000, 101_000, 100_200),
+    (100_000, 99_000, 99_800),
+    (100_050, 200_000, 100_250),
+    (49_950, 0, 49_850),
+    (50_025.5, 60_000, 50_125.5),
+])
+def test_account_update_clamps_etf_price(future_price, etf_price, clamped):
+    account = AccountFactory(0.002, 1.00).create()
+    account.transact(Instrument.ETF, Side.BUY, etf_price, 1, 0)
+    account.update(future_price, etf_price)
+    assert account.profit_or_loss == clamped - etf_price
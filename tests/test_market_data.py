@@ -0,0 +1,60 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+"""Tests for reading market data files."""
+import io
+
+import pytest
+
+from ready_trader_go.market_data import BINARY_NONE, load_csv_array, parse_csv
+from ready_trader_go.types import Instrument, Lifespan, MarketEventOperation, Side
+
+numpy = pytest.importorskip("numpy")
+
+MARKET_DATA = """Time,Instrument,Operation,OrderId,Side,Volume,Price,Lifespan
+0.0,0,Insert,1,B,4000,999.00,G
+0.0,1,Insert,2,A,12,1001.50,F
+0.5,1,Amend,2,,8,,
+1.25,0,Cancel,1,,,,
+2.0,1,Insert,3,B,1,0.01,G
+"""
+
+
+def array_rows(array):
+    """Return the rows of a market data array in the form yielded by parse_csv."""
+    return [(float(row["time"]), Instrument(row["instrument"]), MarketEventOperation(row["operation"]),
+             int(row["order_id"]), Side(row["side"]) if row["side"] != BINARY_NONE else None, int(row["volume"]),
+             int(row["price"]), Lifespan(row["lifespan"]) if row["lifespan"] != BINARY_NONE else None)
+            for row in array]
+
+
+def test_load_csv_array_matches_parse_csv():
+    array = load_csv_array(io.StringIO(MARKET_DATA))
+    assert array_rows(array) == list(parse_csv(io.StringIO(MARKET_DATA)))
+    assert array["price"].tolist() == [99900, 100150, 0, 0, 1]
+
+
+def test_load_csv_array_with_no_rows():
+    with pytest.warns(UserWarning):
+        assert len(load_csv_array(io.StringIO(MARKET_DATA.splitlines(True)[0]))) == 0
+
+
+@pytest.mark.parametrize("row", ["0.0,0,Insert,1,B,4000", "0.0,0,Bogus,1,B,4000,999.00,G",
+                                 "0.0,2,Insert,1,B,4000,999.00,G", "0.0,0,Insert,1,X,4000,999.00,G"])
+def test_load_csv_array_rejects_invalid_rows(row):
+    with pytest.raises(ValueError):
+        load_csv_array(io.StringIO(MARKET_DATA + row + "\n"))
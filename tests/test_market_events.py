@@ -0,0 +1,86 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+"""Tests for the market events reader."""
+import asyncio
+
+from typing import List
+
+import pytest
+
+from ready_trader_go.market_events import MarketEventsReader, NumPyMarketEventsReader
+from ready_trader_go.match_events import MatchEvents
+from ready_trader_go.order_book import Order, OrderBook, OrderPool
+from ready_trader_go.types import Instrument, Side
+
+MARKET_DATA = """Time,Instrument,Operation,OrderId,Side,Volume,Price,Lifespan
+0.0,1,Insert,1,B,2,100.00,G
+0.0,1,Insert,2,B,2,99.00,G
+0.0,1,Insert,3,B,2,98.00,G
+0.1,1,Insert,4,A,6,98.00,F
+0.2,1,Insert,5,B,3,97.00,G
+0.2,1,Insert,6,B,4,96.00,G
+0.2,1,Insert,7,A,5,101.00,G
+0.2,1,Insert,8,A,6,102.00,G
+"""
+
+
+def run_reader(reader_class, filename: str, aggregate_fills: bool) -> List[List[int]]:
+    """Play a market data file with an order pool and return the client order ids of each release to the pool."""
+    released: List[List[int]] = []
+
+    class RecordingOrderPool(OrderPool):
+        def release(self, order: Order) -> None:
+            released[-1].append(order.client_order_id)
+            super().release(order)
+
+    async def play() -> OrderBook:
+        books = [OrderBook(i, -0.0001, 0.0002, aggregate_fills=aggregate_fills) for i in Instrument]
+        reader = reader_class(filename, asyncio.get_running_loop(), books[0], books[1], MatchEvents(),
+                              RecordingOrderPool(), statistics_interval=0.0)
+        done: List[bool] = []
+        reader.task_complete.append(lambda _: done.append(True))
+        reader.start()
+        now = 0.0
+        while not done:
+            now += 0.05
+            released.append([])
+            reader.process_market_events(now)
+            await asyncio.sleep(0.001)
+        return books[Instrument.ETF]
+
+    book = asyncio.run(play())
+
+    # The orders inserted after the sweep reuse pooled orders and must be distinct, live orders
+    orders = [book.get(None, client_order_id) for client_order_id in (5, 6, 7, 8)]
+    assert len(set(map(id, orders))) == 4
+    assert [(o.side, o.price, o.remaining_volume) for o in orders] == [(Side.BUY, 9700, 3), (Side.BUY, 9600, 4),
+                                                                      (Side.SELL, 10100, 5), (Side.SELL, 10200, 6)]
+    assert (book.best_bid(), book.best_ask()) == (9700, 10100)
+    return [ids for ids in released if ids]
+
+
+@pytest.mark.parametrize("aggregate_fills", (False, True))
+@pytest.mark.parametrize("reader_class", (MarketEventsReader, NumPyMarketEventsReader))
+def test_order_pool_gets_each_finished_order_once_after_a_sweep(tmp_path, reader_class, aggregate_fills):
+    if reader_class is NumPyMarketEventsReader:
+        pytest.importorskip("numpy")
+    filename = tmp_path / "market_data.csv"
+    filename.write_text(MARKET_DATA)
+
+    # The sweep finishes the three bids and the aggressive order, and all four are released once
+    assert run_reader(reader_class, str(filename), aggregate_fills) == [[1, 2, 3, 4]]
@@ -0,0 +1,709 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+"""Behavioural tests shared by every order book implementation."""
+import array
+import random
+
+from typing import Any, Callable, List, Tuple
+
+import pytest
+
+from ready_trader_go.order_book import (TOP_LEVEL_COUNT, IOrderListener, LadderOrderBook, Order, OrderBook,
+                                        OrderPool, PriceLevel, TradeTicks)
+from ready_trader_go.types import Instrument, Lifespan, MarketEventOperation, Side
+
+MAKER_FEE = -0.0001
+TAKER_FEE = 0.0002
+TICK_SIZE = 100
+
+BOOK_FACTORIES = {
+    "sorted": lambda **kwargs: OrderBook(Instrument.ETF, MAKER_FEE, TAKER_FEE, **kwargs),
+    "ladder": lambda **kwargs: LadderOrderBook(Instrument.ETF, MAKER_FEE, TAKER_FEE, TICK_SIZE, **kwargs),
+    # A window this small keeps moving, and puts levels outside it, in most tests
+    "narrow_ladder": lambda **kwargs: LadderOrderBook(Instrument.ETF, MAKER_FEE, TAKER_FEE, TICK_SIZE, ladder_size=4,
+                                                      **kwargs),
+}
+
+
+class RecordingListener(IOrderListener):
+    """An order listener that records every call it receives."""
+
+    def __init__(self):
+        self.calls: List[Tuple[Any, ...]] = []
+
+    def on_order_amended(self, now: float, order: Order, volume_removed: int) -> None:
+        self.calls.append(("amended", order.client_order_id, volume_removed))
+
+    def on_order_cancelled(self, now: float, order: Order, volume_removed: int) -> None:
+        self.calls.append(("cancelled", order.client_order_id, volume_removed))
+
+    def on_order_placed(self, now: float, order: Order) -> None:
+        self.calls.append(("placed", order.client_order_id))
+
+    def on_order_filled(self, now: float, order: Order, price: int, volume: int, fee: int) -> None:
+        self.calls.append(("filled", order.client_order_id, price, volume, fee))
+
+
+@pytest.fixture(params=sorted(BOOK_FACTORIES))
+def make_book(request) -> Callable[..., OrderBook]:
+    return BOOK_FACTORIES[request.param]
+
+
+@pytest.fixture
+def book(make_book) -> OrderBook:
+    return make_book()
+
+
+@pytest.fixture
+def listener() -> RecordingListener:
+    return RecordingListener()
+
+
+def make_order(client_order_id: int, side: Side, price: int, volume: int, listener: IOrderListener = None,
+               lifespan: Lifespan = Lifespan.GOOD_FOR_DAY, owner: Any = "team") -> Order:
+    return Order(client_order_id, Instrument.ETF, lifespan, side, price, volume, listener, owner)
+
+
+def queue(book: OrderBook, side: Side, price: int) -> List[int]:
+    """Return the client order ids of the orders queued at a price, front first."""
+    for level_price, level in book._walk_levels(side):
+        if level_price == price:
+            ids: List[int] = []
+            order = level.first
+            while order is not None:
+                ids.append(order.client_order_id)
+                order = order.next_order
+            return ids
+    return []
+
+
+def levels(book: OrderBook) -> Tuple[List[int], List[int], List[int], List[int]]:
+    ask_prices, ask_volumes, bid_prices, bid_volumes = ([0] * book.depth for _ in range(4))
+    book.top_levels(ask_prices, ask_volumes, bid_prices, bid_volumes)
+    return ask_prices, ask_volumes, bid_prices, bid_volumes
+
+
+def test_empty_book(book):
+    assert book.best_ask() is None
+    assert book.best_bid() is None
+    assert book.midpoint_price() is None
+    assert book.last_traded_price() is None
+    assert levels(book) == ([0] * TOP_LEVEL_COUNT,) * 4
+
+
+def test_insert_rests_orders_that_do_not_cross(book, listener):
+    book.insert(1.0, make_order(1, Side.BUY, 10000, 5, listener))
+    book.insert(1.0, make_order(2, Side.SELL, 10200, 7, listener))
+
+    assert listener.calls == [("placed", 1), ("placed", 2)]
+    assert book.best_bid() == 10000
+    assert book.best_ask() == 10200
+    assert book.midpoint_price() == 10100.0
+    assert levels(book) == ([10200, 0, 0, 0, 0], [7, 0, 0, 0, 0], [10000, 0, 0, 0, 0], [5, 0, 0, 0, 0])
+
+
+def test_top_levels_are_best_first_and_limited_to_the_depth(book):
+    for i in range(7):
+        book.insert(0.0, make_order(i, Side.BUY, 10000 - i * TICK_SIZE, i + 1))
+        book.insert(0.0, make_order(100 + i, Side.SELL, 10100 + i * TICK_SIZE, 10 + i))
+    book.insert(0.0, make_order(200, Side.BUY, 9900, 4))
+
+    assert levels(book) == ([10100, 10200, 10300, 10400, 10500], [10, 11, 12, 13, 14],
+                            [10000, 9900, 9800, 9700, 9600], [1, 6, 3, 4, 5])
+
+
+def test_trade_fills_resting_orders_in_time_priority(book, listener):
+    book.insert(0.0, make_order(1, Side.SELL, 10100, 3, listener))
+    book.insert(0.0, make_order(2, Side.SELL, 10100, 4, listener))
+    listener.calls.clear()
+
+    aggressor = make_order(3, Side.BUY, 10100, 5, listener)
+    book.insert(1.0, aggressor)
+
+    assert listener.calls == [("filled", 1, 10100, 3, -3), ("filled", 2, 10100, 2, -2), ("filled", 3, 10100, 5, 10)]
+    assert aggressor.remaining_volume == 0
+    assert book.last_traded_price() == 10100
+    assert levels(book)[:2] == ([10100, 0, 0, 0, 0], [2, 0, 0, 0, 0])
+    assert book.get("team", 1) is None
+    assert book.get("team", 2).remaining_volume == 2
+
+
+def test_trade_sweeps_levels_and_rests_the_remainder(book, listener):
+    book.insert(0.0, make_order(1, Side.BUY, 10000, 2, listener))
+    book.insert(0.0, make_order(2, Side.BUY, 9900, 2, listener))
+    book.insert(0.0, make_order(3, Side.BUY, 9800, 2, listener))
+    listener.calls.clear()
+
+    aggressor = make_order(4, Side.SELL, 9900, 6, listener)
+    book.insert(1.0, aggressor)
+
+    assert listener.calls == [("filled", 1, 10000, 2, -2), ("filled", 4, 10000, 2, 4),
+                              ("filled", 2, 9900, 2, -2), ("filled", 4, 9900, 2, 4), ("placed", 4)]
+    assert aggressor.remaining_volume == 2
+    assert aggressor.total_fees == 8
+    assert book.last_traded_price() == 9900
+    assert levels(book) == ([9900, 0, 0, 0, 0], [2, 0, 0, 0, 0], [9800, 0, 0, 0, 0], [2, 0, 0, 0, 0])
+
+
+def test_fill_and_kill_remainder_is_cancelled(book, listener):
+    book.insert(0.0, make_order(1, Side.SELL, 10100, 2, listener))
+    listener.calls.clear()
+
+    aggressor = make_order(2, Side.BUY, 10200, 5, listener, Lifespan.FILL_AND_KILL)
+    book.insert(1.0, aggressor)
+
+    assert listener.calls == [("filled", 1, 10100, 2, -2), ("filled", 2, 10100, 2, 4), ("cancelled", 2, 3)]
+    assert aggressor.remaining_volume == 0
+    assert book.best_ask() is None
+    assert book.best_bid() is None
+
+
+def test_amend_reduces_volume(book, listener):
+    order = make_order(1, Side.BUY, 10000, 10, listener)
+    book.insert(0.0, order)
+    book.insert(0.0, make_order(2, Side.BUY, 10000, 5, listener))
+    book.amend(1.0, order, 4)
+
+    assert listener.calls[-1] == ("amended", 1, 6)
+    assert order.volume == 4
+    assert order.remaining_volume == 4
+    assert levels(book)[2:] == ([10000, 0, 0, 0, 0], [9, 0, 0, 0, 0])
+
+
+def test_amend_below_the_filled_volume_removes_the_order(book, listener):
+    order = make_order(1, Side.BUY, 10000, 10, listener)
+    book.insert(0.0, order)
+    book.insert(0.0, make_order(2, Side.SELL, 10000, 6))
+    book.amend(1.0, order, 2)
+
+    assert listener.calls[-1] == ("amended", 1, 4)
+    assert order.volume == 6
+    assert order.remaining_volume == 0
+    assert book.best_bid() is None
+    assert book.get("team", 1) is None
+
+
+def test_cancel_removes_the_order(book, listener):
+    first = make_order(1, Side.SELL, 10100, 3, listener)
+    second = make_order(2, Side.SELL, 10100, 4, listener)
+    book.insert(0.0, first)
+    book.insert(0.0, second)
+    book.cancel(1.0, first)
+
+    assert listener.calls[-1] == ("cancelled", 1, 3)
+    assert first.remaining_volume == 0
+    assert levels(book)[:2] == ([10100, 0, 0, 0, 0], [4, 0, 0, 0, 0])
+
+    # The cancelled order must no longer be at the front of the queue
+    book.insert(2.0, make_order(3, Side.BUY, 10100, 1, listener))
+    assert ("filled", 2, 10100, 1, -1) in listener.calls
+
+    book.cancel(3.0, second)
+    assert book.best_ask() is None
+
+    # Cancelling an order that is no longer in the book does nothing
+    listener.calls.clear()
+    book.cancel(4.0, second)
+    assert listener.calls == []
+
+
+def test_try_trade_does_not_change_the_book(book):
+    book.insert(0.0, make_order(1, Side.SELL, 10100, 2))
+    book.insert(0.0, make_order(2, Side.SELL, 10200, 3))
+    book.insert(0.0, make_order(3, Side.SELL, 10400, 5))
+    before = levels(book)
+
+    assert book.try_trade(Side.BUY, 10000, 5) == (0, 0)
+    assert book.try_trade(Side.BUY, 10100, 5) == (2, 10100)
+    assert book.try_trade(Side.BUY, 10200, 4) == (4, (2 * 10100 + 2 * 10200) // 4)
+    assert book.try_trade(Side.BUY, 20000, 100) == (10, (2 * 10100 + 3 * 10200 + 5 * 10400) // 10)
+    assert book.try_trade(Side.SELL, 1, 1) == (0, 0)
+    assert levels(book) == before
+
+
+def test_order_pool_reuses_released_orders():
+    pool = OrderPool()
+    first = pool.acquire(1, Instrument.ETF, Lifespan.GOOD_FOR_DAY, Side.BUY, 10000, 5, owner="team")
+    pool.release(first)
+    assert len(pool) == 1
+
+    second = pool.acquire(2, Instrument.FUTURE, Lifespan.FILL_AND_KILL, Side.SELL, 10100, 3)
+    assert second is first
+    assert (second.client_order_id, second.instrument, second.lifespan, second.side, second.price, second.volume,
+            second.remaining_volume, second.total_fees, second.owner) == (2, Instrument.FUTURE,
+                                                                          Lifespan.FILL_AND_KILL, Side.SELL, 10100,
+                                                                          3, 3, 0, None)
+    assert (pool.hits, pool.misses, len(pool)) == (1, 1, 0)
+
+
+def test_order_pool_rejects_an_order_it_already_holds():
+    pool = OrderPool()
+    order = pool.acquire(1, Instrument.ETF, Lifespan.GOOD_FOR_DAY, Side.BUY, 10000, 5)
+    pool.release(order)
+    with pytest.raises(ValueError, match="already in the pool"):
+        pool.release(order)
+    assert len(pool) == 1
+
+    # Once handed out again it may be released again
+    assert pool.acquire(2, Instrument.ETF, Lifespan.GOOD_FOR_DAY, Side.BUY, 10000, 5) is order
+    pool.release(order)
+    assert len(pool) == 1
+
+
+def test_price_level_unlinks_orders_from_anywhere_in_the_queue():
+    level = PriceLevel()
+    orders = [make_order(i, Side.BUY, 10000, 1) for i in range(4)]
+    for order in orders:
+        level.append(order)
+
+    def ids() -> List[int]:
+        forwards: List[int] = []
+        order = level.first
+        while order is not None:
+            forwards.append(order.client_order_id)
+            order = order.next_order
+        backwards: List[int] = []
+        order = level.last
+        while order is not None:
+            backwards.append(order.client_order_id)
+            order = order.previous_order
+        assert backwards == forwards[::-1]
+        return forwards
+
+    level.remove(orders[1])
+    assert ids() == [0, 2, 3]
+    level.remove(orders[0])
+    assert ids() == [2, 3]
+    level.remove(orders[3])
+    assert ids() == [2]
+    level.remove(orders[2])
+    assert ids() == []
+    assert level.first is None and level.last is None
+    assert all(o.next_order is None and o.previous_order is None for o in orders)
+
+
+def test_cancel_and_amend_unlink_orders_at_once(book):
+    orders = [make_order(i, Side.SELL, 10100, 2) for i in range(5)]
+    for order in orders:
+        book.insert(0.0, order)
+
+    book.cancel(1.0, orders[1])
+    book.amend(1.0, orders[3], 0)
+    assert queue(book, Side.SELL, 10100) == [0, 2, 4]
+
+    book.cancel(2.0, orders[0])
+    book.cancel(2.0, orders[4])
+    assert queue(book, Side.SELL, 10100) == [2]
+
+    # A partly filled order stays in the queue until it is finished
+    book.insert(3.0, make_order(10, Side.BUY, 10100, 1))
+    assert queue(book, Side.SELL, 10100) == [2]
+    assert orders[2].remaining_volume == 1
+
+
+def test_queues_only_hold_live_orders_under_heavy_cancel_traffic(book, listener):
+    for i in range(1000):
+        order = make_order(i, Side.BUY, 10000, 1, listener)
+        book.insert(0.0, order)
+        if i % 100 != 99:
+            book.cancel(0.0, order)
+
+    assert queue(book, Side.BUY, 10000) == list(range(99, 1000, 100))
+    listener.calls.clear()
+    book.insert(1.0, make_order(2000, Side.SELL, 10000, 1, listener))
+    assert listener.calls[0] == ("filled", 99, 10000, 1, -1)
+
+
+@pytest.mark.parametrize("buffer", ("list", "array", "numpy"))
+def test_depth_snapshot_writes_any_number_of_levels_into_the_buffers(book, buffer):
+    for i in range(12):
+        book.insert(0.0, make_order(i, Side.BUY, 10000 - i * TICK_SIZE, i + 1))
+    for i in range(3):
+        book.insert(0.0, make_order(100 + i, Side.SELL, 10100 + 2 * i * TICK_SIZE, 10))
+
+    if buffer == "numpy":
+        numpy = pytest.importorskip("numpy")
+        buffers = [numpy.full(10, 7, dtype=numpy.int64) for _ in range(4)]
+    elif buffer == "array":
+        buffers = [array.array("q", [7] * 10) for _ in range(4)]
+    else:
+        buffers = [[7] * 10 for _ in range(4)]
+    ask_prices, ask_volumes, bid_prices, bid_volumes = buffers
+
+    assert book.depth_snapshot(10, ask_prices, ask_volumes, bid_prices, bid_volumes) == (3, 10)
+    assert list(ask_prices) == [10100, 10300, 10500] + [0] * 7
+    assert list(ask_volumes) == [10, 10, 10] + [0] * 7
+    assert list(bid_prices) == [10000 - i * TICK_SIZE for i in range(10)]
+    assert list(bid_volumes) == list(range(1, 11))
+
+    assert book.depth_snapshot(2, ask_prices, ask_volumes, bid_prices, bid_volumes) == (2, 2)
+    assert list(ask_prices[:3]) == [10100, 10300, 10500]  # Only the first n elements are written
+    assert list(bid_volumes[:3]) == [1, 2, 3]
+
+
+@pytest.mark.parametrize("depth", (1, 2, TOP_LEVEL_COUNT, 7))
+@pytest.mark.parametrize("sign", (1, -1))
+def test_trade_ticks_keep_the_best_prices_traded(sign, depth):
+    rng = random.Random(depth * sign)
+    ticks = TradeTicks(sign, depth)
+    prices = [rng.randint(1, 9) for _ in range(depth)]
+    volumes = [rng.randint(1, 9) for _ in range(depth)]
+
+    for _ in range(200):
+        traded = {}
+        for _ in range(rng.randint(0, 30)):
+            price = rng.randint(95, 105) * TICK_SIZE
+            volume = rng.randint(1, 10)
+            ticks.add(price, volume)
+            traded[price] = traded.get(price, 0) + volume
+
+        # The same as sorting every price traded, best first, and keeping the best
+        best = sorted(traded, key=lambda p: p * sign, reverse=True)[:depth]
+        ticks.flush(prices, volumes)
+        assert prices == best + [0] * (depth - len(best))
+        assert volumes == [traded[p] for p in best] + [0] * (depth - len(best))
+        assert ticks.count == 0
+
+
+def test_trade_ticks_report_trades_since_the_last_call(book):
+    book.insert(0.0, make_order(1, Side.SELL, 10100, 2))
+    book.insert(0.0, make_order(2, Side.SELL, 10200, 2))
+    book.insert(0.0, make_order(3, Side.BUY, 9900, 2))
+    book.insert(1.0, make_order(4, Side.BUY, 10200, 3))
+    book.insert(1.0, make_order(5, Side.SELL, 9800, 1))
+    book.insert(1.0, make_order(6, Side.BUY, 10200, 1))
+
+    ask_prices, ask_volumes, bid_prices, bid_volumes = ([7] * book.depth for _ in range(4))
+    assert book.trade_ticks(ask_prices, ask_volumes, bid_prices, bid_volumes)
+    assert (ask_prices, ask_volumes) == ([10100, 10200, 0, 0, 0], [2, 2, 0, 0, 0])
+    assert (bid_prices, bid_volumes) == ([9900, 0, 0, 0, 0], [1, 0, 0, 0, 0])
+    assert not book.trade_ticks(ask_prices, ask_volumes, bid_prices, bid_volumes)
+
+
+def test_top_levels_version_only_changes_when_the_top_levels_change(book):
+    for i in range(TOP_LEVEL_COUNT):
+        book.insert(0.0, make_order(i, Side.BUY, 10000 - i * TICK_SIZE, 1))
+        book.insert(0.0, make_order(10 + i, Side.SELL, 10100 + i * TICK_SIZE, 1))
+    top = levels(book)
+    version = book.top_levels_version()
+
+    # Changes below the top levels leave the version, and the top levels, alone
+    deep_bid = make_order(20, Side.BUY, 9000, 3)
+    deep_ask = make_order(21, Side.SELL, 11000, 3)
+    book.insert(1.0, deep_bid)
+    book.insert(1.0, deep_ask)
+    book.amend(1.0, deep_bid, 2)
+    book.cancel(1.0, deep_ask)
+    assert book.top_levels_version() == version
+    assert levels(book) == top
+
+    # A change to one of the top levels changes the version
+    book.insert(2.0, make_order(22, Side.SELL, 10100 + (TOP_LEVEL_COUNT - 1) * TICK_SIZE, 4))
+    assert book.top_levels_version() != version
+    version = book.top_levels_version()
+    assert levels(book)[1] == [1, 1, 1, 1, 5]
+
+    # Taking out a top level brings a deeper level into view
+    book.cancel_by_id(3.0, "team", 0)
+    assert book.top_levels_version() != version
+    version = book.top_levels_version()
+    assert levels(book)[2:] == ([9900, 9800, 9700, 9600, 9000], [1, 1, 1, 1, 2])
+
+    book.insert(4.0, make_order(23, Side.SELL, 9900, 1))
+    assert book.top_levels_version() != version
+    assert book.last_traded_price() == 9900
+    assert levels(book)[2:] == ([9800, 9700, 9600, 9000, 0], [1, 1, 1, 2, 0])
+
+
+def test_top_levels_version_changes_after_any_change_to_the_top_levels_since_they_were_read(book):
+    levels(book)
+    version = book.top_levels_version()
+    for i in range(3):
+        book.insert(0.0, make_order(i, Side.BUY, 10000 - i * TICK_SIZE, 1))
+        assert book.top_levels_version() != version
+    assert levels(book)[2] == [10000, 9900, 9800, 0, 0]
+
+
+def test_top_levels_cache_is_not_shared_with_the_caller(book):
+    book.insert(0.0, make_order(1, Side.BUY, 10000, 1))
+    ask_prices, ask_volumes, bid_prices, bid_volumes = levels(book)
+    bid_prices[0] = 1
+    bid_volumes[0] = 1
+    assert levels(book)[2:] == ([10000, 0, 0, 0, 0], [1, 0, 0, 0, 0])
+
+
+def random_operations(seed: int, count: int) -> List[Tuple[Any, ...]]:
+    """Return a random mix of inserts, amends and cancels around a drifting price."""
+    rng = random.Random(seed)
+    operations: List[Tuple[Any, ...]] = []
+    mid = 10000
+    for client_order_id in range(count):
+        mid += rng.choice((-TICK_SIZE, 0, TICK_SIZE))
+        choice = rng.random()
+        if choice < 0.6 or client_order_id < 10:
+            side = rng.choice((Side.BUY, Side.SELL))
+            offset = rng.randint(-3, 12) * TICK_SIZE
+            price = mid - offset if side == Side.BUY else mid + offset
+            lifespan = Lifespan.FILL_AND_KILL if rng.random() < 0.2 else Lifespan.GOOD_FOR_DAY
+            operations.append(("insert", client_order_id, side, price, rng.randint(1, 20), lifespan))
+        elif choice < 0.8:
+            operations.append(("amend", rng.randrange(client_order_id), rng.randint(0, 15)))
+        else:
+            operations.append(("cancel", rng.randrange(client_order_id)))
+    return operations
+
+
+def apply_operations(book: OrderBook, operations: List[Tuple[Any, ...]], listener: IOrderListener) -> List[Any]:
+    """Apply operations to a book and return its state after each one."""
+    states: List[Any] = []
+    for now, operation in enumerate(operations):
+        if operation[0] == "insert":
+            _, client_order_id, side, price, volume, lifespan = operation
+            book.insert(now, make_order(client_order_id, side, price, volume, listener, lifespan))
+        elif operation[0] == "amend":
+            book.amend_by_id(now, "team", operation[1], operation[2])
+        else:
+            book.cancel_by_id(now, "team", operation[1])
+        states.append((levels(book), book.last_traded_price(), book.try_trade(Side.BUY, 10500, 30),
+                       book.try_trade(Side.SELL, 9500, 30)))
+    return states
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_operations_match_the_sorted_book(make_book, seed):
+    operations = random_operations(seed, 2000)
+    expected_listener = RecordingListener()
+    actual_listener = RecordingListener()
+
+    expected = apply_operations(OrderBook(Instrument.ETF, MAKER_FEE, TAKER_FEE), operations, expected_listener)
+    actual = apply_operations(make_book(), operations, actual_listener)
+
+    assert actual == expected
+    assert actual_listener.calls == expected_listener.calls
+
+
+def batch_operations(operations: List[Tuple[Any, ...]], listener: IOrderListener
+                     ) -> List[Tuple[float, MarketEventOperation, Order, int]]:
+    """Turn random operations into apply_batch operations on new order objects."""
+    orders = {}
+    batch: List[Tuple[float, MarketEventOperation, Order, int]] = []
+    for now, operation in enumerate(operations):
+        if operation[0] == "insert":
+            _, client_order_id, side, price, volume, lifespan = operation
+            order = orders[client_order_id] = make_order(client_order_id, side, price, volume, listener, lifespan)
+            batch.append((now, MarketEventOperation.INSERT, order, 0))
+        elif operation[1] in orders:
+            if operation[0] == "amend":
+                batch.append((now, MarketEventOperation.AMEND, orders[operation[1]], operation[2]))
+            else:
+                batch.append((now, MarketEventOperation.CANCEL, orders[operation[1]], 0))
+    return batch
+
+
+@pytest.mark.parametrize("aggregate_fills", (False, True))
+@pytest.mark.parametrize("seed", range(3))
+def test_apply_batch_matches_applying_each_operation(make_book, aggregate_fills, seed):
+    operations = random_operations(seed, 1000)
+
+    single_listener = RecordingListener()
+    single = make_book(aggregate_fills=aggregate_fills)
+    single_trades: List[OrderBook] = []
+    single.trade_occurred.append(single_trades.append)
+    for now, operation, order, volume in batch_operations(operations, single_listener):
+        if operation == MarketEventOperation.INSERT:
+            single.insert(now, order)
+        elif operation == MarketEventOperation.CANCEL:
+            single.cancel(now, order)
+        else:
+            single.amend(now, order, volume)
+
+    batched_listener = RecordingListener()
+    batched = make_book(aggregate_fills=aggregate_fills)
+    batched_trades: List[OrderBook] = []
+    batched.trade_occurred.append(batched_trades.append)
+    total_volume, total_value = batched.apply_batch(batch_operations(operations, batched_listener))
+
+    assert batched_listener.calls == single_listener.calls
+    assert levels(batched) == levels(single)
+    assert batched.last_traded_price() == single.last_traded_price()
+    assert single_trades and batched_trades == [batched]
+
+    # Every trade fills an aggressive order and, between them, passive orders for the same volume
+    fills = [call for call in single_listener.calls if call[0] == "filled"]
+    assert total_volume == sum(call[3] for call in fills) // 2
+    assert total_value == sum(call[2] * call[3] for call in fills) // 2
+
+
+def test_apply_batch_without_trades_does_not_call_trade_occurred(book, listener):
+    trades: List[OrderBook] = []
+    book.trade_occurred.append(trades.append)
+    order = make_order(1, Side.BUY, 10000, 5, listener)
+
+    result = book.apply_batch([(0.0, MarketEventOperation.INSERT, order, 0),
+                               (1.0, MarketEventOperation.AMEND, order, 3),
+                               (2.0, MarketEventOperation.CANCEL, order, 0)])
+
+    assert result == (0, 0)
+    assert trades == []
+    assert listener.calls == [("placed", 1), ("amended", 1, 2), ("cancelled", 1, 3)]
+    assert book.best_bid() is None
+
+
+def book_state(book: OrderBook) -> Tuple[Any, ...]:
+    """Return everything a checkpoint holds about a book, taking its trade ticks."""
+    sides = tuple([(price, [(o.client_order_id, o.volume, o.remaining_volume, o.total_fees, o.owner)
+                            for o in iterate_queue(level)])
+                   for price, level in book._walk_levels(side)] for side in (Side.SELL, Side.BUY))
+    ticks = tuple([0] * book.depth for _ in range(4))
+    book.trade_ticks(*ticks)
+    return sides, ticks, book.last_traded_price()
+
+
+def iterate_queue(level: PriceLevel):
+    order = level.first
+    while order is not None:
+        yield order
+        order = order.next_order
+
+
+@pytest.mark.parametrize("restore_into", sorted(BOOK_FACTORIES))
+@pytest.mark.parametrize("seed", range(3))
+def test_checkpoint_and_restore_round_trip(make_book, restore_into, seed):
+    operations = random_operations(seed, 1500)
+    original = make_book()
+    apply_operations(original, operations[:1000], None)
+    data = original.checkpoint()
+
+    restored_listener = RecordingListener()
+    restored = BOOK_FACTORIES[restore_into]()
+    orders = restored.restore(data, restored_listener, "team")
+
+    assert restored.checkpoint() == data
+    assert restored_listener.calls == [("placed", order.client_order_id) for order in orders]
+    assert all(restored.get("team", order.client_order_id) is order for order in orders)
+    assert book_state(restored) == book_state(original)
+
+    # The restored book carries on exactly as the original does
+    assert apply_operations(restored, operations[1000:], None) == apply_operations(original, operations[1000:], None)
+
+
+def test_restore_rejects_bad_checkpoints(book):
+    book.insert(0.0, make_order(1, Side.BUY, 10000, 5))
+    book.insert(0.0, make_order(2, Side.SELL, 10100, 5))
+    book.insert(0.0, make_order(3, Side.SELL, 10000, 2))
+    data = book.checkpoint()
+
+    with pytest.raises(ValueError, match="empty"):
+        book.restore(data)
+    with pytest.raises(ValueError, match="instrument"):
+        OrderBook(Instrument.FUTURE, 0.0, 0.0).restore(data)
+    with pytest.raises(ValueError, match="not an order book checkpoint"):
+        OrderBook(Instrument.ETF, 0.0, 0.0).restore(b"XXXX" + data[4:])
+    with pytest.raises(ValueError, match="truncated"):
+        OrderBook(Instrument.ETF, 0.0, 0.0).restore(data[:-1])
+
+
+def test_checkpoint_of_an_empty_book_restores_an_empty_book(book):
+    restored = OrderBook(Instrument.ETF, MAKER_FEE, TAKER_FEE)
+    assert restored.restore(book.checkpoint()) == []
+    assert restored.best_ask() is None and restored.best_bid() is None
+    assert restored.last_traded_price() is None
+
+
+def test_order_index_is_namespaced_by_owner(book, listener):
+    ours = make_order(1, Side.BUY, 10000, 5, listener, owner="ours")
+    theirs = make_order(1, Side.BUY, 9900, 5, listener, owner="theirs")
+    market = make_order(1, Side.SELL, 10200, 5, listener, owner=None)
+    for order in (ours, theirs, market):
+        book.insert(0.0, order)
+
+    assert book.get("ours", 1) is ours
+    assert book.get("theirs", 1) is theirs
+    assert book.get(None, 1) is market
+    assert book.get("ours", 2) is None
+    assert book.get("nobody", 1) is None
+    assert book.order_count("ours") == 1
+    assert book.orders("theirs") == [theirs]
+    assert book.orders("nobody") == [] and book.order_count("nobody") == 0
+
+    assert book.cancel_by_id(1.0, "theirs", 1) is theirs
+    assert theirs.remaining_volume == 0 and ours.remaining_volume == 5
+    assert book.get("theirs", 1) is None
+    assert book.cancel_by_id(1.0, "theirs", 1) is None
+
+    assert book.amend_by_id(2.0, "ours", 1, 3) is ours
+    assert ours.volume == 3
+    assert book.amend_by_id(2.0, "ours", 1, 0) is ours
+    assert book.get("ours", 1) is None
+    assert book.amend_by_id(2.0, "ours", 1, 1) is None
+    assert listener.calls[-3:] == [("cancelled", 1, 5), ("amended", 1, 2), ("amended", 1, 3)]
+
+
+def test_order_index_only_holds_resting_orders(book):
+    book.insert(0.0, make_order(1, Side.SELL, 10100, 2))
+    book.insert(0.0, make_order(2, Side.SELL, 10100, 2))
+    book.insert(0.0, make_order(3, Side.BUY, 10000, 1, lifespan=Lifespan.FILL_AND_KILL))
+    book.insert(1.0, make_order(4, Side.BUY, 10100, 3))
+
+    # The first sell is filled, the second partly filled and the aggressor and fill-and-kill order never rest
+    assert [order.client_order_id for order in book.orders("team")] == [2]
+    assert book.get("team", 2).remaining_volume == 1
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_order_index_matches_the_resting_orders(make_book, seed):
+    book = make_book()
+    apply_operations(book, random_operations(seed, 1000), None)
+    resting = {order.client_order_id: order for side in (Side.SELL, Side.BUY)
+               for _, level in book._walk_levels(side) for order in iterate_queue(level)}
+    assert {order.client_order_id: order for order in book.orders("team")} == resting
+    assert all(order.remaining_volume > 0 for order in resting.values())
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_sweep_curve_prices_hedges_like_try_trade(make_book, seed):
+    rng = random.Random(seed)
+    book = make_book()
+    for now, operation in enumerate(random_operations(seed, 1500)):
+        apply_operations(book, [operation], None)
+        if now % 10 == 0:
+            for _ in range(5):
+                side = rng.choice((Side.BUY, Side.SELL))
+                price = rng.randint(90, 110) * TICK_SIZE
+                volume = rng.randint(1, 60)
+                assert book.sweep_curve(side).try_trade(price, volume) == book.try_trade(side, price, volume)
+
+
+def test_sweep_curve_is_rebuilt_only_when_the_other_side_changes(book):
+    book.insert(0.0, make_order(1, Side.SELL, 10100, 5))
+    book.insert(0.0, make_order(2, Side.BUY, 10000, 5))
+    buy_curve = book.sweep_curve(Side.BUY)
+    sell_curve = book.sweep_curve(Side.SELL)
+
+    # A change to the bids leaves the curve for buy orders, which trade with the asks, alone
+    book.insert(1.0, make_order(3, Side.BUY, 9900, 5))
+    assert book.sweep_curve(Side.BUY) is buy_curve
+    assert book.sweep_curve(Side.SELL) is not sell_curve
+    assert book.sweep_curve(Side.SELL).try_trade(9900, 8) == (8, (5 * 10000 + 3 * 9900) // 8)
+
+    # A trade changes the side it takes volume from
+    sell_curve = book.sweep_curve(Side.SELL)
+    book.insert(2.0, make_order(4, Side.BUY, 10100, 2))
+    assert book.sweep_curve(Side.BUY) is not buy_curve
+    assert book.sweep_curve(Side.BUY).try_trade(10100, 5) == (3, 10100)
+    assert book.sweep_curve(Side.SELL) is sell_curve
@@ -0,0 +1,66 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+"""Tests for sweep curves, with and without NumPy."""
+import random
+
+import pytest
+
+from ready_trader_go import sweep_curve
+from ready_trader_go.sweep_curve import SweepCurve
+
+
+@pytest.fixture(params=("numpy", "lists"))
+def use_numpy(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(sweep_curve, "numpy", None)
+    return request.param == "numpy"
+
+
+def walk(prices, volumes, ascending, limit_price, volume):
+    """Price an order by walking the levels one at a time."""
+    total_volume = total_value = 0
+    for price, available in zip(prices, volumes):
+        if total_volume >= volume or (price > limit_price if ascending else price < limit_price):
+            break
+        weight = min(volume - total_volume, available)
+        total_volume += weight
+        total_value += weight * price
+    return total_volume, total_value // total_volume if total_volume else 0
+
+
+@pytest.mark.parametrize("ascending", (True, False))
+def test_try_trade_matches_walking_the_levels(use_numpy, ascending):
+    rng = random.Random(ascending)
+    for _ in range(50):
+        prices = sorted(rng.sample(range(9000, 11000, 100), rng.randint(0, 12)), reverse=not ascending)
+        volumes = [rng.randint(1, 50) for _ in prices]
+        curve = SweepCurve(prices, volumes, ascending)
+        assert len(curve) == len(prices)
+        for _ in range(50):
+            limit_price = rng.randint(8900, 11100)
+            volume = rng.randint(1, 300)
+            assert curve.try_trade(limit_price, volume) == walk(prices, volumes, ascending, limit_price, volume)
+
+
+def test_curve_columns(use_numpy):
+    curve = SweepCurve([100, 101, 103], [2, 3, 5], True)
+    assert list(curve.cumulative_volumes) == [2, 5, 10]
+    assert list(curve.cumulative_values) == [200, 503, 1018]
+    assert list(curve.average_prices) == [100.0, 100.6, 101.8]
@@ -0,0 +1,90 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+"""Tests for the unhedged lots timer."""
+import asyncio
+
+from typing import List
+
+import pytest
+
+from ready_trader_go.unhedged_lots import MAX_UNHEDGED_LOTS, UnhedgedLots, UnhedgedLotsTimer
+from ready_trader_go.virtual_clock import VirtualTimeEventLoop
+
+TIME_LIMIT = 60.0
+
+
+@pytest.fixture
+def loop():
+    loop = VirtualTimeEventLoop()
+    yield loop
+    loop.close()
+
+
+def record_timer_handles(loop: VirtualTimeEventLoop, timer: UnhedgedLotsTimer) -> List[asyncio.TimerHandle]:
+    """Return a list that records every event loop timer the given unhedged lots timer schedules."""
+    handles: List[asyncio.TimerHandle] = []
+    call_at = loop.call_at
+
+    def recording_call_at(when, callback, *args, **kwargs):
+        handle = call_at(when, callback, *args, **kwargs)
+        if getattr(callback, "__self__", None) is timer:
+            handles.append(handle)
+        return handle
+
+    loop.call_at = recording_call_at
+    return handles
+
+
+def test_timers_expire_in_order(loop):
+    timer = UnhedgedLotsTimer(TIME_LIMIT)
+    expired: List[tuple] = []
+    lots = [UnhedgedLots(lambda i=i: expired.append((i, loop.time())), timer) for i in range(3)]
+
+    async def run():
+        timer.start(lots[0])
+        await asyncio.sleep(10.0)
+        timer.start(lots[1])
+        timer.start(lots[2])
+        await asyncio.sleep(10.0)
+        timer.cancel(lots[1])
+        await asyncio.sleep(100.0)
+
+    loop.run_until_complete(run())
+    assert expired == [(0, 60.0), (2, 70.0)]
+
+
+def test_callback_that_restarts_its_timer_keeps_a_single_timer_chain(loop):
+    timer = UnhedgedLotsTimer(TIME_LIMIT)
+    handles = record_timer_handles(loop, timer)
+    expired: List[float] = []
+
+    def on_expired():
+        expired.append(loop.time())
+        timer.start(lots)
+
+    lots = UnhedgedLots(on_expired, timer)
+
+    async def run():
+        lots.apply_position_delta(MAX_UNHEDGED_LOTS + 1)
+        await asyncio.sleep(5.5 * TIME_LIMIT)
+
+    loop.run_until_complete(run())
+    assert expired == [60.0, 120.0, 180.0, 240.0, 300.0]
+
+    # One event loop timer for the first start and one for each expiry
+    assert [h.when() for h in handles] == [60.0, 120.0, 180.0, 240.0, 300.0, 360.0]
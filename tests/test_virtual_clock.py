@@ -0,0 +1,133 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+"""Tests for the virtual clock."""
+import asyncio
+import selectors
+
+from typing import List
+
+import pytest
+
+from ready_trader_go import virtual_clock
+from ready_trader_go.virtual_clock import VirtualTimeEventLoop, VirtualTimeSelector
+
+READY = [(selectors.SelectorKey(0, 0, selectors.EVENT_READ, (None, None)), selectors.EVENT_READ)]
+
+
+class FakeSelector:
+    """Stands in for the operating system selector and the real clock.
+
+    Each call to select that may wait takes the real time and returns the
+    result queued for it, or nothing at once if none is queued. A poll, with
+    a timeout of zero, always returns nothing at once. Every call records
+    the timeout it was given.
+    """
+
+    def __init__(self):
+        self.now: float = 100.0
+        self.results: List[tuple] = []
+        self.timeouts: List[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def select(self, timeout=None):
+        self.timeouts.append(timeout)
+        elapsed, ready = self.results.pop(0) if self.results and timeout else (0.0, [])
+        self.now += elapsed
+        return ready
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeSelector()
+    monkeypatch.setattr(selectors.DefaultSelector, "select", fake.select)
+    monkeypatch.setattr(virtual_clock.time, "monotonic", fake.monotonic)
+    return fake
+
+
+@pytest.fixture
+def selector(fake):
+    advanced: List[float] = []
+    selector = VirtualTimeSelector(advanced.append, idle_wait=0.005)
+    selector.advanced = advanced
+    yield selector
+    selector.close()
+
+
+def test_free_running_clock_jumps_to_the_timeout(fake, selector):
+    assert selector.select(2.0) == []
+    assert selector.select(0.0) == []
+    assert selector.select(3.0) == []
+    assert fake.timeouts == [0, 0, 0]
+    assert selector.advanced == [2.0, 3.0]
+
+
+def test_expected_input_waits_up_to_the_idle_wait(fake, selector):
+    fake.results = [(0.001, READY), (0.005, []), (0.0, [])]
+    selector.expect_input()
+    assert selector.select(2.0) == READY
+    assert selector.select(2.0) == []
+    assert selector.select(1.0) == []
+    assert fake.timeouts == [0.005, 0.005, 0]
+    assert selector.advanced == [2.0, 1.0]
+
+
+def test_held_clock_keeps_to_real_time(fake, selector):
+    fake.results = [(0.25, READY), (0.5, []), (3.0, READY), (0.0, [])]
+    selector.hold()
+    assert selector.select(2.0) == READY
+    assert selector.select(0.5) == []
+    assert selector.select(1.0) == READY
+    assert fake.timeouts == [2.0, 0.5, 1.0]
+    assert selector.advanced == [0.25, 0.5, 1.0]
+
+    selector.release()
+    assert selector.select(4.0) == []
+    assert fake.timeouts[-1] == 0
+    assert selector.advanced[-1] == 4.0
+
+
+def test_nested_holds(fake, selector):
+    fake.results = [(0.1, READY), (0.2, READY)]
+    selector.hold()
+    selector.hold()
+    selector.select(1.0)
+    selector.release()
+    selector.select(1.0)
+    selector.release()
+    selector.select(1.0)
+    assert fake.timeouts == [1.0, 1.0, 0]
+    assert selector.advanced == pytest.approx([0.1, 0.2, 1.0])
+
+
+def test_event_loop_time_follows_a_held_clock(fake):
+    loop = VirtualTimeEventLoop()
+    try:
+        loop.run_until_complete(asyncio.sleep(5.0))
+        assert loop.time() == pytest.approx(5.0)
+
+        loop.hold()
+        fake.results = [(0.25, READY)]
+        start = loop.time()
+        loop.run_until_complete(asyncio.sleep(1.0))
+        loop.release()
+        assert pytest.approx(0.75) in fake.timeouts
+        assert loop.time() - start == pytest.approx(1.0)
+    finally:
+        loop.close()